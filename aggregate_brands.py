@@ -0,0 +1,90 @@
+import argparse
+import logging
+import os
+import time
+from modules import metrics
+from modules.aggregate import aggregate
+from modules.brand_index import BrandIndex
+from modules.brand_map import default_matcher
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consolidate brands and sum item_count per brand and month")
+    parser.add_argument("--input", default="data/output/brands.csv", help="brands.csv written by extract_brands.py")
+    parser.add_argument("--output", default="data/output/brand_totals.csv", help="Per-month brand totals (CSV)")
+    parser.add_argument(
+        "--parquet",
+        default="data/output/brand_totals.parquet",
+        help="Per-month brand totals (Parquet); pass an empty string to skip",
+    )
+    parser.add_argument(
+        "--rows-parquet",
+        default=None,
+        help="Also write every input row with its consolidated brand to this Parquet file",
+    )
+    parser.add_argument(
+        "--no-alias-map",
+        action="store_true",
+        help="Only clean up spelling instead of also mapping aliases from docs/map.json",
+    )
+    parser.add_argument(
+        "--fuzzy",
+        action="store_true",
+        help="Also fold misspellings and sub-lines into known brands (see modules/brand_index.py)",
+    )
+    parser.add_argument(
+        "--history",
+        nargs="*",
+        default=[],
+        help="Earlier brands.csv files whose spellings the fuzzy index learns first",
+    )
+    parser.add_argument(
+        "--review",
+        default="data/output/brand_review.csv",
+        help="With --fuzzy, where to write near-misses for review",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    reporter = metrics.setup(args)
+
+    if not os.path.exists(args.input):
+        logger.info("%s not found", args.input)
+        reporter.stop()
+        return
+
+    started = time.perf_counter()
+    index = None
+    if args.fuzzy:
+        index = BrandIndex() if args.no_alias_map else BrandIndex.from_file()
+        if args.history:
+            learned = index.add_outputs(args.history)
+            logger.info("Fuzzy index learned %s spellings from %s files", sum(learned.values()), len(args.history))
+    try:
+        totals, stats = aggregate(
+            args.input,
+            args.output,
+            args.parquet or None,
+            rows_parquet=args.rows_parquet,
+            matcher=None if args.no_alias_map else default_matcher(),
+            index=index,
+            review_csv=args.review if index is not None else None,
+        )
+    finally:
+        reporter.stop()
+
+    logger.info(
+        "Aggregated %s rows in %.1fs: %s brand spellings consolidated into %s brands, %s rows without a brand",
+        stats["rows"],
+        time.perf_counter() - started,
+        stats["spellings"],
+        stats["brands"],
+        stats["unbranded"],
+    )
+    logger.info("Wrote %s month/brand totals to %s", len(totals), args.output)
+    if index is not None:
+        logger.info("Wrote %s near-miss spellings to %s for review", stats["review"], args.review)
+
+if __name__ == "__main__":
+    main()
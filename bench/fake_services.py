@@ -0,0 +1,206 @@
+# fake_services.py
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class LatencyModel:
+    """Log-normal latency distribution described by its median and spread."""
+
+    def __init__(self, median_ms: float = 200.0, sigma: float = 0.5, seed: int | None = None):
+        self.median = median_ms / 1000.0
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self.median * self._random.lognormvariate(0.0, self.sigma)
+
+    def roll(self, probability: float) -> bool:
+        """Return ``True`` with the given probability."""
+        if probability <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < probability
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.throttled = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> dict:
+        return {"calls": self.calls, "throttled": self.throttled, "errors": self.errors}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under benchmark concurrency
+    request_queue_size = 512
+
+
+class _FakeServer(_Counters):
+    """
+    Local HTTP server answering JSON POSTs after a sampled latency.
+
+    Requests are answered with a 429 (``rate_limit_rate``), a 500
+    (``error_rate``) or :meth:`respond`. Use it as a context manager and
+    point a client at :attr:`base_url`.
+    """
+
+    path = "/"
+
+    def __init__(self, latency: LatencyModel, rate_limit_rate: float = 0.0, error_rate: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}{self.path}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def throttled_body(self) -> dict:
+        raise NotImplementedError
+
+    def failed_body(self) -> dict:
+        raise NotImplementedError
+
+    def respond(self, body: dict) -> dict:
+        raise NotImplementedError
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                fake.add("calls")
+                time.sleep(fake.latency.sample())
+                if fake.latency.roll(fake.rate_limit_rate):
+                    fake.add("throttled")
+                    self._send(429, fake.throttled_body())
+                elif fake.latency.roll(fake.error_rate):
+                    fake.add("errors")
+                    self._send(500, fake.failed_body())
+                else:
+                    self._send(200, fake.respond(body))
+
+        return Handler
+
+
+class FakeFirecrawlServer(_FakeServer):
+    """
+    Local HTTP server answering the Firecrawl ``/v1/scrape`` endpoint.
+
+    Pages get metadata derived from their URL; 429s advertise
+    ``retry_after`` seconds in their message like the real API. Point a
+    :class:`modules.firecrawl_client.FirecrawlClient` at :attr:`base_url`.
+    """
+
+    path = ""
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after: int = 1,
+    ):
+        super().__init__(latency, rate_limit_rate, error_rate)
+        self.retry_after = retry_after
+
+    def throttled_body(self) -> dict:
+        return {"success": False, "error": f"Too many requests, retry after {self.retry_after}s"}
+
+    def failed_body(self) -> dict:
+        return {"success": False, "error": "Injected Firecrawl failure"}
+
+    def respond(self, body: dict) -> dict:
+        slug = str(body.get("url", "")).rstrip("/").rsplit("/", 1)[-1]
+        meta = {"og:title": f"Synthetic item {slug}", "og:image": f"https://img.example/{slug}.jpg?w=1"}
+        return {"success": True, "data": {"metadata": meta}}
+
+
+class FakeOpenAIServer(_FakeServer):
+    """
+    Local HTTP server answering the OpenAI ``/responses`` endpoint.
+
+    Single-item prompts get ``{"name": ...}``; batch prompts built by
+    :func:`modules.prompting.build_batch_prompt` get one array entry per item.
+    Point an ``OpenAI`` client at :attr:`base_url`.
+    """
+
+    path = "/openai/v1/"
+
+    def answer(self, prompt: str) -> str:
+        items = re.findall(r'^(\d+): "', prompt, re.M)
+        if items:
+            return json.dumps([{"index": int(i), "name": f"Brand {i}"} for i in items])
+        return json.dumps({"name": "Synthetic Brand"})
+
+    def throttled_body(self) -> dict:
+        return {"error": {"message": "Rate limit reached", "type": "rate_limit"}}
+
+    def failed_body(self) -> dict:
+        return {"error": {"message": "Injected failure", "type": "server_error"}}
+
+    def respond(self, body: dict) -> dict:
+        text = self.answer(str(body.get("input", "")))
+        return {
+            "id": "resp_bench",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": body.get("model", "bench"),
+            "status": "completed",
+            "output": [
+                {
+                    "type": "message",
+                    "id": "msg_bench",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}],
+                }
+            ],
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+        }
@@ -0,0 +1,228 @@
+# run_bench.py
+"""
+Offline benchmark of both pipeline stages against local fake services.
+
+Usage::
+
+    python -m bench.run_bench --rows 10000 --workers 8 --output bench.json
+
+Results are printed (and optionally written) as JSON so runs on different
+commits can be compared.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import threading
+import time
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "bench")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "bench")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "http://127.0.0.1/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "bench")
+
+from openai import OpenAI
+
+import extract_brands
+import extract_names
+from bench.fake_services import FakeFirecrawlServer, FakeOpenAIServer, LatencyModel
+from modules import extraction, llm_client, metrics
+from modules.config import FirecrawlConfig
+from modules.firecrawl_client import FirecrawlClient
+
+
+def synthetic_rows(count: int, domains: int = 20, seed: int = 0) -> list[dict]:
+    """Return ``count`` input rows spread over ``domains`` shop domains."""
+    rng = random.Random(seed)
+    return [
+        {
+            "month": "2025-06-01",
+            "url": f"https://shop{rng.randrange(domains)}.example/item/{i}",
+            "item_count": str(rng.randint(1, 50)),
+            "item_name": f"Synthetic item {i}",
+        }
+        for i in range(count)
+    ]
+
+
+class _Timer:
+    """Wrap a callable and record the duration of each call."""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.samples: list[float] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.samples.append(time.perf_counter() - start)
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(run) -> tuple[list, float, float]:
+    """
+    Run ``run()`` quietly and return its result, wall time and peak RSS in MB.
+
+    Peak RSS is process-wide and never decreases, so compare it between runs
+    of the same stage rather than between stages. (tracemalloc would give
+    per-stage numbers but slows the threads enough to distort latencies.)
+    """
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = run()
+    elapsed = time.perf_counter() - start
+    return result, elapsed, _peak_rss_mb()
+
+
+def _report(rows: int, elapsed: float, peak_mb: float, timer: _Timer, counters: dict) -> dict:
+    return {
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(_percentile(timer.samples, 50) * 1000, 2),
+            "p95": round(_percentile(timer.samples, 95) * 1000, 2),
+            "max": round(max(timer.samples, default=0.0) * 1000, 2),
+        },
+        "requests": counters["calls"],
+        "throttled": counters["throttled"],
+        "errors": counters["errors"],
+        "retries": max(counters["calls"] - counters["distinct"], 0),
+        "peak_rss_mb": round(peak_mb, 2),
+    }
+
+
+def bench_names(rows: list[dict], args) -> tuple[list[dict], dict]:
+    latency = LatencyModel(args.firecrawl_latency_ms, args.sigma, args.seed)
+    with FakeFirecrawlServer(latency, args.rate_limit_rate, args.error_rate, args.retry_after) as server:
+        # A real client, so the pooled connections are part of the measurement
+        app = FirecrawlClient(FirecrawlConfig(api_key="bench", api_url=server.base_url))
+        urls = set()
+        timer = _Timer(app.scrape_url)
+
+        def scrape_url(url, **kwargs):
+            urls.add(url)
+            return timer(url, **kwargs)
+
+        app.scrape_url = scrape_url
+        original_app = extraction.FIRECRAWL.set(app)
+        extraction.NEXT_ALLOWED_TIME = 0.0
+        opened = metrics.REGISTRY.value("http_connections_opened_total", client="firecrawl")
+        try:
+            results, elapsed, peak = _measure(
+                lambda: extract_names.batch_process(rows, max_workers=args.workers)
+            )
+        finally:
+            extraction.FIRECRAWL.set(original_app)
+            app.close()
+        opened = metrics.REGISTRY.value("http_connections_opened_total", client="firecrawl") - opened
+        counters = {**server.as_dict(), "distinct": len(urls)}
+    return results, {**_report(len(rows), elapsed, peak, timer, counters), "connections_opened": int(opened)}
+
+
+def bench_brands(rows: list[dict], args) -> dict:
+    latency = LatencyModel(args.openai_latency_ms, args.sigma, args.seed)
+    with FakeOpenAIServer(latency, args.rate_limit_rate, args.error_rate) as server:
+        client = OpenAI(api_key="bench", base_url=server.base_url, max_retries=0)
+        prompts = set()
+        timer = _Timer(client.responses.create)
+
+        def create(**kwargs):
+            prompts.add(kwargs.get("input"))
+            return timer(**kwargs)
+
+        client.responses.create = create
+        original_client = llm_client.OPENAI.set(client)
+        try:
+            _, elapsed, peak = _measure(
+                lambda: extract_brands.batch_process(
+                    rows,
+                    args.brand_workers,
+                    use_alias_map=False,
+                    batch_size=args.batch_size,
+                )
+            )
+        finally:
+            llm_client.OPENAI.set(original_client)
+        counters = {**server.as_dict(), "distinct": len(prompts)}
+    return _report(len(rows), elapsed, peak, timer, counters)
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    rows = synthetic_rows(args.rows, args.domains, args.seed)
+    report = {
+        "commit": _commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "stages": {},
+    }
+    stages = args.stages.split(",")
+    item_rows = rows
+    if "names" in stages:
+        item_rows, report["stages"]["names"] = bench_names(rows, args)
+    if "brands" in stages:
+        report["stages"]["brands"] = bench_brands(item_rows, args)
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against fake services")
+    parser.add_argument("--rows", type=int, default=1000, help="Synthetic input rows")
+    parser.add_argument("--domains", type=int, default=20, help="Distinct shop domains in the input")
+    parser.add_argument("--stages", default="names,brands", help="Comma separated stages to run")
+    parser.add_argument("--workers", type=int, default=5, help="Threads for the names stage")
+    parser.add_argument("--brand-workers", type=int, default=5, help="Threads for the brands stage")
+    parser.add_argument("--batch-size", type=int, default=1, help="Items per brand prompt")
+    parser.add_argument("--firecrawl-latency-ms", type=float, default=200.0, help="Median scrape latency")
+    parser.add_argument("--openai-latency-ms", type=float, default=100.0, help="Median model latency")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread of the log-normal latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--retry-after", type=int, default=1, help="Seconds advertised on Firecrawl 429s")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for inputs and latencies")
+    parser.add_argument("--output", default=None, help="Also write the JSON report to this file")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
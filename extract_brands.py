@@ -1,54 +1,208 @@
-import csv
 import json
+import logging
 import os
 import argparse
-from modules.prompting import build_prompt
-from modules.llm_client import prompt_model
+import asyncio
+import threading
+from functools import partial
+from modules.async_engine import DEFAULT_CONCURRENCY, aprompt_model, bounded_map
+from modules.brand_map import AliasMatcher, cleanup_brand_name, default_matcher
+from modules.cache import PromptCache
+from modules.delta import DEFAULT_INDEX_PATH, PriorOutputs
+from modules.errors import PERMANENT, RetryPolicy, classify
+from modules.csv_source import chunked, read_csv_rows
+from modules.url_rules import UrlRules, default_rules
+from modules.prompting import build_batch_prompt, build_prompt, parse_batch_response
+from modules.llm_client import HEDGER, INFLIGHT, LIMITER, prompt_model
 from modules.extraction import _thread_map
+from modules.journal import RunJournal
+from modules.priority import by_weight, coverage, item_count_weight
+from modules import metrics
 
+logger = logging.getLogger(__name__)
 
-def cleanup_brand_name(name: str) -> str:
-    """Return a cleaned brand name for easier consolidation."""
-    if not name:
-        return ""
-    cleaned = name.replace("_", " ").replace("-", " ")
-    cleaned = " ".join(cleaned.split())
-    # Keep brand names uppercase for easier consolidation. Do not change this
-    # to title case.
-    return cleaned.upper()
+DEFAULT_CACHE_PATH = "data/cache/prompts.sqlite"
+DEFAULT_JOURNAL_PATH = "data/output/brands.journal.jsonl"
+DEFAULT_OUTPUT_PATH = "data/output/brands.csv"
+DEFAULT_DEAD_LETTER_PATH = "data/output/brands.dead_letter.csv"
 
-def process_row(row: dict) -> dict:
-    """Process a single CSV row and return the brand extraction result."""
-    month = row.get("month", "")
+# Used when a row has already been checked against the alias map
+_NO_ALIASES = AliasMatcher({})
+_STATS_LOCK = threading.Lock()
+
+FIELDNAMES = [
+    "month",
+    "url",
+    "item_count",
+    "item_name",
+    "image_url",
+    "brand",
+    "brand_error",
+]
+
+
+def _row_matcher(use_alias_map: bool = True, use_url_rules: bool = True):
+    """Return the local resolver for the enabled sources: URL rules, then aliases."""
+    matcher = default_matcher() if use_alias_map else _NO_ALIASES
+    if not use_url_rules:
+        return matcher
+    return default_rules() if use_alias_map else UrlRules.from_file(matcher=matcher)
+
+
+def _prepare_row(row: dict, matcher: AliasMatcher) -> tuple[dict, str | None]:
+    """
+    Return the output row and the text still to be sent to the LLM.
+
+    Rows whose URL matches a rule in ``docs/url_rules.json``, or whose item
+    name (or failing that, URL) contains exactly one known alias from
+    ``docs/map.json``, are resolved locally and need no LLM call.
+    """
     url = row.get("url", "")
-    item_count = row.get("item_count", "")
-    image_url = row.get("image_url", "")
     fallback = str(row.get("used_fallback", "False")).lower() == "true"
-
     item_name = row.get("item_name", "").strip()
 
-    input_text = url if fallback else item_name
+    result = {
+        "month": row.get("month", ""),
+        "url": url,
+        "item_count": row.get("item_count", ""),
+        "item_name": item_name,
+        "image_url": row.get("image_url", ""),
+        "brand": "",
+        "brand_error": "",
+    }
+
+    local_brand = matcher.resolve_row(item_name, url)
+    if local_brand:
+        result["brand"] = cleanup_brand_name(local_brand)
+        return result, None
+
+    return result, url if fallback else item_name
+
+
+def _apply_response(result: dict, raw: str) -> dict:
+    """Fill in the brand of ``result`` from the model's raw JSON response."""
+    data = json.loads(raw)
+    result["brand"] = cleanup_brand_name(data.get("name", ""))
+    return result
+
+
+def process_row(
+    row: dict,
+    cache: PromptCache | None = None,
+    matcher: AliasMatcher | None = None,
+) -> dict:
+    """Process a single CSV row and return the brand extraction result."""
+    result, input_text = _prepare_row(row, matcher or default_rules())
+    if input_text is None:
+        return result
     prompt = build_prompt(input_text)
-    print(prompt)
+    logger.debug("Prompt: %s", prompt)
+    try:
+        return _apply_response(result, prompt_model(prompt, cache=cache))
+    except Exception as e:
+        result["brand_error"] = str(e)
+        result["error_kind"] = classify(e)
+        return result
+
 
-    brand = ""
-    brand_error = ""
+async def aprocess_row(
+    row: dict,
+    cache: PromptCache | None = None,
+    matcher: AliasMatcher | None = None,
+) -> dict:
+    """Async version of :func:`process_row`."""
+    result, input_text = _prepare_row(row, matcher or default_rules())
+    if input_text is None:
+        return result
+    prompt = build_prompt(input_text)
+    logger.debug("Prompt: %s", prompt)
     try:
-        raw = prompt_model(prompt)
-        data = json.loads(raw)
-        brand = cleanup_brand_name(data.get("name", ""))
+        return _apply_response(result, await aprompt_model(prompt, cache=cache))
     except Exception as e:
-        brand_error = str(e)
+        result["brand_error"] = str(e)
+        result["error_kind"] = classify(e)
+        return result
+
+def process_batch(
+    rows: list[dict],
+    cache: PromptCache | None = None,
+    matcher: AliasMatcher | None = None,
+    stats: dict | None = None,
+) -> list[dict]:
+    """
+    Process several rows with a single LLM request.
+
+    Rows not resolved by the alias map are packed into one batch prompt.
+    Rows whose entry is missing or malformed in the response (or all of
+    them, if the request fails) fall back to :func:`process_row`; an entry
+    with only an ``error`` sets ``brand_error`` to the model's reason.
+    ``stats`` collects request counts for reporting.
+    """
+    matcher = matcher or default_rules()
+    prepared = [_prepare_row(row, matcher) for row in rows]
+    pending = [i for i, (_, text) in enumerate(prepared) if text is not None]
+
+    entries = {}
+    if len(pending) > 1:
+        prompt = build_batch_prompt([prepared[i][1] for i in pending])
+        logger.debug("Prompt: %s", prompt)
+        try:
+            raw = prompt_model(prompt, timeout=3 + len(pending), cache=cache)
+            entries = parse_batch_response(raw, len(pending))
+        except Exception as e:
+            logger.warning("Batch prompt failed, retrying items one by one: %s", e)
+
+    results = [result for result, _ in prepared]
+    fallbacks = 0
+    for j, i in enumerate(pending):
+        entry = entries.get(j)
+        if entry is None:
+            fallbacks += 1
+            results[i] = process_row(rows[i], cache=cache, matcher=_NO_ALIASES)
+        elif isinstance(entry.get("name"), str):
+            results[i]["brand"] = cleanup_brand_name(entry["name"])
+        else:
+            results[i]["brand_error"] = str(entry["error"]) or "No brand in batch response"
+            results[i]["error_kind"] = PERMANENT
+
+    if stats is not None:
+        batch_requests = 1 if len(pending) > 1 else 0
+        with _STATS_LOCK:
+            stats["rows"] = stats.get("rows", 0) + len(pending)
+            stats["requests"] = stats.get("requests", 0) + batch_requests + fallbacks
+            stats["fallbacks"] = stats.get("fallbacks", 0) + fallbacks
+    return results
+
+
+async def async_batch_process(
+    rows,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    *,
+    final_csv: str | None = None,
+    cache: PromptCache | None = None,
+    use_alias_map: bool = True,
+    journal: RunJournal | None = None,
+    collect: bool = True,
+    use_url_rules: bool = True,
+    prior: PriorOutputs | None = None,
+) -> list[dict]:
+    """Async version of :func:`batch_process` keeping ``concurrency`` prompts in flight."""
+    LIMITER.default_concurrency(concurrency)
+    matcher = _row_matcher(use_alias_map, use_url_rules)
+    fn = partial(aprocess_row, cache=cache, matcher=matcher)
+    if prior is not None:
+        fn = prior.awrap(fn, "brands")
+    return await bounded_map(
+        fn,
+        rows,
+        concurrency,
+        fieldnames=FIELDNAMES,
+        final_csv=final_csv,
+        journal=journal,
+        collect=collect,
+        stage="brands",
+    )
 
-    return {
-        "month": month,
-        "url": url,
-        "item_count": item_count,
-        "item_name": item_name,
-        "image_url": image_url,
-        "brand": brand,
-        "brand_error": brand_error,
-    }
 
 def batch_process(
     rows,
@@ -56,52 +210,294 @@ def batch_process(
     *,
     final_csv: str | None = None,
     tmp_dir: str | None = None,
+    cache: PromptCache | None = None,
+    use_alias_map: bool = True,
+    engine: str = "threads",
+    journal: RunJournal | None = None,
+    batch_size: int = 1,
+    ordered: bool = False,
+    collect: bool = True,
+    use_url_rules: bool = True,
+    deadline: float | None = None,
+    prior: PriorOutputs | None = None,
+    priority=None,
+    retry: RetryPolicy | None = None,
+    dead_letter: str | None = None,
 ) -> list[dict]:
-    """Process rows concurrently and return brand extraction results."""
+    """
+    Process rows concurrently and return brand extraction results.
+
+    Pass a :class:`modules.cache.PromptCache` as ``cache`` to reuse answers
+    for prompts that were already sent to the model. Set ``use_url_rules``
+    and ``use_alias_map`` to ``False`` to send every row to the LLM. With ``engine="async"`` the rows
+    run on an event loop and ``max_workers`` is the number of requests in
+    flight instead of the number of threads. Rows already recorded in
+    ``journal`` by a crashed run are not sent again. A ``batch_size`` above 1
+    packs that many rows into each LLM request and ``ordered`` writes
+    ``final_csv`` in input order (thread engine only). ``rows`` may be a lazy
+    iterable; with ``collect=False`` results are only written to ``final_csv``.
+    Rows (or batches) still waiting for the model after ``deadline`` seconds
+    are retried after the others (thread engine only). Rows whose URL and
+    item name already got a brand in an earlier run indexed in ``prior`` are
+    carried forward without asking the model. With a ``priority`` weight
+    function such as :func:`modules.priority.item_count_weight`, the heaviest
+    rows are sent first (thread engine only; ``ordered`` follows that order).
+    With ``retry``, rows that failed with a transient error are sent again at
+    the end, and input rows that still failed are written to ``dead_letter``
+    (thread engine only).
+    """
+    if engine == "async":
+        return asyncio.run(
+            async_batch_process(
+                rows,
+                max_workers or DEFAULT_CONCURRENCY,
+                final_csv=final_csv,
+                cache=cache,
+                use_alias_map=use_alias_map,
+                journal=journal,
+                collect=collect,
+                use_url_rules=use_url_rules,
+                prior=prior,
+            )
+        )
+
+    matcher = _row_matcher(use_alias_map, use_url_rules)
+    if priority is not None:
+        rows = by_weight(rows, priority, stage="brands")
     if max_workers is None:
         max_workers = os.cpu_count() or 1
-    fieldnames = [
-        "month",
-        "url",
-        "item_count",
-        "item_name",
-        "image_url",
-        "brand",
-        "brand_error",
-    ]
+    # A 429 can then shrink the requests in flight below the worker count
+    LIMITER.default_concurrency(max_workers)
+    if batch_size > 1:
+        stats: dict = {}
+        fn = partial(process_batch, cache=cache, matcher=matcher, stats=stats)
+        if prior is not None:
+            fn = prior.wrap_batch(fn, "brands")
+        results = _thread_map(
+            fn,
+            chunked(rows, batch_size),
+            max_workers,
+            fieldnames=FIELDNAMES,
+            final_csv=final_csv,
+            tmp_dir=tmp_dir,
+            journal=journal,
+            ordered=ordered,
+            collect=collect,
+            stage="brands",
+            deadline=deadline,
+            weight=priority,
+            retry=retry,
+            dead_letter=dead_letter,
+        )
+        if stats.get("requests"):
+            logger.info(
+                "Batched prompts: %s rows in %s requests (%.1f rows per request, %s single-item fallbacks)",
+                stats["rows"],
+                stats["requests"],
+                stats["rows"] / stats["requests"],
+                stats["fallbacks"],
+            )
+        return results
+    fn = retry_fn = partial(process_row, cache=cache, matcher=matcher)
+    if prior is not None:
+        fn = prior.wrap(fn, "brands")
     return _thread_map(
-        process_row,
+        fn,
         rows,
         max_workers,
-        fieldnames=fieldnames,
+        fieldnames=FIELDNAMES,
         final_csv=final_csv,
         tmp_dir=tmp_dir,
+        journal=journal,
+        ordered=ordered,
+        collect=collect,
+        stage="brands",
+        deadline=deadline,
+        retry_fn=retry_fn,
+        weight=priority,
+        retry=retry,
+        dead_letter=dead_letter,
     )
 
 
 def main():
     parser = argparse.ArgumentParser(description="Extract brand names")
+    parser.add_argument("--input", default="data/output/item_names.csv", help="CSV of rows to process (e.g. a dead-letter file)")
     parser.add_argument("--start", type=int, default=1, help="First row to process (1-indexed)")
     parser.add_argument("--end", type=int, default=None, help="Last row to process (inclusive)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Path of the prompt cache database")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the prompt cache entirely")
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached responses but store the new ones",
+    )
+    parser.add_argument(
+        "--no-alias-map",
+        action="store_true",
+        help="Send every row to the LLM instead of resolving known aliases locally",
+    )
+    parser.add_argument(
+        "--no-url-rules",
+        action="store_true",
+        help="Ignore docs/url_rules.json when resolving brands",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="Run requests on a thread pool or an asyncio event loop",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Threads (or in-flight async requests) to use",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Number of item names to send in each LLM request",
+    )
+    parser.add_argument(
+        "--journal",
+        default=DEFAULT_JOURNAL_PATH,
+        help="Run journal used to resume after a crash (deleted when the run completes)",
+    )
+    parser.add_argument("--no-journal", action="store_true", help="Do not record or resume progress")
+    parser.add_argument(
+        "--preserve-order",
+        action="store_true",
+        help="Write output rows in input order instead of completion order",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Seconds a row may take before its requests are abandoned and it is retried at the end (thread engine)",
+    )
+    parser.add_argument(
+        "--priority",
+        action="store_true",
+        help="Send rows with the highest item_count first (thread engine)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Carry forward brands from earlier outputs and only send new, changed or failed rows to the LLM",
+    )
+    parser.add_argument(
+        "--prior-index",
+        default=DEFAULT_INDEX_PATH,
+        help="Index of earlier outputs used by --incremental",
+    )
+    parser.add_argument(
+        "--retry-rounds",
+        type=int,
+        default=2,
+        help="Times rows with transient errors are retried at the end of the run (0 disables, thread engine)",
+    )
+    parser.add_argument(
+        "--dead-letter",
+        default=DEFAULT_DEAD_LETTER_PATH,
+        help="CSV receiving the input rows that still failed, with error and error_kind (thread engine)",
+    )
+    metrics.add_arguments(parser)
     args = parser.parse_args()
+    if os.path.abspath(args.input) == os.path.abspath(args.dead_letter):
+        parser.error("--dead-letter is rewritten by the run; copy it before using it as --input")
+    reporter = metrics.setup(args)
 
     try:
-        with open("data/output/item_names.csv", newline="") as f:
-            all_rows = list(csv.DictReader(f))
+        rows = read_csv_rows(args.input, args.start, args.end)
     except FileNotFoundError:
-        print("item_names.csv not found")
+        logger.info("%s not found", args.input)
         return
+    logger.info("Processing rows %s to %s", args.start, args.end or "the end of the file")
 
-    start = max(args.start - 1, 0)
-    end = args.end if args.end is not None else len(all_rows)
-    rows = all_rows[start:end]
-    print(f"Processing rows {start + 1} to {min(end, len(all_rows))} of {len(all_rows)}")
+    cache = None
+    if not args.no_cache:
+        cache = PromptCache(args.cache, ttl=None, refresh=args.refresh_cache)
 
-    batch_process(
-        rows,
-        final_csv="data/output/brands.csv",
-        tmp_dir="data/output/tmp_brands",
-    )
+    journal = None
+    if not args.no_journal:
+        journal = RunJournal(args.journal)
+        if journal.resumed:
+            logger.info("Resuming: %s rows already completed in %s", journal.resumed, args.journal)
+
+    prior = None
+    if args.incremental:
+        prior = PriorOutputs(args.prior_index)
+        indexed = prior.load("brands", DEFAULT_OUTPUT_PATH)
+        logger.info("Incremental run: indexed %s new rows from %s", indexed, DEFAULT_OUTPUT_PATH)
+
+    try:
+        batch_process(
+            rows,
+            args.concurrency,
+            final_csv=DEFAULT_OUTPUT_PATH,
+            tmp_dir="data/output/tmp_brands",
+            cache=cache,
+            use_alias_map=not args.no_alias_map,
+            use_url_rules=not args.no_url_rules,
+            engine=args.engine,
+            journal=journal,
+            batch_size=args.batch_size,
+            ordered=args.preserve_order,
+            collect=False,
+            deadline=args.deadline,
+            prior=prior,
+            priority=item_count_weight if args.priority else None,
+            retry=RetryPolicy(args.retry_rounds) if args.retry_rounds > 0 else None,
+            dead_letter=args.dead_letter,
+        )
+    finally:
+        reporter.stop()
+    if journal is not None:
+        journal.discard()
+
+    logger.info("OpenAI limiter: %s", LIMITER.snapshot())
+    dead = metrics.REGISTRY.total("dead_letter_total", stage="brands")
+    if dead:
+        logger.info("%.0f rows still failed; see %s", dead, args.dead_letter)
+    if coverage("brands") is not None:
+        logger.info("Brands found for %.1f%% of the total item_count", coverage("brands") * 100)
+    logger.info("OpenAI hedging: %s", HEDGER.snapshot())
+
+    if not args.no_url_rules:
+        stats = default_rules().stats()
+        logger.info("URL rules resolved %s of %s rows (%.1f%%)", stats["matched"], stats["rows"], stats["share"] * 100)
+
+    if not args.no_alias_map:
+        stats = default_matcher().stats()
+        logger.info(
+            "Alias map resolved %s of %s rows locally (%.1f%%); the rest went to the LLM",
+            stats["resolved"],
+            stats["rows"],
+            stats["share"] * 100,
+        )
+
+    if prior is not None:
+        stats = prior.stats("brands")
+        logger.info(
+            "Incremental run: %s rows reused from earlier outputs, %s recomputed (%.1f%% reused)",
+            stats["reused"],
+            stats["recomputed"],
+            stats["reuse_rate"] * 100,
+        )
+        prior.close()
+
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(
+            "Prompt cache: %s hits, %s misses (%.1f%% hit rate), %s in-flight duplicates shared",
+            stats["hits"],
+            stats["misses"],
+            stats["hit_rate"] * 100,
+            INFLIGHT.shared,
+        )
+        cache.close()
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,22 @@
-import csv
 import argparse
-from modules.extraction import batch_extract
+import logging
+import asyncio
+import os
+from modules.async_engine import DEFAULT_CONCURRENCY, async_batch_extract
+from modules.cache import DEFAULT_TTL, MetadataCache
+from modules.csv_source import read_csv_rows
+from modules.dedupe import UrlDeduper
+from modules.delta import DEFAULT_INDEX_PATH, PriorOutputs
+from modules.domain_scheduler import DomainScheduler
+from modules.errors import RetryPolicy
+from modules.url_rules import UrlRules, default_rules
+from modules.extraction import HEDGER, LIMITER, batch_extract
+from modules.html_meta import LocalFetcher
+from modules.journal import RunJournal
+from modules.priority import coverage, item_count_weight
+from modules import metrics
+
+logger = logging.getLogger(__name__)
 
 FIELDNAMES = [
     "month",
@@ -12,42 +28,303 @@ FIELDNAMES = [
     "used_fallback",
 ]
 
+DEFAULT_CACHE_PATH = "data/cache/metadata.sqlite"
+DEFAULT_JOURNAL_PATH = "data/output/item_names.journal.jsonl"
+DEFAULT_OUTPUT_PATH = "data/output/item_names.csv"
+DEFAULT_DEAD_LETTER_PATH = "data/output/item_names.dead_letter.csv"
+
 def batch_process(
-    rows, max_workers: int = 2, *, final_csv: str | None = None, tmp_dir: str | None = None
+    rows,
+    max_workers: int = 2,
+    *,
+    final_csv: str | None = None,
+    tmp_dir: str | None = None,
+    cache: MetadataCache | None = None,
+    engine: str = "threads",
+    journal: RunJournal | None = None,
+    ordered: bool = False,
+    collect: bool = True,
+    dedupe: UrlDeduper | None = None,
+    scheduler: DomainScheduler | None = None,
+    rules: UrlRules | None = None,
+    deadline: float | None = None,
+    local: LocalFetcher | None = None,
+    prior: PriorOutputs | None = None,
+    priority=None,
+    retry: RetryPolicy | None = None,
+    dead_letter: str | None = None,
 ):
-    """Return processed rows with extracted item names."""
+    """
+    Return processed rows with extracted item names.
+
+    With ``engine="async"`` the rows run on an event loop and ``max_workers``
+    is the number of scrapes in flight instead of the number of threads.
+    ``ordered`` writes ``final_csv`` in input order (thread engine only).
+    ``rows`` may be a lazy iterable; with ``collect=False`` results are only
+    written to ``final_csv`` and an empty list is returned. ``dedupe``
+    scrapes each canonical URL once and fans the result out to every row.
+    ``scheduler`` caps and interleaves scrapes per host (thread engine only).
+    Rows whose brand follows from the URL via ``rules`` are not scraped.
+    Rows still scraping after ``deadline`` seconds are retried after the
+    others (thread engine only). With ``local``, each page's own ``<head>``
+    is read before paying for a Firecrawl scrape. Rows already named by an
+    earlier run indexed in ``prior`` are carried forward without scraping.
+    A ``priority`` weight function (e.g.
+    :func:`modules.priority.item_count_weight`) scrapes the heaviest rows
+    first (thread engine only). With ``retry``, rows that failed with a
+    transient error are scraped again at the end, and input rows that still
+    failed are written to ``dead_letter`` (thread engine only).
+    """
+    if engine == "async":
+        return asyncio.run(
+            async_batch_extract(
+                rows,
+                max_workers or DEFAULT_CONCURRENCY,
+                final_csv=final_csv,
+                fieldnames=FIELDNAMES,
+                cache=cache,
+                journal=journal,
+                collect=collect,
+                dedupe=dedupe,
+                rules=rules,
+                local=local,
+                prior=prior,
+            )
+        )
     return batch_extract(
         rows,
         max_workers=max_workers,
         final_csv=final_csv,
         tmp_dir=tmp_dir,
         fieldnames=FIELDNAMES,
+        cache=cache,
+        journal=journal,
+        ordered=ordered,
+        collect=collect,
+        dedupe=dedupe,
+        scheduler=scheduler,
+        rules=rules,
+        deadline=deadline,
+        local=local,
+        prior=prior,
+        priority=priority,
+        retry=retry,
+        dead_letter=dead_letter,
     )
 
 def main():
     parser = argparse.ArgumentParser(description="Extract item names from URLs")
+    parser.add_argument("--input", default="data/input.csv", help="CSV of rows to process (e.g. a dead-letter file)")
     parser.add_argument("--start", type=int, default=1, help="First row to process (1-indexed)")
     parser.add_argument("--end", type=int, default=None, help="Last row to process (inclusive)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="Path of the metadata cache database")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the metadata cache entirely")
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Ignore cached metadata but store freshly scraped results",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_TTL / 86400,
+        help="Maximum age of cached metadata in days",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="Run scrapes on a thread pool or an asyncio event loop",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Threads (default 5) or in-flight async scrapes (default 100) to use",
+    )
+    parser.add_argument(
+        "--journal",
+        default=DEFAULT_JOURNAL_PATH,
+        help="Run journal used to resume after a crash (deleted when the run completes)",
+    )
+    parser.add_argument("--no-journal", action="store_true", help="Do not record or resume progress")
+    parser.add_argument(
+        "--preserve-order",
+        action="store_true",
+        help="Write output rows in input order instead of completion order",
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Scrape every row even when its URL matches an earlier one after canonicalization",
+    )
+    parser.add_argument(
+        "--max-per-host",
+        type=int,
+        default=None,
+        help="Scrapes in flight per host (default FIRECRAWL_MAX_PER_HOST or 4; 0 disables per-host scheduling)",
+    )
+    parser.add_argument(
+        "--no-url-rules",
+        action="store_true",
+        help="Scrape every row, even when docs/url_rules.json decides its brand from the URL",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Seconds a row may take before its requests are abandoned and it is retried at the end (thread engine)",
+    )
+    parser.add_argument(
+        "--local-fetch",
+        action="store_true",
+        help="Read page metadata directly first and only scrape with Firecrawl when it is not usable",
+    )
+    parser.add_argument(
+        "--priority",
+        action="store_true",
+        help="Scrape rows with the highest item_count first (thread engine)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Carry forward item names from earlier outputs and only scrape new or failed rows",
+    )
+    parser.add_argument(
+        "--prior-index",
+        default=DEFAULT_INDEX_PATH,
+        help="Index of earlier outputs used by --incremental",
+    )
+    parser.add_argument(
+        "--retry-rounds",
+        type=int,
+        default=2,
+        help="Times rows with transient errors are retried at the end of the run (0 disables, thread engine)",
+    )
+    parser.add_argument(
+        "--dead-letter",
+        default=DEFAULT_DEAD_LETTER_PATH,
+        help="CSV receiving the input rows that still failed, with error and error_kind (thread engine)",
+    )
+    metrics.add_arguments(parser)
     args = parser.parse_args()
+    if os.path.abspath(args.input) == os.path.abspath(args.dead_letter):
+        parser.error("--dead-letter is rewritten by the run; copy it before using it as --input")
+    reporter = metrics.setup(args)
 
     try:
-        with open("data/input.csv", newline="") as f:
-            all_rows = list(csv.DictReader(f))
+        rows = read_csv_rows(args.input, args.start, args.end)
     except FileNotFoundError:
-        print("data/input.csv not found")
+        logger.info("%s not found", args.input)
         return
+    logger.info("Processing rows %s to %s", args.start, args.end or "the end of the file")
 
-    start = max(args.start - 1, 0)
-    end = args.end if args.end is not None else len(all_rows)
-    rows = all_rows[start:end]
-    print(f"Processing rows {start + 1} to {min(end, len(all_rows))} of {len(all_rows)}")
+    cache = None
+    if not args.no_cache:
+        cache = MetadataCache(args.cache, ttl=args.cache_ttl * 86400, refresh=args.refresh_cache)
 
-    batch_process(
-        rows,
-        max_workers=5,
-        final_csv="data/output/item_names.csv",
-        tmp_dir="data/output/tmp_item_names",
-    )
+    journal = None
+    if not args.no_journal:
+        journal = RunJournal(args.journal)
+        if journal.resumed:
+            logger.info("Resuming: %s rows already completed in %s", journal.resumed, args.journal)
+
+    prior = None
+    if args.incremental:
+        prior = PriorOutputs(args.prior_index)
+        indexed = prior.load("names", DEFAULT_OUTPUT_PATH)
+        logger.info("Incremental run: indexed %s new rows from %s", indexed, DEFAULT_OUTPUT_PATH)
+
+    dedupe = None if args.no_dedupe else UrlDeduper()
+    local = LocalFetcher() if args.local_fetch else None
+    scheduler = None
+    if args.engine == "threads" and args.max_per_host != 0:
+        scheduler = DomainScheduler.from_env() if args.max_per_host is None else DomainScheduler(args.max_per_host)
+
+    try:
+        batch_process(
+            rows,
+            max_workers=args.concurrency or (5 if args.engine == "threads" else DEFAULT_CONCURRENCY),
+            final_csv=DEFAULT_OUTPUT_PATH,
+            tmp_dir="data/output/tmp_item_names",
+            cache=cache,
+            engine=args.engine,
+            journal=journal,
+            ordered=args.preserve_order,
+            collect=False,
+            dedupe=dedupe,
+            scheduler=scheduler,
+            rules=None if args.no_url_rules else default_rules(),
+            deadline=args.deadline,
+            local=local,
+            prior=prior,
+            priority=item_count_weight if args.priority else None,
+            retry=RetryPolicy(args.retry_rounds) if args.retry_rounds > 0 else None,
+            dead_letter=args.dead_letter,
+        )
+    finally:
+        reporter.stop()
+    if journal is not None:
+        journal.discard()
+
+    logger.info("Firecrawl limiter: %s", LIMITER.snapshot())
+    logger.info("Firecrawl hedging: %s", HEDGER.snapshot())
+    dead = metrics.REGISTRY.total("dead_letter_total", stage="names")
+    if dead:
+        logger.info("%.0f rows still failed; see %s", dead, args.dead_letter)
+    if coverage("names") is not None:
+        logger.info("Item names found for %.1f%% of the total item_count", coverage("names") * 100)
+
+    if not args.no_url_rules:
+        stats = default_rules().stats()
+        logger.info(
+            "URL rules: %s of %s rows needed no scrape (%.1f%%)",
+            stats["matched"],
+            stats["rows"],
+            stats["share"] * 100,
+        )
+
+    if prior is not None:
+        stats = prior.stats("names")
+        logger.info(
+            "Incremental run: %s rows reused from earlier outputs, %s recomputed (%.1f%% reused)",
+            stats["reused"],
+            stats["recomputed"],
+            stats["reuse_rate"] * 100,
+        )
+        prior.close()
+
+    if local is not None:
+        stats = local.stats()
+        logger.info(
+            "Local fetch: %s pages read directly, %s sent to Firecrawl (%.1f%% hit rate)",
+            stats["hits"],
+            stats["misses"],
+            stats["hit_rate"] * 100,
+        )
+
+    if scheduler is not None:
+        logger.info("Busiest hosts: %s", scheduler.snapshot())
+
+    if dedupe is not None:
+        stats = dedupe.stats()
+        logger.info(
+            "URL dedupe: %s unique pages for %s rows (%.1f%% of rows reused a scrape)",
+            stats["unique"],
+            stats["rows"],
+            stats["dedupe_ratio"] * 100,
+        )
+
+    if cache is not None:
+        stats = cache.stats()
+        logger.info(
+            "Metadata cache: %s hits, %s misses (%.1f%% hit rate), %s writes",
+            stats["hits"],
+            stats["misses"],
+            stats["hit_rate"] * 100,
+            stats["writes"],
+        )
+        cache.close()
 
 if __name__ == "__main__":
     main()
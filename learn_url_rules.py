@@ -0,0 +1,43 @@
+import argparse
+import json
+from modules.csv_source import read_csv_rows
+from modules.url_rules import DEFAULT_RULES_PATH, UrlRules, learn_rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose URL rules from past brand extraction output")
+    parser.add_argument("--brands", default="data/output/brands.csv", help="brands.csv produced by earlier runs")
+    parser.add_argument("--rules", default=DEFAULT_RULES_PATH, help="Rules file to extend")
+    parser.add_argument("--min-support", type=int, default=20, help="Rows a host or path needs before a rule is proposed")
+    parser.add_argument(
+        "--min-share",
+        type=float,
+        default=0.95,
+        help="Share of those rows that must agree on the brand",
+    )
+    parser.add_argument("--write", action="store_true", help="Append the proposals to the rules file")
+    args = parser.parse_args()
+
+    try:
+        rows = read_csv_rows(args.brands)
+    except FileNotFoundError:
+        print(f"{args.brands} not found")
+        return
+
+    with open(args.rules, encoding="utf-8") as f:
+        existing = json.load(f)
+    known = UrlRules(existing.get("rules", []))
+    proposals = learn_rules(rows, known=known, min_support=args.min_support, min_share=args.min_share)
+
+    print(json.dumps(proposals, ensure_ascii=False, indent=4))
+    print(f"{len(proposals)} new rules proposed")
+    if args.write and proposals:
+        existing.setdefault("rules", []).extend(proposals)
+        with open(args.rules, "w", encoding="utf-8") as f:
+            json.dump(existing, f, ensure_ascii=False, indent=4)
+            f.write("\n")
+        print(f"Added to {args.rules}; review them before the next run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# aggregate.py
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from modules.brand_index import BrandIndex
+from modules.brand_map import AliasMatcher, cleanup_brand_name
+
+_CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+
+def canonical_brand(name: str, matcher: AliasMatcher | None = None, index: BrandIndex | None = None) -> str:
+    """
+    Return the cleaned brand for ``name``, replaced by its canonical form if it
+    is a known alias or, with ``index``, close enough to a known brand.
+    """
+    cleaned = cleanup_brand_name(name)
+    canonical = matcher.canonical(cleaned) if matcher is not None and cleaned else None
+    if canonical is None and index is not None and cleaned:
+        canonical = index.canonical(cleaned)
+    return cleanup_brand_name(canonical) if canonical else cleaned
+
+
+def read_brands(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Read ``brands.csv`` into a DataFrame with Arrow's multithreaded CSV reader.
+
+    ``month`` and ``brand`` are dictionary encoded and come back as
+    categoricals, so millions of rows cost one integer code each rather than
+    one Python string. ``item_count`` is read as text and normalised like
+    :func:`modules.priority.item_count_weight`: thousands separators are
+    dropped and blank or malformed counts are 0. Only ``columns`` are read
+    (default: the three used for totals).
+    """
+    columns = columns or ["month", "brand", "item_count"]
+    types = {name: pa.string() for name in columns}
+    types.update({name: _CATEGORY for name in ("month", "brand") if name in columns})
+    table = pa_csv.read_csv(
+        path,
+        convert_options=pa_csv.ConvertOptions(include_columns=columns, column_types=types),
+    )
+    df = table.to_pandas()
+    if "item_count" in df:
+        counts = df["item_count"].str.replace(",", "", regex=False).str.strip()
+        df["item_count"] = pd.to_numeric(counts, errors="coerce").fillna(0).clip(lower=0).astype("int64")
+    return df
+
+
+def consolidate(
+    df: pd.DataFrame, matcher: AliasMatcher | None = None, index: BrandIndex | None = None
+) -> pd.DataFrame:
+    """
+    Replace ``df["brand"]`` with its consolidated form, in place.
+
+    :func:`canonical_brand` runs once per distinct spelling rather than once
+    per row; the rows are then relabelled with a single array lookup.
+    """
+    brands = df["brand"].astype("category")
+    names = np.array([canonical_brand(b, matcher, index) for b in brands.cat.categories], dtype=object)
+    codes, uniques = pd.factorize(names)
+    row_codes = brands.cat.codes.to_numpy()
+    df["brand"] = pd.Categorical.from_codes(
+        np.where(row_codes >= 0, codes[row_codes], -1),
+        categories=pd.Index(uniques, dtype=object),
+    )
+    return df
+
+
+def near_misses(counts: pd.Series, index: BrandIndex) -> pd.DataFrame:
+    """
+    Return the near-misses ``index`` recorded, with the number of ``rows``
+    behind each (from ``counts``, rows per raw spelling), most rows first.
+    """
+    rows = {}
+    for spelling, n in counts.items():
+        cleaned = cleanup_brand_name(spelling)
+        rows[cleaned] = rows.get(cleaned, 0) + int(n)
+    review = pd.DataFrame(
+        [
+            {"brand": brand, "candidate": m.candidate, "score": m.score, "rows": rows.get(brand, 0)}
+            for brand, m in index.near_misses.items()
+        ],
+        columns=["brand", "candidate", "score", "rows"],
+    )
+    return review.sort_values(["rows", "brand"], ascending=[False, True], kind="stable").reset_index(drop=True)
+
+
+def brand_totals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return ``item_count`` summed per ``month`` and ``brand``.
+
+    The result also has the number of ``rows`` behind each total and is
+    sorted by month, then by total descending. Rows without a brand are left out.
+    """
+    branded = df[df["brand"].notna() & (df["brand"] != "")]
+    totals = (
+        branded.groupby(["month", "brand"], observed=True, sort=False)["item_count"]
+        .agg(item_count="sum", rows="size")
+        .reset_index()
+        .astype({"month": str, "brand": str})
+    )
+    totals = totals.sort_values(["month", "item_count"], ascending=[True, False], kind="stable")
+    return totals.reset_index(drop=True)
+
+
+def write_rows_parquet(path: str, brands_csv: str, df: pd.DataFrame) -> None:
+    """Write every row of ``brands_csv`` to Parquet with the consolidated ``brand`` from ``df``."""
+    table = pa_csv.read_csv(
+        brands_csv,
+        convert_options=pa_csv.ConvertOptions(column_types={"month": _CATEGORY, "brand": pa.string()}),
+    )
+    table = table.set_column(table.schema.get_field_index("brand"), "brand", pa.array(df["brand"]))
+    pq.write_table(table, path)
+
+
+def aggregate(
+    brands_csv: str,
+    totals_csv: str | None = None,
+    totals_parquet: str | None = None,
+    *,
+    rows_parquet: str | None = None,
+    matcher: AliasMatcher | None = None,
+    index: BrandIndex | None = None,
+    review_csv: str | None = None,
+) -> tuple[pd.DataFrame, dict]:
+    """
+    Consolidate the brands in ``brands_csv`` and write per-month totals.
+
+    Totals go to ``totals_csv`` and/or ``totals_parquet``; ``rows_parquet``
+    additionally keeps every row with its consolidated brand. Returns the
+    totals and counts of rows, unbranded rows and distinct brands before and
+    after consolidation.
+
+    With ``index``, the spellings in ``brands_csv`` are first learned into it
+    (see :meth:`BrandIndex.add_counts`) and its near-misses are written to
+    ``review_csv``; their number is added to the counts as ``review``.
+    """
+    df = read_brands(brands_csv)
+    before = len(df["brand"].cat.categories)
+    if index is not None:
+        counts = df["brand"].value_counts()
+        index.add_counts({brand: int(n) for brand, n in counts.items() if brand and n})
+    consolidate(df, matcher, index)
+    totals = brand_totals(df)
+    if totals_csv:
+        totals.to_csv(totals_csv, index=False)
+    if totals_parquet:
+        totals.to_parquet(totals_parquet, index=False)
+    if rows_parquet:
+        write_rows_parquet(rows_parquet, brands_csv, df)
+    stats = {
+        "rows": len(df),
+        "unbranded": int(len(df) - totals["rows"].sum()),
+        "spellings": before,
+        "brands": int(totals["brand"].nunique()),
+    }
+    if index is not None:
+        review = near_misses(counts, index)
+        if review_csv:
+            review.to_csv(review_csv, index=False)
+        stats["review"] = len(review)
+    return totals, stats
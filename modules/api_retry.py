@@ -0,0 +1,129 @@
+# api_retry.py
+
+import asyncio
+import logging
+import time
+
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ApiRetry:
+    """
+    Retry, throttle and metrics handling for one API, shared by both engines.
+
+    :meth:`call` and :meth:`acall` run the same attempt loop with a blocking
+    or an async ``sleep``. Errors for which ``throttled(error)`` is true are
+    retried up to ``retries`` times. They pause the API for
+    ``throttle_wait(error, attempt)`` seconds for every caller: through
+    ``pause`` (an object with ``delay()`` and ``extend(seconds)``) if given,
+    otherwise through ``limiter.on_throttle``. Any other error stops at once.
+    Durations and outcomes are recorded as ``<api>_request_seconds``,
+    ``<api>_requests_total``, ``<api>_throttled_total`` and
+    ``<api>_retries_total``; ``on_success(result)`` defaults to
+    ``limiter.on_success()``. When every attempt fails, ``RuntimeError`` with
+    ``message`` followed by the last error is raised from that error, so
+    :func:`modules.errors.classify` still sees its cause.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limiter,
+        *,
+        throttled,
+        throttle_wait,
+        message: str,
+        subject: str = "",
+        pause=None,
+        on_success=None,
+    ):
+        self.name = name
+        self.api = name.lower()
+        self.limiter = limiter
+        self.throttled = throttled
+        self.throttle_wait = throttle_wait
+        self.message = message
+        self.subject = f" for {subject}" if subject else ""
+        self.pause = pause
+        self.on_success = on_success
+
+    def _succeeded(self, result, start: float):
+        duration = time.perf_counter() - start
+        if self.on_success is not None:
+            self.on_success(result)
+        else:
+            self.limiter.on_success()
+        metrics.observe(f"{self.api}_request_seconds", duration)
+        metrics.inc(f"{self.api}_requests_total", outcome="ok")
+        logger.debug("%s request%s took %.2f seconds", self.name, self.subject, duration)
+        return result
+
+    def _failed(self, error: Exception, start: float, attempt: int, retries: int) -> bool:
+        """Record a failed attempt and return whether to try again."""
+        metrics.observe(f"{self.api}_request_seconds", time.perf_counter() - start)
+        if not self.throttled(error):
+            metrics.inc(f"{self.api}_requests_total", outcome="error")
+            logger.warning("%s failed%s: %s", self.name, self.subject, error)
+            return False
+        wait = self.throttle_wait(error, attempt)
+        logger.warning("%s rate limit hit%s. Waiting %s seconds.", self.name, self.subject, wait)
+        metrics.inc(f"{self.api}_requests_total", outcome="throttled")
+        metrics.inc(f"{self.api}_throttled_total")
+        if self.pause is not None:
+            self.pause.extend(wait)
+            self.limiter.on_throttle()
+        else:
+            self.limiter.on_throttle(wait)
+        if attempt >= retries:
+            logger.warning("%s rate limit hit on the final attempt%s.", self.name, self.subject)
+            return False
+        metrics.inc(f"{self.api}_retries_total")
+        return True
+
+    def _error(self, error: Exception | None) -> RuntimeError:
+        return RuntimeError(f"{self.message}{error}")
+
+    def _delay(self) -> float:
+        return self.pause.delay() if self.pause is not None else self.limiter.paused_for()
+
+    def call(self, fn, retries: int, sleep=None):
+        """Return ``fn()``, retrying throttled attempts; ``sleep`` defaults to :func:`time.sleep`."""
+        sleep = sleep or time.sleep
+        last_error = None
+        for attempt in range(retries + 1):
+            delay = self._delay()
+            if delay > 0:
+                logger.debug("%s rate limit active; waiting %.2f seconds%s", self.name, delay, self.subject)
+                sleep(delay)
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as e:
+                last_error = e
+                if not self._failed(e, start, attempt, retries):
+                    break
+                continue
+            return self._succeeded(result, start)
+        raise self._error(last_error) from last_error
+
+    async def acall(self, fn, retries: int, sleep=None):
+        """Async version of :meth:`call`; ``fn`` returns an awaitable."""
+        sleep = sleep or asyncio.sleep
+        last_error = None
+        for attempt in range(retries + 1):
+            delay = self._delay()
+            if delay > 0:
+                logger.debug("%s rate limit active; waiting %.2f seconds%s", self.name, delay, self.subject)
+                await sleep(delay)
+            start = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as e:
+                last_error = e
+                if not self._failed(e, start, attempt, retries):
+                    break
+                continue
+            return self._succeeded(result, start)
+        raise self._error(last_error) from last_error
@@ -0,0 +1,255 @@
+# async_engine.py
+
+import asyncio
+import logging
+import weakref
+
+import modules.extraction as extraction
+from modules import metrics
+from modules.csv_sink import CsvSink
+from modules.cache import AsyncSingleFlight, PromptCache, prompt_key
+import modules.llm_client as llm_client
+from modules.journal import row_key
+from modules.llm_client import _is_cacheable
+from modules.rate_limit import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Default number of requests kept in flight by the async engine
+DEFAULT_CONCURRENCY = 100
+
+# Async clients are bound to the event loop they were first used on, so one set
+# is kept per running loop.
+_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict]" = weakref.WeakKeyDictionary()
+
+
+def _loop_state() -> dict:
+    loop = asyncio.get_running_loop()
+    state = _CLIENTS.get(loop)
+    if state is None:
+        state = {"inflight": AsyncSingleFlight()}
+        _CLIENTS[loop] = state
+    return state
+
+
+def _firecrawl():
+    state = _loop_state()
+    if "firecrawl" not in state:
+        from modules.firecrawl_client import AsyncFirecrawlClient
+
+        state["firecrawl"] = AsyncFirecrawlClient(extraction.FIRECRAWL.settings())
+    return state["firecrawl"]
+
+
+def _openai():
+    state = _loop_state()
+    if "openai" not in state:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        from modules.http_pool import pooled_async_client
+
+        config = llm_client.OPENAI.settings()
+        state["openai"] = AsyncOpenAI(
+            api_key=config.api_key,
+            base_url=config.base_url,
+            default_query={"api-version": config.api_version},
+            http_client=pooled_async_client(config.pool, "openai", DefaultAsyncHttpxClient),
+        )
+    return state["openai"]
+
+
+async def afetch_metadata(url: str, timeout: int = 20000, retries: int = 2) -> dict:
+    """
+    Async version of :func:`modules.extraction.fetch_metadata`.
+
+    The rate limit wait time is shared with the thread-based implementation,
+    so a 429 seen by either pauses both.
+    """
+
+    async def scrape() -> dict:
+        await extraction.LIMITER.aacquire()
+        try:
+            resp = await _firecrawl().scrape_url(
+                url=url,
+                only_main_content=False,
+                timeout=timeout,
+                proxy="basic",
+            )
+        finally:
+            extraction.LIMITER.release()
+        return extraction._checked_metadata(resp)
+
+    return await extraction.firecrawl_retry(url).acall(scrape, retries)
+
+
+async def aextract_item_data(url: str, cache=None, local=None) -> tuple[str, str | None]:
+    """Async version of :func:`modules.extraction.extract_item_data`."""
+    meta = await cache.aget(url) if cache is not None else None
+    fresh = meta is None
+    if fresh and local is not None:
+        meta = await local.afetch(url)
+    if meta is None:
+        meta = await afetch_metadata(url)
+    data = extraction._item_from_metadata(url, meta)
+    if fresh and cache is not None:
+        await cache.aset(url, meta)
+    return data
+
+
+async def aprompt_model(
+    prompt: str,
+    timeout: int = 3,
+    retries: int = 3,
+    cache: PromptCache | None = None,
+) -> str:
+    """Async version of :func:`modules.llm_client.prompt_model`."""
+    model = llm_client.OPENAI.settings().deployment
+    key = prompt_key(prompt, model)
+    if cache is not None:
+        cached = await cache.aget(key)
+        if cached is not None:
+            return cached
+
+    async def call() -> str:
+        tokens = estimate_tokens(prompt)
+        limiter = llm_client.LIMITER
+
+        async def create():
+            await limiter.aacquire(tokens)
+            try:
+                return await _openai().responses.create(model=model, input=prompt, timeout=timeout)
+            finally:
+                limiter.release()
+
+        resp = await llm_client.openai_retry(tokens).acall(create, retries)
+        text = resp.output[0].content[0].text
+        if cache is not None and _is_cacheable(text):
+            await cache.aset(key, text)
+        return text
+
+    return await _loop_state()["inflight"].do(key, call)
+
+
+async def bounded_map(
+    fn,
+    items,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    *,
+    fieldnames: list[str] | None = None,
+    final_csv: str | None = None,
+    journal=None,
+    collect: bool = True,
+    stage: str = "rows",
+) -> list:
+    """
+    Run coroutine function ``fn`` over ``items`` with at most ``concurrency`` in flight.
+
+    ``items`` is consumed lazily, creating at most two tasks per slot at a
+    time. Results are returned in input order, or not kept at all with
+    ``collect=False``. With ``final_csv`` each result is handed to a
+    :class:`CsvSink` as soon as it completes. Items already in ``journal``
+    are not run again. Rows are counted in :mod:`modules.metrics` under ``stage``.
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    window = max(concurrency, 1) * 2
+    results: dict[int, object] = {}
+    pending: dict = {}  # task -> input position
+    sink = None
+    if final_csv:
+        if journal is not None:
+            journal.anchor_output(final_csv)
+        sink = CsvSink(final_csv, fieldnames)
+
+    async def run(item):
+        key = row_key(item) if journal is not None else None
+        res = journal.get(key) if journal is not None else None
+        if res is None:
+            async with semaphore:
+                metrics.add("rows_in_flight", 1, stage=stage)
+                try:
+                    with metrics.span("row", {"stage": stage}):
+                        res = await fn(item)
+                finally:
+                    metrics.add("rows_in_flight", -1, stage=stage)
+            if journal is not None:
+                journal.record(key, res)
+        metrics.record_rows(stage, res)
+        if sink is not None:
+            sink.write(res)
+        return res
+
+    def harvest(done):
+        for task in done:
+            seq = pending.pop(task)
+            res = task.result()
+            if collect:
+                results[seq] = res
+
+    try:
+        for seq, item in enumerate(items):
+            if len(pending) >= window:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                harvest(done)
+            pending[asyncio.ensure_future(run(item))] = seq
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            harvest(done)
+    finally:
+        for task in pending:
+            task.cancel()
+        if sink is not None:
+            sink.close()
+
+    return [results[seq] for seq in sorted(results)]
+
+
+async def async_batch_extract(
+    rows,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    *,
+    final_csv: str | None = None,
+    fieldnames: list[str] | None = None,
+    cache=None,
+    journal=None,
+    collect: bool = True,
+    dedupe=None,
+    rules=None,
+    local=None,
+    prior=None,
+) -> list[dict]:
+    """Async version of :func:`modules.extraction.batch_extract`."""
+    extraction.LIMITER.default_concurrency(concurrency)
+    extract_kwargs = {"local": local} if local is not None else {}
+
+    async def worker(row: dict) -> dict:
+        url = extraction._row_url(row)
+        if not url:
+            logger.info("Skipping row with no URL.")
+            return {**row, "error": "Missing URL", "image_url": ""}
+        if rules is not None and rules.match(url):
+            return extraction._url_rule_result(row, url)
+
+        logger.debug("Processing URL: %s", url)
+        try:
+            if dedupe is not None:
+                data = await dedupe.ado(url, lambda u: aextract_item_data(u, cache, **extract_kwargs))
+            else:
+                data = await aextract_item_data(url, cache, **extract_kwargs)
+        except Exception as e:
+            return extraction._item_result(row, url, error=e)
+        return extraction._item_result(row, url, data)
+
+    if prior is not None:
+        worker = prior.awrap(worker, "names")
+
+    return await bounded_map(
+        worker,
+        rows,
+        concurrency,
+        fieldnames=fieldnames or extraction.ITEM_FIELDNAMES,
+        final_csv=final_csv,
+        journal=journal,
+        collect=collect,
+        stage="names",
+    )
+
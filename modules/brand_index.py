@@ -0,0 +1,234 @@
+# brand_index.py
+
+import csv
+import json
+import threading
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+from modules.brand_map import DEFAULT_MAP_PATH, cleanup_brand_name, normalize_text
+
+EXACT = "exact"
+PREFIX = "prefix"
+FUZZY = "fuzzy"
+REVIEW = "review"
+
+# Kinds of match that replace the brand; ``review`` only flags it
+MAPPED = (EXACT, PREFIX, FUZZY)
+
+
+class Match(NamedTuple):
+    """How a spelling maps; ``candidate`` is the closest brand even when ``canonical`` is ``None``."""
+
+    canonical: str | None
+    kind: str | None
+    score: float = 0.0
+    candidate: str | None = None
+
+
+_NO_MATCH = Match(None, None)
+
+
+def brand_key(name: str) -> str:
+    """
+    Return the canonical key of a brand spelling.
+
+    Case, accents, punctuation and spacing are dropped, so ``ARC'TERYX``,
+    ``Arc-teryx`` and ``ARC TERYX`` share the key ``arcteryx``.
+    """
+    return normalize_text(name).replace(" ", "")
+
+
+def _grams(key: str) -> set[str]:
+    padded = f"^{key}$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Return the edit distance between ``a`` and ``b`` counting adjacent
+    transpositions as one edit, or ``limit + 1`` once it exceeds ``limit``.
+
+    Only the diagonal band of width ``2 * limit + 1`` is computed.
+    """
+    if a == b:
+        return 0
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    n = len(b)
+    prev2, prev = None, [j if j <= limit else over for j in range(n + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i - 1]
+        lo, hi = max(1, i - limit), min(n, i + limit)
+        cur = [over] * (n + 1)
+        cur[0] = i if i <= limit else over
+        best = cur[0]
+        for j in range(lo, hi + 1):
+            cb = b[j - 1]
+            v = prev[j - 1] + (ca != cb)
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if cur[j - 1] + 1 < v:
+                v = cur[j - 1] + 1
+            if prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb and prev2[j - 2] + 1 < v:
+                v = prev2[j - 2] + 1
+            cur[j] = v
+            if v < best:
+                best = v
+        if best > limit:
+            return over
+        prev2, prev = prev, cur
+    return min(prev[n], over)
+
+
+class BrandIndex:
+    """
+    Map brand spellings to canonical brands.
+
+    Every alias in ``docs/map.json`` is stored under its :func:`brand_key`, so
+    spellings that only differ in case, punctuation or spacing resolve with one
+    dict lookup (``exact``). A spelling that starts with a whole known brand
+    of at least ``min_prefix`` letters (``ARC TERYX LEAF``) maps to it
+    (``prefix``); shorter brands such as ``GAP`` start too many unrelated
+    names (``VIS Cosmetics`` is not ``VIS``). Anything else is looked up in
+    a trigram inverted index and the candidates sharing the most trigrams are
+    compared by edit distance: a unique best candidate at least ``accept``
+    similar maps to it (``fuzzy``); one at least ``review`` similar is only
+    recorded in :attr:`near_misses` for a person to check.
+
+    :meth:`add_counts` learns spellings from past outputs, most frequent first,
+    so the common spelling of a brand missing from the map becomes its
+    canonical entry and rarer variants fold into it.
+    """
+
+    def __init__(
+        self,
+        aliases: dict[str, list[str]] | None = None,
+        *,
+        accept: float = 0.85,
+        review: float = 0.7,
+        min_prefix: int = 5,
+        candidates: int = 20,
+        max_postings: int = 2000,
+    ):
+        self.accept = accept
+        self.review = review
+        self.min_prefix = min_prefix
+        self.candidates = candidates
+        self.max_postings = max_postings
+        self._canonical: dict[str, str] = {}
+        self._keys: list[str] = []
+        self._postings: dict[str, list[int]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.near_misses: dict[str, Match] = {}
+        for canonical, names in (aliases or {}).items():
+            display = cleanup_brand_name(canonical)
+            for alias in [canonical, *names]:
+                self._add(brand_key(alias), display)
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_MAP_PATH, **kwargs) -> "BrandIndex":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _add(self, key: str, canonical: str) -> None:
+        if not key or key in self._canonical:
+            return
+        self._canonical[key] = canonical
+        entry = len(self._keys)
+        self._keys.append(key)
+        for gram in _grams(key):
+            self._postings[gram].append(entry)
+
+    def _prefix(self, name: str) -> Match | None:
+        tokens = normalize_text(name).split()
+        key = ""
+        best = None
+        for token in tokens[:-1]:
+            key += token
+            if len(key) >= self.min_prefix and key in self._canonical:
+                best = key
+        return Match(self._canonical[best], PREFIX, 1.0, self._canonical[best]) if best else None
+
+    def _fuzzy(self, key: str) -> Match:
+        # Trigrams shared by very many brands ("the", "ion") say little and
+        # would make every lookup walk most of the index, so they are skipped
+        postings = sorted((self._postings.get(gram, ()) for gram in _grams(key)), key=len)
+        used = [p for p in postings if len(p) <= self.max_postings] or postings[:1]
+        shared = Counter()
+        for entries in used:
+            shared.update(entries)
+        # Each edit changes at most three trigrams, which bounds how close a
+        # candidate sharing few of them can be; the edit distance of the rest
+        # is only computed up to what could still beat the best so far
+        best, best_score, tied = None, 0.0, False
+        for entry, count in shared.most_common(self.candidates):
+            other = self._keys[entry]
+            longest = max(len(key), len(other))
+            limit = int(longest * (1 - max(self.review, best_score)) + 1e-9)
+            if (len(used) - count + 2) // 3 > limit:
+                continue
+            dist = edit_distance(key, other, limit)
+            if dist > limit:
+                continue
+            score = 1 - dist / longest
+            if score > best_score:
+                best, best_score, tied = other, score, False
+            elif score == best_score and self._canonical[other] != self._canonical[best]:
+                tied = True
+        if best is None or best_score < self.review:
+            return _NO_MATCH
+        match = Match(self._canonical[best], FUZZY, round(best_score, 3), self._canonical[best])
+        if best_score >= self.accept and not tied:
+            return match
+        return match._replace(canonical=None, kind=REVIEW)
+
+    def match(self, name: str) -> Match:
+        """Return how ``name`` maps to a canonical brand; near-misses are also recorded."""
+        key = brand_key(name)
+        if not key:
+            return _NO_MATCH
+        canonical = self._canonical.get(key)
+        if canonical is not None:
+            return Match(canonical, EXACT, 1.0, canonical)
+        match = self._prefix(name) or self._fuzzy(key)
+        if match.kind == REVIEW:
+            with self._lock:
+                self.near_misses[cleanup_brand_name(name)] = match
+        return match
+
+    def canonical(self, name: str) -> str | None:
+        """Return the canonical brand for ``name``, or ``None`` if it has none (yet)."""
+        return self.match(name).canonical
+
+    def add_counts(self, counts) -> dict:
+        """
+        Learn brand spellings from past outputs.
+
+        ``counts`` maps spellings to how often they were seen. Spellings are
+        added most frequent first: one that maps to an existing entry becomes
+        an alias of it, any other becomes a canonical brand of its own (a
+        near-miss is still recorded for review). Returns counts per outcome.
+        """
+        outcomes = Counter()
+        for name, _ in sorted(counts.items(), key=lambda kv: (-kv[1], kv[0])):
+            cleaned = cleanup_brand_name(name)
+            match = self.match(cleaned)
+            if match.kind in MAPPED:
+                self._add(brand_key(cleaned), match.canonical)
+            else:
+                self._add(brand_key(cleaned), cleaned)
+            outcomes[match.kind or "new"] += 1
+        return dict(outcomes)
+
+    def add_outputs(self, paths) -> dict:
+        """Learn the ``brand`` column of past ``brands.csv`` files (see :meth:`add_counts`)."""
+        counts = Counter()
+        for path in paths:
+            with open(path, newline="", encoding="utf-8") as f:
+                counts.update(row["brand"] for row in csv.DictReader(f) if row.get("brand"))
+        return self.add_counts(counts)
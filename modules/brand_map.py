@@ -0,0 +1,168 @@
+# brand_map.py
+
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from modules.urls import registrable_domain
+
+DEFAULT_MAP_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "docs", "map.json")
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-zÀ-￿]+")
+_ASCII_ALNUM = re.compile(r"[0-9a-z ]*")
+
+# Aliases shorter than this (ignoring spaces), such as "dc", "gap" or "y 3",
+# are also ordinary words, so they only count when they are the whole text
+MIN_ALIAS_LENGTH = 4
+
+
+def normalize_text(text: str) -> str:
+    """Return ``text`` lowercased, accent-stripped and split into space separated tokens."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(t for t in _TOKEN_SPLIT.split(text.lower()) if t)
+
+
+def cleanup_brand_name(name: str) -> str:
+    """Return a cleaned brand name for easier consolidation."""
+    if not name:
+        return ""
+    cleaned = name.replace("_", " ").replace("-", " ")
+    cleaned = " ".join(cleaned.split())
+    # Keep brand names uppercase for easier consolidation. Do not change this
+    # to title case.
+    return cleaned.upper()
+
+
+class AliasMatcher:
+    """
+    Match brand aliases in free text and resolve them to canonical brands.
+
+    ASCII aliases are compiled into a token trie so a text is scanned in one
+    pass regardless of the number of aliases. Aliases shorter than
+    :data:`MIN_ALIAS_LENGTH` only match a text that is exactly the alias.
+    Aliases written in scripts that do not separate words with spaces (e.g.
+    Japanese) are matched as substrings instead.
+    """
+
+    def __init__(self, aliases: dict[str, list[str]]):
+        self._trie: dict = {}
+        self._substrings: list[tuple[str, str]] = []
+        self._short: set[str] = set()
+        for canonical, names in aliases.items():
+            for alias in [canonical, *names]:
+                norm = normalize_text(alias)
+                if not norm:
+                    continue
+                if _ASCII_ALNUM.fullmatch(norm):
+                    if len(norm.replace(" ", "")) < MIN_ALIAS_LENGTH:
+                        self._short.add(norm)
+                    node = self._trie
+                    for token in norm.split():
+                        node = node.setdefault(token, {})
+                    node[None] = canonical
+                else:
+                    self._substrings.append((norm.replace(" ", ""), canonical))
+        self._lock = threading.Lock()
+        self.rows_seen = 0
+        self.rows_resolved = 0
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_MAP_PATH) -> "AliasMatcher":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def find(self, text: str) -> set[str]:
+        """Return every canonical brand with an alias in ``text``."""
+        norm = normalize_text(text)
+        tokens = norm.split()
+        found = set()
+        for i in range(len(tokens)):
+            node = self._trie
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    whole = i == 0 and j == len(tokens) - 1
+                    if whole or " ".join(tokens[i : j + 1]) not in self._short:
+                        found.add(node[None])
+        if self._substrings:
+            compact = norm.replace(" ", "")
+            found.update(c for alias, c in self._substrings if alias in compact)
+        return found
+
+    def canonical(self, text: str) -> str | None:
+        """Return the canonical brand if ``text`` as a whole is one of its aliases."""
+        norm = normalize_text(text)
+        node = self._trie
+        for token in norm.split():
+            node = node.get(token)
+            if node is None:
+                break
+        else:
+            if None in node and norm:
+                return node[None]
+        compact = norm.replace(" ", "")
+        return next((c for alias, c in self._substrings if alias == compact), None)
+
+    def resolve(self, text: str) -> str | None:
+        """Return the canonical brand in ``text`` if exactly one matches."""
+        found = self.find(text)
+        return next(iter(found)) if len(found) == 1 else None
+
+    def host_brand(self, url: str) -> str | None:
+        """
+        Return the canonical brand whose alias is the name of ``url``'s host.
+
+        Only the name part of the registrable domain counts as a whole
+        (``arcteryx`` in ``jp.arcteryx.co.jp``), so ``ete-shop.com`` or a
+        brand in the path does not match.
+        """
+        name = registrable_domain(url).split(".", 1)[0] if url else ""
+        return self.canonical(name) if name else None
+
+    def resolve_row(self, item_name: str, url: str) -> str | None:
+        """
+        Resolve a row from its item name, falling back to the URL host.
+
+        An ambiguous item name (several brands) is not overridden by the URL,
+        so the row is left for the LLM.
+        """
+        found = self.find(item_name)
+        if not found:
+            brand = self.host_brand(url)
+            found = {brand} if brand else set()
+        brand = next(iter(found)) if len(found) == 1 else None
+        with self._lock:
+            self.rows_seen += 1
+            if brand is not None:
+                self.rows_resolved += 1
+        return brand
+
+    def stats(self) -> dict:
+        """Return how many rows were resolved without the LLM."""
+        with self._lock:
+            seen, resolved = self.rows_seen, self.rows_resolved
+        return {
+            "rows": seen,
+            "resolved": resolved,
+            "share": resolved / seen if seen else 0.0,
+        }
+
+
+_DEFAULT_MATCHER: AliasMatcher | None = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_matcher() -> AliasMatcher:
+    """Return the shared matcher built from ``docs/map.json``."""
+    global _DEFAULT_MATCHER
+    with _DEFAULT_LOCK:
+        if _DEFAULT_MATCHER is None:
+            _DEFAULT_MATCHER = AliasMatcher.from_file()
+        return _DEFAULT_MATCHER
@@ -0,0 +1,201 @@
+# cache.py
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from modules import metrics
+from modules.urls import normalize_url
+
+# Default lifetime of a cached entry, in seconds (30 days)
+DEFAULT_TTL = 30 * 24 * 60 * 60
+
+
+class SQLiteCache:
+    """
+    A small persistent key/value cache backed by SQLite.
+
+    Values are stored as JSON together with the time they were written and
+    are considered stale once they are older than ``ttl`` seconds. The cache
+    is safe to share between threads. When ``refresh`` is true every lookup
+    is treated as a miss, but new values are still written, which lets a run
+    overwrite stale entries without deleting the cache file.
+    """
+
+    table = "cache"
+
+    def __init__(self, path: str, ttl: float | None = DEFAULT_TTL, refresh: bool = False):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def key(self, raw: str) -> str:
+        """Return the storage key for ``raw``."""
+        return raw
+
+    def get(self, raw: str):
+        """Return the cached value for ``raw`` or ``None`` on a miss."""
+        key = self.key(raw)
+        with self._lock:
+            if self.refresh:
+                row = None
+            else:
+                row = self._conn.execute(
+                    f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+                self.misses += 1
+                metrics.inc("cache_lookups_total", cache=self.table, result="miss")
+                return None
+            self.hits += 1
+        metrics.inc("cache_lookups_total", cache=self.table, result="hit")
+        return json.loads(row[0])
+
+    def set(self, raw: str, value) -> None:
+        """Store ``value`` for ``raw``, replacing any existing entry."""
+        key = self.key(raw)
+        data = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created) VALUES (?, ?, ?)",
+                (key, data, time.time()),
+            )
+            self._conn.commit()
+            self.writes += 1
+
+    async def aget(self, raw: str):
+        """Async version of :meth:`get`, run in a worker thread to keep the event loop free."""
+        return await asyncio.to_thread(self.get, raw)
+
+    async def aset(self, raw: str, value) -> None:
+        """Async version of :meth:`set`, run in a worker thread."""
+        await asyncio.to_thread(self.set, raw, value)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for reporting."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class MetadataCache(SQLiteCache):
+    """Cache of Firecrawl page metadata keyed by normalized URL."""
+
+    table = "metadata"
+
+    def key(self, raw: str) -> str:
+        return normalize_url(raw)
+
+
+class PromptCache(SQLiteCache):
+    """
+    Cache of raw LLM responses keyed by prompt text and model deployment.
+
+    Keys passed to :meth:`get`/:meth:`set` should come from :func:`prompt_key`
+    so that switching deployments never returns another model's answer.
+    """
+
+    table = "prompts"
+
+
+def prompt_key(prompt: str, deployment: str | None) -> str:
+    """Return a stable cache key for ``prompt`` sent to ``deployment``."""
+    digest = hashlib.sha256(f"{deployment or ''}\0{prompt}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, Future] = {}
+        self.shared = 0
+
+    def do(self, key: str, fn):
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._calls[key] = fut
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """:class:`SingleFlight` for coroutines running on one event loop."""
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+        self.shared = 0
+
+    async def do(self, key: str, coro_fn):
+        fut = self._calls.get(key)
+        if fut is not None:
+            self.shared += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[key] = fut
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
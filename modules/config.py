@@ -0,0 +1,149 @@
+# config.py
+
+import os
+import threading
+from dataclasses import dataclass, field
+
+_ENV_LOADED = False
+
+
+def load_env() -> None:
+    """Load variables from a ``.env`` file once per process."""
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _ENV_LOADED = True
+
+
+def _env_number(name: str, default, kind=int):
+    value = os.getenv(name)
+    return kind(value) if value else default
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """
+    Connection pool settings for one API client.
+
+    ``max_connections`` caps open connections; callers beyond it wait for a
+    free one (reported as ``http_pool_wait_seconds``). Up to ``max_keepalive``
+    idle connections are kept for ``keepalive_expiry`` seconds so later
+    requests skip the TCP and TLS handshakes. ``http2`` is used only when the
+    ``h2`` package is installed.
+    """
+
+    max_connections: int = 100
+    max_keepalive: int = 100
+    keepalive_expiry: float = 90.0
+    http2: bool = True
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "PoolConfig":
+        """Read ``<prefix>_POOL_SIZE``, ``_POOL_KEEPALIVE``, ``_KEEPALIVE_SECONDS`` and ``_HTTP2``."""
+        load_env()
+        size = _env_number(f"{prefix}_POOL_SIZE", cls.max_connections)
+        return cls(
+            max_connections=size,
+            max_keepalive=_env_number(f"{prefix}_POOL_KEEPALIVE", size),
+            keepalive_expiry=_env_number(f"{prefix}_KEEPALIVE_SECONDS", cls.keepalive_expiry, float),
+            http2=os.getenv(f"{prefix}_HTTP2", "1").lower() not in ("0", "false", "no"),
+        )
+
+
+@dataclass(frozen=True)
+class FirecrawlConfig:
+    """Settings for the Firecrawl client."""
+
+    api_key: str
+    api_url: str | None = None
+    pool: PoolConfig = field(default_factory=PoolConfig)
+
+    @classmethod
+    def from_env(cls) -> "FirecrawlConfig":
+        load_env()
+        api_key = os.getenv("FIRECRAWL_API_KEY")
+        if not api_key:
+            raise EnvironmentError("FIRECRAWL_API_KEY not found in environment variables or .env file")
+        return cls(
+            api_key=api_key,
+            api_url=os.getenv("FIRECRAWL_API_URL") or None,
+            pool=PoolConfig.from_env("FIRECRAWL"),
+        )
+
+
+@dataclass(frozen=True)
+class OpenAIConfig:
+    """Settings for the Azure OpenAI client."""
+
+    api_key: str | None
+    endpoint: str
+    deployment: str | None
+    api_version: str = "preview"
+    pool: PoolConfig = field(default_factory=PoolConfig)
+
+    @property
+    def base_url(self) -> str:
+        return self.endpoint.rstrip("/") + "/openai/v1/"
+
+    @classmethod
+    def from_env(cls) -> "OpenAIConfig":
+        load_env()
+        endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+        if not endpoint:
+            raise EnvironmentError("AZURE_OPENAI_ENDPOINT not found in environment variables or .env file")
+        return cls(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            endpoint=endpoint,
+            deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+            pool=PoolConfig.from_env("OPENAI"),
+        )
+
+
+class LazyClient:
+    """
+    A client that is built on first use and then reused.
+
+    ``build`` receives the config object and returns the client; the config
+    defaults to ``from_env()`` unless :meth:`configure` was called. Clients
+    are rebuilt in a new process (e.g. a process-pool worker) so connections
+    are never shared across a fork.
+    """
+
+    def __init__(self, build, from_env):
+        self._build = build
+        self._from_env = from_env
+        self._config = None
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, config) -> None:
+        """Use ``config`` for the next client instead of the environment."""
+        with self._lock:
+            self._config = config
+            self._client = None
+
+    def settings(self):
+        """Return the active config, reading the environment if needed."""
+        with self._lock:
+            if self._config is None:
+                self._config = self._from_env()
+            return self._config
+
+    def get(self):
+        """Return the shared client, creating it on first use."""
+        config = self.settings()
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self._build(config)
+                self._pid = os.getpid()
+            return self._client
+
+    def set(self, client):
+        """Replace the shared client (e.g. with a fake) and return the previous one."""
+        with self._lock:
+            previous, self._client = self._client, client
+            self._pid = os.getpid() if client is not None else None
+            return previous
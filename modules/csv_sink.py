@@ -0,0 +1,166 @@
+# csv_sink.py
+
+import csv
+import os
+import queue
+import threading
+import time
+
+from modules import metrics
+
+# Marks the end of the stream on the writer queue
+_CLOSE = object()
+
+# Row keys used inside the pipeline only; written only if listed in ``fieldnames``
+INTERNAL_FIELDS = ("error_kind",)
+
+
+class CsvSink:
+    """
+    Write rows to one CSV file from a dedicated writer thread.
+
+    Producers call :meth:`write` from any thread; rows are queued and the
+    writer keeps a single buffered file handle open, flushing every
+    ``flush_rows`` rows or ``flush_interval`` seconds, whichever comes first.
+    With ``ordered=True`` every call carries a sequence number and rows are
+    held in a reorder buffer until all earlier sequence numbers have been
+    written, so the file follows input order. A position finished later
+    (a row retried at the end of a run) is released with :meth:`defer`, so it
+    does not hold every later row in memory; its rows are appended when they
+    are written. ``queue_size`` bounds the number of pending writes, blocking
+    producers when the disk falls behind.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fieldnames: list[str] | None = None,
+        *,
+        ordered: bool = False,
+        flush_rows: int = 500,
+        flush_interval: float = 1.0,
+        queue_size: int = 10000,
+    ):
+        self.path = path
+        self.fieldnames = fieldnames
+        self.ordered = ordered
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="csv-sink", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "CsvSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write(self, rows: dict | list[dict], seq: int | None = None) -> None:
+        """
+        Queue one row (or a list of rows) for writing.
+
+        In ordered mode ``seq`` must be given for every position, starting
+        at 0; pass an empty list for positions that produced no rows.
+        """
+        if self._error is not None:
+            raise self._error
+        if isinstance(rows, dict):
+            rows = [rows]
+        if self.ordered and seq is None:
+            raise ValueError("ordered CsvSink.write() requires a sequence number")
+        self._queue.put((seq, rows))
+
+    def defer(self, seq: int) -> None:
+        """
+        Release position ``seq`` of an ordered sink without writing it yet.
+
+        Later positions are written as soon as they are ready; the rows of
+        ``seq`` are written wherever the file has got to when they arrive.
+        Does nothing for an unordered sink.
+        """
+        if self.ordered:
+            self._queue.put((seq, None))
+
+    def close(self) -> None:
+        """Write all queued rows, close the file and re-raise any writer error."""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def _run(self) -> None:
+        f = None
+        item = None
+        try:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            f = open(self.path, "a", newline="", buffering=1 << 20)
+            writer = None
+            pending: dict[int, list[dict]] = {}
+            next_seq = 0
+            unflushed = 0
+            last_flush = time.monotonic()
+
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    item = None
+
+                metrics.set_gauge("queue_depth", self._queue.qsize(), queue=f"csv:{os.path.basename(self.path)}")
+                ready: list[dict] = []
+                if item is _CLOSE:
+                    # Anything left in the reorder buffer follows a gap; keep it.
+                    for seq in sorted(pending):
+                        ready.extend(pending[seq])
+                elif item is not None:
+                    seq, rows = item
+                    if not self.ordered:
+                        ready = rows
+                    elif rows is None:
+                        # A deferred position counts as written for now
+                        pending[seq] = []
+                    elif seq < next_seq:
+                        # Rows of a deferred position the file has moved past
+                        ready = rows
+                    else:
+                        pending[seq] = rows
+                    if self.ordered:
+                        ready = list(ready)
+                        while next_seq in pending:
+                            ready.extend(pending.pop(next_seq))
+                            next_seq += 1
+
+                for row in ready:
+                    if writer is None:
+                        fieldnames = self.fieldnames or list(row.keys())
+                        internal = [k for k in INTERNAL_FIELDS if k not in fieldnames]
+                        writer = csv.DictWriter(f, fieldnames=fieldnames)
+                        if write_header:
+                            writer.writeheader()
+                    if any(k in row for k in internal):
+                        row = {k: v for k, v in row.items() if k not in internal}
+                    writer.writerow(row)
+                unflushed += len(ready)
+                self.rows_written += len(ready)
+
+                now = time.monotonic()
+                if item is _CLOSE or unflushed >= self.flush_rows or now - last_flush >= self.flush_interval:
+                    f.flush()
+                    unflushed = 0
+                    last_flush = now
+                if item is _CLOSE:
+                    return
+        except BaseException as e:
+            self._error = e
+            # Keep draining so producers never block on a dead writer
+            while item is not _CLOSE:
+                item = self._queue.get()
+        finally:
+            if f is not None:
+                f.close()
@@ -0,0 +1,31 @@
+# csv_source.py
+
+import csv
+from itertools import islice
+
+
+def read_csv_rows(path: str, start: int = 1, end: int | None = None):
+    """
+    Return an iterator over rows ``start`` to ``end`` (1-indexed, inclusive) of ``path``.
+
+    Rows are parsed one at a time as they are consumed; rows before ``start``
+    are skipped without being kept. The file is opened immediately, so a
+    missing file raises :class:`FileNotFoundError` here rather than on first use.
+    """
+    f = open(path, newline="")
+    return _iter_rows(f, max(start - 1, 0), end)
+
+
+def _iter_rows(f, start: int, end: int | None):
+    with f:
+        yield from islice(csv.DictReader(f), start, end)
+
+
+def chunked(items, size: int):
+    """Yield lists of up to ``size`` consecutive items without reading ahead."""
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, max(size, 1)))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,108 @@
+# dedupe.py
+
+import threading
+
+from modules.cache import AsyncSingleFlight, SingleFlight
+from modules.errors import is_retryable
+from modules.hedging import deadline_missed
+from modules.urls import UrlCanonicalizer, default_canonicalizer
+
+
+class UrlDeduper:
+    """
+    Run a fetch once per canonical URL and share the outcome with duplicates.
+
+    Rows whose URLs differ only in tracking parameters, fragments or
+    ``www.``/mobile hosts map to the same key (see
+    :class:`modules.urls.UrlCanonicalizer`). The first row with a key runs the
+    fetch with its own URL. Concurrent duplicates wait for that fetch, and
+    later ones reuse the stored result or exception, unless the exception is
+    retryable (see :mod:`modules.errors`). One instance covers one run;
+    outcomes are kept in memory only for its lifetime.
+    """
+
+    def __init__(self, canonicalizer: UrlCanonicalizer | None = None):
+        self.canonicalize = canonicalizer or default_canonicalizer()
+        self._lock = threading.Lock()
+        self._done: dict[str, tuple[bool, object]] = {}
+        self._inflight = SingleFlight()
+        self._ainflight = AsyncSingleFlight()
+        self.rows = 0
+
+    def _lookup(self, url: str) -> tuple[str, tuple[bool, object] | None]:
+        key = self.canonicalize(url)
+        with self._lock:
+            self.rows += 1
+            return key, self._done.get(key)
+
+    def _store(self, key: str, outcome: tuple[bool, object]) -> None:
+        with self._lock:
+            self._done[key] = outcome
+
+    @staticmethod
+    def _replay(outcome: tuple[bool, object]):
+        ok, value = outcome
+        if ok:
+            return value
+        raise value
+
+    def do(self, url: str, fetch):
+        """Return ``fetch(url)``, running it at most once per canonical URL."""
+        key, outcome = self._lookup(url)
+        if outcome is not None:
+            return self._replay(outcome)
+
+        def call():
+            with self._lock:
+                outcome = self._done.get(key)
+            if outcome is not None:
+                return self._replay(outcome)
+            try:
+                value = fetch(url)
+            except Exception as e:
+                # Abandoned and transient failures are not replayed to later rows
+                if not deadline_missed(e) and not is_retryable(e):
+                    self._store(key, (False, e))
+                raise
+            self._store(key, (True, value))
+            return value
+
+        try:
+            return self._inflight.do(key, call)
+        except Exception as e:
+            # Rows that shared an abandoned scrape are retried later as well
+            deadline_missed(e)
+            raise
+
+    async def ado(self, url: str, fetch):
+        """Async version of :meth:`do` for a coroutine function ``fetch``."""
+        key, outcome = self._lookup(url)
+        if outcome is not None:
+            return self._replay(outcome)
+
+        async def call():
+            outcome = self._done.get(key)
+            if outcome is not None:
+                return self._replay(outcome)
+            try:
+                value = await fetch(url)
+            except Exception as e:
+                if not is_retryable(e):
+                    self._store(key, (False, e))
+                raise
+            self._store(key, (True, value))
+            return value
+
+        return await self._ainflight.do(key, call)
+
+    def stats(self) -> dict:
+        """Return row and unique URL counts and the share of rows deduplicated."""
+        with self._lock:
+            rows, unique = self.rows, len(self._done)
+        duplicates = max(rows - unique, 0)
+        return {
+            "rows": rows,
+            "unique": unique,
+            "duplicates": duplicates,
+            "dedupe_ratio": duplicates / rows if rows else 0.0,
+        }
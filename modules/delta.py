@@ -0,0 +1,225 @@
+# delta.py
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from modules import metrics
+from modules.urls import normalize_url
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = "data/cache/prior_outputs.sqlite"
+
+
+def _url(row: dict) -> str:
+    return normalize_url(row.get("item_url") or row.get("url", ""))
+
+
+def _names_key(row: dict) -> str:
+    return _url(row)
+
+
+def _brands_key(row: dict) -> str:
+    return f"{_url(row)}\0{row.get('item_name', '').strip()}"
+
+
+def _names_value(row: dict) -> list | None:
+    # Fallback rows kept the input name because the scrape failed, so they are
+    # always recomputed rather than carried forward.
+    if row.get("error") or not row.get("item_name") or str(row.get("used_fallback", "")).lower() == "true":
+        return None
+    return [row["item_name"], row.get("image_url", "")]
+
+
+def _brands_value(row: dict) -> list | None:
+    if row.get("brand_error") or not row.get("brand"):
+        return None
+    return [row["brand"]]
+
+
+def _names_result(row: dict, value: list) -> dict:
+    # Indexes written before fallback rows were skipped hold a third field
+    item_name, image_url = value[:2]
+    return {
+        "month": row.get("month", ""),
+        "url": row.get("item_url") or row.get("url", ""),
+        "item_count": row.get("item_count", ""),
+        "image_url": image_url,
+        "item_name": item_name,
+        "error": "",
+        "used_fallback": False,
+    }
+
+
+def _brands_result(row: dict, value: list) -> dict:
+    return {
+        "month": row.get("month", ""),
+        "url": row.get("url", ""),
+        "item_count": row.get("item_count", ""),
+        "item_name": row.get("item_name", "").strip(),
+        "image_url": row.get("image_url", ""),
+        "brand": value[0],
+        "brand_error": "",
+    }
+
+
+# stage -> (key of a row, value to index from an output row, output row from a value)
+_STAGES = {
+    "names": (_names_key, _names_value, _names_result),
+    "brands": (_brands_key, _brands_value, _brands_result),
+}
+
+
+def _hash(key: str) -> int:
+    """Return a signed 64-bit hash of ``key``, stored as the SQLite rowid."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+class PriorOutputs:
+    """
+    Index of results from earlier runs, used to process only new or changed rows.
+
+    Item names are keyed by normalized URL and brands by normalized URL plus
+    item name, so a row whose page or name changed misses and is processed
+    again. Keys are stored as 64-bit hashes in the table's rowid, which keeps
+    the index a fraction of the size of the CSVs it covers. Rows that ended
+    in an error, including names that fell back to the input name, are not
+    indexed, so they are retried on the next run.
+    :meth:`load` reads an output CSV into the index, resuming from where the
+    previous load of the same file stopped.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self.reused = {stage: 0 for stage in _STAGES}
+        self.recomputed = {stage: 0 for stage in _STAGES}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for stage in _STAGES:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {stage} (key INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+        # ``size`` is the byte offset up to which a source has been indexed
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, size INTEGER NOT NULL)")
+        self._conn.commit()
+
+    def load(self, stage: str, csv_path: str) -> int:
+        """
+        Index the usable rows of the ``stage`` output ``csv_path``.
+
+        Only the part of the file added since its last load is read; a file
+        that shrank is read again from the start. A last line without its
+        newline is still being written and is left for the next load. Returns
+        the number of rows indexed.
+        """
+        if not os.path.exists(csv_path):
+            return 0
+        key_fn, value_fn, _ = _STAGES[stage]
+        source = os.path.abspath(csv_path)
+        size = os.path.getsize(csv_path)
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM sources WHERE path = ?", (source,)).fetchone()
+        offset = row[0] if row is not None and row[0] <= size else 0
+
+        # Byte offsets only mean something in binary mode, so complete lines
+        # are read as bytes and decoded one by one.
+        with open(csv_path, "rb") as f:
+            header_line = f.readline()
+            if not header_line.endswith(b"\n"):
+                return 0
+            header = next(csv.reader([header_line.decode("utf-8")]))
+            end = max(offset, f.tell())
+            f.seek(end)
+
+            def lines():
+                nonlocal end
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    end += len(line)
+                    yield line.decode("utf-8")
+
+            entries = []
+            for out in csv.DictReader(lines(), fieldnames=header):
+                value = value_fn(out)
+                if value is not None:
+                    entries.append((_hash(key_fn(out)), json.dumps(value, separators=(",", ":"))))
+
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {stage} (key, value) VALUES (?, ?)", entries)
+            self._conn.execute("INSERT OR REPLACE INTO sources (path, size) VALUES (?, ?)", (source, end))
+            self._conn.commit()
+        logger.debug("Indexed %s %s rows from %s", len(entries), stage, csv_path)
+        return len(entries)
+
+    def get(self, stage: str, row: dict) -> dict | None:
+        """Return the earlier ``stage`` result for input ``row``, or ``None`` if it must be processed."""
+        key_fn, _, result_fn = _STAGES[stage]
+        with self._lock:
+            found = self._conn.execute(f"SELECT value FROM {stage} WHERE key = ?", (_hash(key_fn(row)),)).fetchone()
+        return None if found is None else result_fn(row, json.loads(found[0]))
+
+    def _count(self, stage: str, reused: int, recomputed: int) -> None:
+        with self._lock:
+            self.reused[stage] += reused
+            self.recomputed[stage] += recomputed
+        if reused:
+            metrics.inc("delta_rows_total", reused, stage=stage, outcome="reused")
+        if recomputed:
+            metrics.inc("delta_rows_total", recomputed, stage=stage, outcome="recomputed")
+
+    def wrap(self, fn, stage: str):
+        """Return ``fn`` answering rows with earlier ``stage`` results where possible."""
+
+        def run(row):
+            res = self.get(stage, row)
+            if res is not None:
+                self._count(stage, 1, 0)
+                return res
+            self._count(stage, 0, 1)
+            return fn(row)
+
+        return run
+
+    def wrap_batch(self, fn, stage: str):
+        """Like :meth:`wrap` for ``fn`` taking and returning a list of rows."""
+
+        def run(rows):
+            results = [self.get(stage, row) for row in rows]
+            missing = [row for row, res in zip(rows, results) if res is None]
+            self._count(stage, len(rows) - len(missing), len(missing))
+            computed = iter(fn(missing) if missing else [])
+            return [res if res is not None else next(computed) for res in results]
+
+        return run
+
+    def awrap(self, coro_fn, stage: str):
+        """Async version of :meth:`wrap`."""
+
+        async def run(row):
+            res = self.get(stage, row)
+            if res is not None:
+                self._count(stage, 1, 0)
+                return res
+            self._count(stage, 0, 1)
+            return await coro_fn(row)
+
+        return run
+
+    def stats(self, stage: str) -> dict:
+        """Return how many ``stage`` rows were reused and how many recomputed."""
+        with self._lock:
+            reused, recomputed = self.reused[stage], self.recomputed[stage]
+        total = reused + recomputed
+        return {"reused": reused, "recomputed": recomputed, "reuse_rate": reused / total if total else 0.0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
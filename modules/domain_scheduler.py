@@ -0,0 +1,171 @@
+# domain_scheduler.py
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from modules.urls import url_host
+
+
+class _Host:
+    __slots__ = ("rows", "in_flight", "failures", "blocked_until", "done", "failed", "backoffs")
+
+    def __init__(self):
+        self.rows: deque = deque()
+        self.in_flight = 0
+        self.failures = 0  # consecutive
+        self.blocked_until = 0.0
+        self.done = 0
+        self.failed = 0
+        self.backoffs = 0
+
+
+class DomainScheduler:
+    """
+    Reorder rows so no host gets more than ``max_per_host`` requests at once.
+
+    :meth:`schedule` reads up to ``lookahead`` rows ahead of the workers and
+    groups them by host. It then hands rows out round-robin across hosts,
+    skipping any host that is at its cap or backing off. After a host fails
+    ``failure_threshold`` times in a row (access-denied pages or scrape errors),
+    it is paused for ``backoff`` seconds, doubling with each further failure up
+    to ``max_backoff``. Other hosts keep going. Wrap the worker function with
+    :meth:`wrap` so the scheduler sees every outcome.
+
+    Meant for thread pools: :meth:`schedule` blocks the consuming thread while
+    every buffered host is busy.
+    """
+
+    def __init__(
+        self,
+        max_per_host: int = 4,
+        *,
+        lookahead: int = 1000,
+        failure_threshold: int = 2,
+        backoff: float = 5.0,
+        max_backoff: float = 300.0,
+    ):
+        self.max_per_host = max(max_per_host, 1)
+        self.lookahead = max(lookahead, 1)
+        self.failure_threshold = max(failure_threshold, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._hosts: OrderedDict[str, _Host] = OrderedDict()
+        self._buffered = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls, prefix: str = "FIRECRAWL") -> "DomainScheduler":
+        """Build a scheduler capped by ``<prefix>_MAX_PER_HOST`` (default 4)."""
+        value = os.getenv(f"{prefix}_MAX_PER_HOST")
+        return cls(int(value)) if value else cls()
+
+    @staticmethod
+    def host(row: dict) -> str:
+        return url_host(row.get("item_url") or row.get("url", ""))
+
+    def _state(self, host: str) -> _Host:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _Host()
+        return state
+
+    def _pick(self, now: float):
+        """Return the next row from a ready host, rotating that host to the back."""
+        for host, state in self._hosts.items():
+            if state.rows and state.in_flight < self.max_per_host and state.blocked_until <= now:
+                self._hosts.move_to_end(host)
+                state.in_flight += 1
+                self._buffered -= 1
+                return state.rows.popleft()
+        return None
+
+    def _next_wake(self, now: float) -> float | None:
+        """Return seconds until a backed-off host with waiting rows may run again."""
+        waits = [
+            s.blocked_until - now
+            for s in self._hosts.values()
+            if s.rows and s.in_flight < self.max_per_host and s.blocked_until > now
+        ]
+        return min(waits) if waits else None
+
+    def schedule(self, rows, passthrough=None, key=None):
+        """
+        Yield ``rows`` interleaved by host under the per-host caps.
+
+        Rows for which ``passthrough(row)`` is true (e.g. already journaled)
+        are yielded immediately and are not counted against their host.
+        ``key`` returns the input row of each item when the items are not
+        rows themselves (e.g. ``(seq, row)`` jobs).
+        """
+        it = iter(rows)
+        exhausted = False
+        while True:
+            # Keep the lookahead buffer full so every host in it gets its turn
+            if not exhausted and self._buffered < self.lookahead:
+                try:
+                    row = next(it)
+                except StopIteration:
+                    exhausted = True
+                    continue
+                if passthrough is not None and passthrough(row):
+                    yield row
+                    continue
+                with self._cond:
+                    self._state(self.host(key(row) if key is not None else row)).rows.append(row)
+                    self._buffered += 1
+                continue
+
+            with self._cond:
+                if self._buffered == 0:
+                    return
+                now = time.monotonic()
+                row = self._pick(now)
+                if row is None:
+                    # Every buffered host is busy or backing off
+                    self._cond.wait(self._next_wake(now))
+                    continue
+            yield row
+
+    def done(self, row: dict, failed: bool) -> None:
+        """Release ``row``'s slot and update its host's backoff state."""
+        with self._cond:
+            state = self._state(self.host(row))
+            state.in_flight -= 1
+            state.done += 1
+            if failed:
+                state.failed += 1
+                state.failures += 1
+                if state.failures >= self.failure_threshold:
+                    exponent = state.failures - self.failure_threshold
+                    delay = min(self.backoff * 2**exponent, self.max_backoff)
+                    state.blocked_until = time.monotonic() + delay
+                    state.backoffs += 1
+            else:
+                state.failures = 0
+                state.blocked_until = 0.0
+            self._cond.notify_all()
+
+    def wrap(self, fn, is_failure):
+        """Return ``fn`` reporting each outcome to :meth:`done`; ``is_failure(result)`` classifies results."""
+
+        def run(row):
+            failed = True
+            try:
+                res = fn(row)
+                failed = is_failure(res)
+                return res
+            finally:
+                self.done(row, failed)
+
+        return run
+
+    def snapshot(self) -> dict:
+        """Return per-host counts for the busiest hosts, for logging."""
+        with self._cond:
+            hosts = sorted(self._hosts.items(), key=lambda kv: kv[1].done, reverse=True)[:10]
+            return {
+                host: {"done": s.done, "failed": s.failed, "backoffs": s.backoffs}
+                for host, s in hosts
+            }
@@ -0,0 +1,103 @@
+# errors.py
+
+import random
+
+TRANSIENT = "transient"
+THROTTLED = "throttled"
+PERMANENT = "permanent"
+ACCESS_DENIED = "access_denied"
+
+# Failures worth another attempt later in the same run
+RETRYABLE = (TRANSIENT, THROTTLED)
+
+# Exception classes (matched by name anywhere in the MRO, so the SDKs need not
+# be imported) that mean the request may well succeed if sent again
+_TRANSIENT_TYPES = {
+    "TimeoutError",
+    "ConnectionError",
+    "Timeout",  # requests
+    "TransportError",  # httpx
+    "TimeoutException",  # httpx
+    "RemoteProtocolError",  # httpx
+    "APIConnectionError",  # openai, including APITimeoutError
+}
+
+
+class AccessDeniedError(ValueError):
+    """Raised when a page answers with an access-denied page instead of the item."""
+
+    def __init__(self, message: str = "Access Denied"):
+        super().__init__(message)
+
+
+def _status(error: BaseException) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _kind(error: BaseException) -> str | None:
+    if isinstance(error, AccessDeniedError):
+        return ACCESS_DENIED
+    names = {cls.__name__ for cls in type(error).__mro__}
+    status = _status(error)
+    if status == 429 or "RateLimitError" in names:
+        return THROTTLED
+    if status is not None:
+        return TRANSIENT if status >= 500 or status in (408, 425) else PERMANENT
+    if names & _TRANSIENT_TYPES:
+        return TRANSIENT
+    return None
+
+
+def classify(error: BaseException) -> str:
+    """
+    Return the kind of failure ``error`` represents.
+
+    The exception and its ``__cause__``/``__context__`` chain are checked in
+    turn, so a ``RuntimeError`` wrapping a timeout is transient. HTTP 429 and
+    rate limit errors are ``throttled``; timeouts, connection errors and 5xx
+    responses ``transient``; access-denied pages ``access_denied``; anything
+    else (4xx, unusable pages or responses) ``permanent``.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        kind = _kind(error)
+        if kind is not None:
+            return kind
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return PERMANENT
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return whether ``error`` is worth retrying later in the run."""
+    return classify(error) in RETRYABLE
+
+
+class RetryPolicy:
+    """
+    Deferred retries of rows that failed with a retryable error.
+
+    Such rows are set aside and run again after the rest of the batch, for up
+    to ``rounds`` rounds. Before each attempt a row waits a random time
+    between half and all of ``base_delay * 2 ** (round - 1)`` (at most
+    ``max_delay``), so retries of a failing host or API are spread out.
+    """
+
+    def __init__(self, rounds: int = 2, base_delay: float = 2.0, max_delay: float = 60.0, kinds=RETRYABLE):
+        self.rounds = rounds
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.kinds = tuple(kinds)
+
+    def retryable(self, result) -> bool:
+        """Return whether the output row(s) ``result`` contain a failure to retry."""
+        rows = result if isinstance(result, list) else [result]
+        return any(isinstance(row, dict) and row.get("error_kind") in self.kinds for row in rows)
+
+    def delay(self, round_no: int) -> float:
+        """Return a jittered wait before an attempt of round ``round_no`` (1-based)."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (round_no - 1))
+        return random.uniform(ceiling / 2, ceiling)
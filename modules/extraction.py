@@ -3,27 +3,72 @@
 import os
 import time
 import re
-import csv
+import logging
 import threading
-from dotenv import load_dotenv
-from firecrawl import FirecrawlApp
-import requests
-from concurrent.futures import ThreadPoolExecutor
-
-# Load environment variables from a .env file
-load_dotenv()
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from operator import itemgetter
+from modules import metrics
+from modules.api_retry import ApiRetry
+from modules.config import FirecrawlConfig, LazyClient
+from modules.csv_sink import CsvSink
+from modules.errors import PERMANENT, AccessDeniedError, classify
+from modules.hedging import Hedger, row_deadline
+from modules.journal import row_key
+from modules.priority import by_weight
+from modules.rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
 
 # --- Configuration and Initialization ---
-API_KEY = os.getenv("FIRECRAWL_API_KEY")
-if not API_KEY:
-    raise EnvironmentError("FIRECRAWL_API_KEY not found in environment variables or .env file")
-APP = FirecrawlApp(api_key=API_KEY)
+def _build_app(config: FirecrawlConfig):
+    from modules.firecrawl_client import FirecrawlClient
+
+    return FirecrawlClient(config)
+
+
+# The Firecrawl client is created on first use, so code that only parses
+# metadata never needs an API key or the SDK import. It keeps a pool of open
+# connections.
+FIRECRAWL = LazyClient(_build_app, FirecrawlConfig.from_env)
+
+
+def get_app():
+    """Return the shared Firecrawl client."""
+    return FIRECRAWL.get()
+
+
+def __getattr__(name: str):
+    # ``APP`` and ``API_KEY`` used to be created at import time
+    if name == "APP":
+        return get_app()
+    if name == "API_KEY":
+        return FIRECRAWL.settings().api_key
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # --- Global Concurrency Control State ---
 # A lock to protect access to the shared rate limit timestamp
 RATE_LIMIT_LOCK = threading.Lock()
 # The timestamp (from time.time()) after which the next request is allowed
 NEXT_ALLOWED_TIME = 0.0
+# Client-side pacing configured by FIRECRAWL_REQUESTS_PER_MINUTE and
+# FIRECRAWL_MAX_CONCURRENCY; unset limits are not enforced.
+LIMITER = RateLimiter.from_env("Firecrawl", "FIRECRAWL")
+# Row deadlines and hedging of slow scrapes, configured by FIRECRAWL_HEDGE_BUDGET,
+# FIRECRAWL_HEDGE_QUANTILE and FIRECRAWL_HEDGE_MIN_DELAY; hedging is off by default.
+HEDGER = Hedger.from_env("Firecrawl", "FIRECRAWL", LIMITER)
+
+
+def _scrape(url: str, timeout: int):
+    """Send one scrape request; hedged duplicates go through the limiter as well."""
+    with LIMITER.slot():
+        return get_app().scrape_url(
+            url=url,
+            only_main_content=False,
+            timeout=timeout,
+            proxy="basic",
+        )
 
 
 def parse_metadata(meta: dict) -> str | None:
@@ -52,6 +97,54 @@ def _normalize_whitespace(text: str) -> str:
     return " ".join(text.split()) if text else ""
 
 
+class _SharedPause:
+    """The Firecrawl wait set by a 429, shared by every thread and task."""
+
+    def delay(self) -> float:
+        # The lock is held only for a moment to get a consistent value.
+        with RATE_LIMIT_LOCK:
+            return NEXT_ALLOWED_TIME - time.time()
+
+    def extend(self, seconds: float) -> None:
+        global NEXT_ALLOWED_TIME
+        # The lock prevents a race condition where two threads overwrite the
+        # wait time with a shorter duration.
+        with RATE_LIMIT_LOCK:
+            NEXT_ALLOWED_TIME = max(NEXT_ALLOWED_TIME, time.time() + seconds)
+
+
+def _status_code(e: Exception) -> int | None:
+    """Return the HTTP status attached to ``e`` by requests, httpx or aiohttp."""
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None) or getattr(e, "status", None)
+
+
+def _retry_after(e: Exception, attempt: int) -> int:
+    # Extract wait time from the error message, default to 60s
+    match = re.search(r"retry after (\d+)s", str(e), re.I)
+    return int(match.group(1)) if match else 60
+
+
+def _checked_metadata(resp) -> dict:
+    meta = resp.metadata
+    if "error" in meta:
+        raise RuntimeError(meta["error"])
+    return meta
+
+
+def firecrawl_retry(url: str) -> ApiRetry:
+    """Return the retry handling of one Firecrawl scrape, shared with the async engine."""
+    return ApiRetry(
+        "Firecrawl",
+        LIMITER,
+        throttled=lambda e: _status_code(e) == 429,
+        throttle_wait=_retry_after,
+        message=f"Firecrawl API failed for {url}. Last error: ",
+        subject=url,
+        pause=_SharedPause(),
+    )
+
+
 def fetch_metadata(url: str, timeout: int = 20000, retries: int = 2) -> dict:
     """
     Call Firecrawl to fetch page metadata with concurrent-safe rate limiting.
@@ -60,88 +153,45 @@ def fetch_metadata(url: str, timeout: int = 20000, retries: int = 2) -> dict:
     hits a rate limit, it sets a global wait time. All other threads will then
     pause before their next request to respect this limit.
     """
-    global NEXT_ALLOWED_TIME
-    last_error = None
-    for attempt in range(retries + 1):
-        # --- Step 1: Check and wait if a rate limit is active ---
-        # The lock is held only for a moment to get a consistent value.
-        with RATE_LIMIT_LOCK:
-            delay = NEXT_ALLOWED_TIME - time.time()
+    return firecrawl_retry(url).call(
+        lambda: _checked_metadata(HEDGER.call(partial(_scrape, url, timeout))),
+        retries,
+        sleep=time.sleep,
+    )
 
-        if delay > 0:
-            print(f"Rate limit active. Thread for {url} waiting {delay:.2f} seconds.")
-            time.sleep(delay)
 
-        # --- Step 2: Perform the API call (outside the lock) ---
-        try:
-            start = time.perf_counter()
-            resp = APP.scrape_url(
-                url=url,
-                only_main_content=False,
-                timeout=timeout,
-                proxy="basic",
-            )
-            duration = time.perf_counter() - start
-            print(f"Firecrawl request for {url} took {duration:.2f} seconds")
-            meta = resp.metadata
-            if "error" in meta:
-                raise RuntimeError(meta["error"])
-            
-            # On success, return the metadata and exit the function
-            return meta
-
-        except requests.exceptions.HTTPError as e:
-            last_error = e
-            # --- Step 3: Handle Rate Limit Error (HTTP 429) ---
-            if getattr(e.response, "status_code", None) == 429:
-                # Extract wait time from the error message, default to 60s
-                match = re.search(r"retry after (\d+)s", str(e), re.I)
-                wait = int(match.group(1)) if match else 60
-                
-                print(f"Firecrawl rate limit hit for {url}. Setting wait time for {wait} seconds.")
-
-                # --- Atomically update the shared NEXT_ALLOWED_TIME ---
-                # The lock prevents a race condition where two threads overwrite the
-                # wait time with a shorter duration.
-                with RATE_LIMIT_LOCK:
-                    new_next_allowed_time = time.time() + wait
-                    NEXT_ALLOWED_TIME = max(NEXT_ALLOWED_TIME, new_next_allowed_time)
-                
-                # If we have retries left, continue to the next loop iteration.
-                # The check at the top of the loop will now handle the sleep.
-                if attempt < retries:
-                    print(f"Retrying for {url} after wait.")
-                    continue
-                else:
-                    print(f"Rate limit hit on final attempt for {url}.")
-                    # Fall through to the final error raise
-
-            else:
-                # For other HTTP errors (e.g., 404, 500), log and stop retrying.
-                print(f"Firecrawl failed for {url} with HTTPError: {e}")
-                break
-        
-        except Exception as e:
-            last_error = e
-            print(f"Firecrawl failed for {url} with an unexpected error: {e}")
-            break # Stop retrying on other unexpected errors
-
-    # If the loop completes without a successful return, raise an error.
-    raise RuntimeError(f"Firecrawl API failed for {url}. Last error: {last_error}")
-
-
-def extract_item_data(url: str) -> tuple[str, str | None]:
-    """Return item name and image URL for a given page."""
-    meta = fetch_metadata(url)
+def _item_from_metadata(url: str, meta: dict) -> tuple[str, str | None]:
+    """Return item name and image URL from ``meta`` or raise if the page is unusable."""
     name = parse_metadata(meta)
-    
+
     if name and "access denied" in name.lower():
-        raise ValueError(f"Access Denied for URL: {url}")
+        raise AccessDeniedError()
     if not name:
         raise ValueError(f"No valid item name found in metadata for URL: {url}")
-        
-    image_url = parse_image_url(meta)
-    return _normalize_whitespace(name), image_url
+
+    return _normalize_whitespace(name), parse_image_url(meta)
+
+
+def extract_item_data(url: str, cache=None, local=None) -> tuple[str, str | None]:
+    """
+    Return item name and image URL for a given page.
+
+    If ``cache`` (a :class:`modules.cache.MetadataCache`) is given, metadata is
+    read from it before calling Firecrawl. Only metadata that yields a usable
+    item name is written back, so access-denied pages are retried next run.
+    With a :class:`modules.html_meta.LocalFetcher` as ``local``, the page's
+    own ``<head>`` is tried first and Firecrawl is only called when that fails.
+    """
+    meta = cache.get(url) if cache is not None else None
+    fresh = meta is None
+    if fresh and local is not None:
+        meta = local.fetch(url)
+    if meta is None:
+        meta = fetch_metadata(url)
+    data = _item_from_metadata(url, meta)
+    if fresh and cache is not None:
+        cache.set(url, meta)
+    return data
 
 
 def extract_item_name(url: str) -> str:
@@ -150,17 +200,6 @@ def extract_item_name(url: str) -> str:
     return name
 
 
-def _append_to_csv(path: str, row: dict, fieldnames: list[str]):
-    """Append a single row to a CSV file writing headers if needed."""
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    write_header = not os.path.exists(path)
-    with open(path, "a", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if write_header:
-            writer.writeheader()
-        writer.writerow(row)
-
-
 def _thread_map(
     fn,
     items,
@@ -169,110 +208,402 @@ def _thread_map(
     fieldnames: list[str] | None = None,
     final_csv: str | None = None,
     tmp_dir: str | None = None,
+    journal=None,
+    ordered: bool = False,
+    collect: bool = True,
+    window: int | None = None,
+    stage: str = "rows",
+    deadline: float | None = None,
+    retry_fn=None,
+    weight=None,
+    retry=None,
+    dead_letter: str | None = None,
+    reschedule=None,
 ):
-    """Run tasks in a thread pool with optional CSV output."""
-    results = []
-    thread_files: dict[int, str] = {}
+    """
+    Run tasks in a thread pool with optional CSV output.
+
+    ``items`` may be any iterable and is consumed lazily: at most ``window``
+    tasks (default four per worker) are submitted at a time. Results are
+    streamed to ``final_csv`` by a single :class:`CsvSink` writer as they
+    complete; with ``ordered=True`` the file follows input order, except that
+    items run again at the end (below) are written when they finish. With
+    ``collect=False`` results are not kept and an empty list is returned, so
+    memory stays flat however long the input is. ``tmp_dir`` is accepted for
+    backward compatibility and no longer used.
+
+    With a :class:`modules.journal.RunJournal`, items already recorded by an
+    earlier (crashed) run are not processed again; their journaled results are
+    returned and written to ``final_csv`` alongside the new ones. If ``fn``
+    returns a list of rows (e.g. for a chunk of items), the rows are written,
+    journaled and returned individually; only the rows of a chunk missing
+    from the journal are passed to ``fn``. Finished rows, rows in flight and per-row
+    spans are recorded in :mod:`modules.metrics` under ``stage``.
+
+    With ``deadline`` (seconds), each item's requests are abandoned once it
+    runs out of time (see :func:`modules.hedging.row_deadline`). Such
+    stragglers are not written or journaled; they are retried with
+    ``retry_fn`` (default ``fn``) and no deadline after all other items, so a
+    few slow pages cannot hold up the rest. Their requests are charged to the
+    hedge budget, as the abandoned ones may still be running. With a ``weight`` function, the
+    weight of rows finished without an error counts as covered (see
+    :mod:`modules.priority`).
+
+    With a :class:`modules.errors.RetryPolicy` as ``retry``, items whose rows
+    failed with a transient or throttled error are set aside and run again
+    (with ``retry_fn``) after everything else, after a jittered backoff. A
+    chunk is retried as a whole. Input rows that still produced no usable
+    output at the end are written to the ``dead_letter`` CSV (replaced on
+    every call, and only created if a row fails) with their errors and
+    ``error_kind``, so a rerun can target just those rows.
+
+    ``reschedule`` reorders the ``(seq, item)`` jobs of the straggler and
+    retry passes before they are submitted, e.g. through a
+    :class:`modules.domain_scheduler.DomainScheduler`, so rows from a host
+    that was failing are not all sent again at once.
+    """
+    results: dict[int, dict | list] = {}
+    pending: dict = {}  # future -> input position
+    stragglers: list = []
+    deferred: list = []
+    window = window or max(max_workers, 1) * 4
+    sink = dead_sink = None
+    dead_lock = threading.Lock()
     if final_csv:
-        tmp_dir = tmp_dir or os.path.join(os.path.dirname(final_csv), "tmp")
-        os.makedirs(tmp_dir, exist_ok=True)
-
-    def wrapper(item):
-        res = fn(item)
-        if final_csv:
-            tid = threading.get_ident()
-            path = thread_files.get(tid)
-            if not path:
-                path = os.path.join(tmp_dir, f"thread_{tid}.csv")
-                thread_files[tid] = path
-            _append_to_csv(path, res, fieldnames or list(res.keys()))
+        if journal is not None:
+            journal.anchor_output(final_csv)
+        sink = CsvSink(final_csv, fieldnames, ordered=ordered)
+    if dead_letter:
+        if os.path.exists(dead_letter):
+            os.remove(dead_letter)
+
+    def run(item, limit, task, resend):
+        metrics.add("rows_in_flight", 1, stage=stage)
+        try:
+            with metrics.span("row", {"stage": stage}, item=_row_url(item) if isinstance(item, dict) else None):
+                with row_deadline(limit, resend=resend) as row_limit:
+                    res = task(item)
+            return None if row_limit is not None and row_limit.missed else res
+        finally:
+            metrics.add("rows_in_flight", -1, stage=stage)
+
+    def journaled(item):
+        # Chunks are journaled row by row, so a resumed run finds its rows
+        # whatever the chunk size or position
+        rows = item if isinstance(item, list) else [item]
+        keys = [row_key(row) for row in rows]
+        return keys, [journal.get(key) for key in keys]
+
+    def wrapper(seq, item, limit=deadline, task=fn, final=retry is None or retry.rounds < 1, resend=False):
+        keys, found = journaled(item) if journal is not None else ([], [None])
+        todo = item
+        if isinstance(item, list) and journal is not None:
+            todo = [row for row, out in zip(item, found) if out is None]
+        if None not in found:
+            res = found if isinstance(item, list) else found[0]
+        else:
+            res = run(todo, limit, task, resend)
+            if res is None:
+                metrics.inc("stragglers_total", stage=stage)
+                stragglers.append((seq, item))
+                if sink is not None:
+                    sink.defer(seq)
+                return None
+            if not final and retry.retryable(res):
+                metrics.inc("deferred_retries_total", stage=stage)
+                deferred.append((seq, item))
+                if sink is not None:
+                    sink.defer(seq)
+                return None
+            if journal is not None:
+                missing = [key for key, out in zip(keys, found) if out is None]
+                for key, out in zip(missing, res if isinstance(item, list) else [res]):
+                    journal.record(key, out)
+                if isinstance(item, list):
+                    computed = iter(res)
+                    res = [out if out is not None else next(computed) for out in found]
+        metrics.record_rows(stage, res, weight)
+        if sink is not None:
+            sink.write(res, seq)
+        if dead_letter:
+            dead = _dead_letters(item, res)
+            for row in dead:
+                metrics.inc("dead_letter_total", stage=stage, kind=row["error_kind"])
+            if dead:
+                dead_writer().write(dead)
         return res
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(wrapper, item) for item in items]
-        for fut in futures:
+    def dead_writer():
+        # Created on the first dead row, so a clean run leaves no file behind
+        nonlocal dead_sink
+        with dead_lock:
+            if dead_sink is None:
+                dead_sink = CsvSink(dead_letter)
+            return dead_sink
+
+    def backoff(item, round_no):
+        time.sleep(retry.delay(round_no))
+        return (retry_fn or fn)(item)
+
+    def harvest(done):
+        for fut in done:
             # .result() will re-raise exceptions from the worker threads
-            results.append(fut.result())
+            res = fut.result()
+            seq = pending.pop(fut)
+            if collect and res is not None:
+                results[seq] = res
+
+    def submit(executor, jobs, **kwargs):
+        for seq, item in jobs:
+            if len(pending) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                harvest(done)
+            pending[executor.submit(wrapper, seq, item, **kwargs)] = seq
+        harvest(wait(pending).done)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            submit(executor, enumerate(items))
+            if stragglers:
+                logger.info("Retrying %s rows that missed the %ss deadline", len(stragglers), deadline)
+                jobs = list(stragglers)
+                jobs = reschedule(jobs) if reschedule else jobs
+                submit(executor, jobs, limit=None, task=retry_fn or fn, resend=True)
+            for round_no in range(1, retry.rounds + 1) if retry is not None else ():
+                if not deferred:
+                    break
+                jobs, deferred[:] = list(deferred), []
+                logger.info("Retrying %s items with transient errors (round %s of %s)", len(jobs), round_no, retry.rounds)
+                task = partial(backoff, round_no=round_no)
+                jobs = reschedule(jobs) if reschedule else jobs
+                submit(executor, jobs, limit=None, task=task, final=round_no == retry.rounds)
+    finally:
+        if sink is not None:
+            sink.close()
+        if dead_sink is not None:
+            dead_sink.close()
+
+    flat = []
+    for seq in sorted(results):
+        res = results[seq]
+        if isinstance(res, list):
+            flat.extend(res)
+        else:
+            flat.append(res)
+    return flat
+
+
+def _usable(out: dict) -> bool:
+    """Return whether an output row has a result later stages can use despite an error."""
+    if "brand" in out:
+        return bool(out["brand"])
+    return bool(out.get("item_name"))
+
+
+def _dead_letters(item, res) -> list[dict]:
+    """
+    Return the input rows of ``item`` whose output rows in ``res`` failed.
 
-    if final_csv:
-        write_header = not os.path.exists(final_csv)
-        with open(final_csv, "a", newline="") as fout:
-            writer = csv.DictWriter(fout, fieldnames=fieldnames)
-            if write_header:
-                writer.writeheader()
-            for path in thread_files.values():
-                with open(path, newline="") as fin:
-                    for row in csv.DictReader(fin):
-                        writer.writerow(row)
-                os.remove(path)
-        if tmp_dir:
-            try:
-                os.rmdir(tmp_dir)
-            except OSError:
-                pass
-
-    return results
+    Rows that carry an error but still have a usable value (the fallback item
+    name of a names row that could not be scraped) are not dead. The names
+    ``error`` and the ``brand_error`` are kept in their own columns.
+    """
+    items = item if isinstance(item, list) else [item]
+    results = res if isinstance(res, list) else [res]
+    dead = []
+    for row, out in zip(items, results):
+        if not isinstance(row, dict) or metrics.row_status(out) != "error" or _usable(out):
+            continue
+        letter = {**row, "error": out.get("error", row.get("error", ""))}
+        if "brand_error" in out:
+            letter["brand_error"] = out["brand_error"]
+        letter["error_kind"] = out.get("error_kind") or PERMANENT
+        dead.append(letter)
+    return dead
+
+
+ITEM_FIELDNAMES = [
+    "month",
+    "url",
+    "item_count",
+    "image_url",
+    "item_name",
+    "error",
+    "used_fallback",
+]
+
+
+def _row_url(row: dict) -> str:
+    """Return the page URL of an input row."""
+    return row.get("item_url") or row.get("url", "")
+
+
+def _item_result(
+    row: dict,
+    url: str,
+    data: tuple[str, str | None] | None = None,
+    error: Exception | None = None,
+) -> dict:
+    """Build the output row from extracted ``data`` or the ``error`` that prevented it."""
+    if error is None:
+        item_name, image_url = data
+        error_text = ""
+        used_fallback = False
+    else:
+        logger.info("Could not extract data for %s. Error: %s", url, error)
+        error_text = str(error)
+        item_name = row.get("item_name", "")  # Fallback to original name on error
+        image_url = ""
+        used_fallback = bool(item_name)
+
+    # Return a new dictionary with the extracted data
+    result = {
+        "month": row.get("month", ""),
+        "url": url,
+        "item_count": row.get("item_count", ""),
+        "image_url": image_url,
+        "item_name": _normalize_whitespace(item_name),
+        "error": error_text,
+        "used_fallback": used_fallback,
+    }
+    if error is not None:
+        # Not written to the output CSV; used to decide on retries
+        result["error_kind"] = classify(error)
+    return result
+
+
+def _url_rule_result(row: dict, url: str) -> dict:
+    """
+    Build the output row for a URL whose brand is known without scraping.
+
+    The original item name is kept as is; it is not a fallback for a failed
+    scrape. How many rows the rules decided is reported by
+    :meth:`modules.url_rules.UrlRules.stats`.
+    """
+    return _item_result(row, url, (row.get("item_name", ""), ""))
+
+
+def extract_row(row: dict, cache=None, dedupe=None, rules=None, local=None, count_rules: bool = True) -> dict:
+    """
+    Extract the item name and image of a single input row.
+
+    With a :class:`modules.dedupe.UrlDeduper`, rows whose URLs share a
+    canonical form are scraped once and reuse that outcome. With
+    :class:`modules.url_rules.UrlRules`, rows whose brand is decided by the
+    URL alone are not scraped; they keep their original item name and the
+    brand stage resolves them from the URL with the same rules. Pass
+    ``count_rules=False`` when that brand stage runs on the same rules, so
+    each row counts once in their stats. ``local`` is passed on to
+    :func:`extract_item_data`.
+    """
+    url = _row_url(row)
+
+    # Ensure there's a URL to process
+    if not url:
+        logger.info("Skipping row with no URL.")
+        return {**row, "error": "Missing URL", "image_url": ""}
+
+    if rules is not None and rules.match(url, count=count_rules):
+        return _url_rule_result(row, url)
+
+    logger.debug("Processing URL: %s", url)
+    extract_kwargs = {"cache": cache} if cache is not None else {}
+    if local is not None:
+        extract_kwargs["local"] = local
+    fetch = partial(extract_item_data, **extract_kwargs)
+    try:
+        data = dedupe.do(url, fetch) if dedupe is not None else fetch(url)
+    except Exception as e:
+        return _item_result(row, url, error=e)
+    return _item_result(row, url, data)
+
+
+def host_failed(result: dict) -> bool:
+    """Return whether ``result`` suggests its host is refusing or failing scrapes."""
+    error = result.get("error") or ""
+    return "access denied" in error.lower() or error.startswith("Firecrawl API failed")
 
 
 def batch_extract(
-    rows: list[dict],
+    rows,
     max_workers: int = 2,
     *,
     final_csv: str | None = None,
     tmp_dir: str | None = None,
     fieldnames: list[str] | None = None,
+    cache=None,
+    journal=None,
+    ordered: bool = False,
+    collect: bool = True,
+    dedupe=None,
+    scheduler=None,
+    rules=None,
+    deadline: float | None = None,
+    local=None,
+    prior=None,
+    priority=None,
+    retry=None,
+    dead_letter: str | None = None,
 ) -> list[dict]:
-    """Extract item names for multiple rows concurrently."""
-
-    def _worker(row: dict) -> dict:
-        # Safely get values from the input row dictionary
-        url = row.get("item_url") or row.get("url", "")
-        original_item_name = row.get("item_name", "")
-        
-        # Ensure there's a URL to process
-        if not url:
-            print("Skipping row with no URL.")
-            return {**row, "error": "Missing URL", "image_url": ""}
-
-        print(f"Processing URL: {url}")
-        try:
-            item_name, image_url = extract_item_data(url)
-            error = ""
-            used_fallback = False
-        except Exception as e:
-            print(f"Could not extract data for {url}. Error: {e}")
-            error = str(e)
-            item_name = original_item_name  # Fallback to original name on error
-            image_url = ""
-            used_fallback = bool(item_name)
-
-        item_name = _normalize_whitespace(item_name)
-
-        # Return a new dictionary with the extracted data
-        return {
-            "month": row.get("month", ""),
-            "url": url,
-            "item_count": row.get("item_count", ""),
-            "image_url": image_url,
-            "item_name": item_name,
-            "error": error,
-            "used_fallback": used_fallback,
-        }
-
+    """
+    Extract item names for multiple rows concurrently.
+
+    Pass a :class:`modules.cache.MetadataCache` as ``cache`` to reuse metadata
+    scraped by earlier runs, and a :class:`modules.journal.RunJournal` as
+    ``journal`` to skip rows finished before a crash. ``ordered`` keeps
+    ``final_csv`` in input order. ``rows`` may be a lazy iterable; with
+    ``collect=False`` results only go to ``final_csv``. Pass a
+    :class:`modules.dedupe.UrlDeduper` as ``dedupe`` to scrape each canonical
+    URL once, and a :class:`modules.domain_scheduler.DomainScheduler` as
+    ``scheduler`` to cap and interleave requests per host (``ordered`` then
+    follows the interleaved order). Rows matched by ``rules``
+    (:class:`modules.url_rules.UrlRules`) are not scraped. Rows still
+    scraping after ``deadline`` seconds are retried after the others. With a
+    :class:`modules.html_meta.LocalFetcher` as ``local``, pages are read
+    directly before falling back to Firecrawl. Rows with a usable result in
+    ``prior`` (:class:`modules.delta.PriorOutputs`) reuse it without scraping.
+    With a ``priority`` weight function such as
+    :func:`modules.priority.item_count_weight`, the heaviest rows go first
+    (``ordered`` then follows that order; the scheduler still interleaves
+    hosts within its lookahead). ``retry`` (a
+    :class:`modules.errors.RetryPolicy`) scrapes rows with transient errors
+    again at the end, and rows that still failed go to ``dead_letter``.
+    """
+    # A 429 can then shrink the scrapes in flight below the worker count
+    LIMITER.default_concurrency(max_workers)
+    fn = retry_fn = partial(extract_row, cache=cache, dedupe=dedupe, rules=rules, local=local)
+    reschedule = None
+    if priority is not None:
+        rows = by_weight(rows, priority, stage="names")
+    if scheduler is not None:
+
+        def passthrough(row):
+            # Rows answered by the journal or earlier outputs never take a host slot
+            if journal is not None and journal.get(row_key(row)) is not None:
+                return True
+            return prior is not None and prior.get("names", row) is not None
+
+        rows = scheduler.schedule(rows, passthrough)
+        fn = retry_fn = scheduler.wrap(fn, host_failed)
+        # Rows run again at the end take host slots like the first pass
+        reschedule = partial(scheduler.schedule, key=itemgetter(1))
+    if prior is not None:
+        fn = prior.wrap(fn, "names")
     return _thread_map(
-        _worker,
+        fn,
         rows,
         max_workers,
-        fieldnames=fieldnames
-        or [
-            "month",
-            "url",
-            "item_count",
-            "image_url",
-            "item_name",
-            "error",
-            "used_fallback",
-        ],
+        fieldnames=fieldnames or ITEM_FIELDNAMES,
         final_csv=final_csv,
         tmp_dir=tmp_dir,
-    )
\ No newline at end of file
+        journal=journal,
+        ordered=ordered,
+        collect=collect,
+        stage="names",
+        deadline=deadline,
+        retry_fn=retry_fn,
+        weight=priority,
+        retry=retry,
+        dead_letter=dead_letter,
+        reschedule=reschedule,
+    )
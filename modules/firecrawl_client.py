@@ -0,0 +1,112 @@
+# firecrawl_client.py
+
+from types import SimpleNamespace
+
+import httpx
+from firecrawl import AsyncV1FirecrawlApp, V1FirecrawlApp
+
+from modules.config import FirecrawlConfig
+from modules.http_pool import pooled_async_client, pooled_client
+
+# The extraction code is written against the v1 scrape API: metadata comes
+# back as a plain dict. ``requirements.txt`` pins the SDK release line.
+SCRAPE_PATH = "/v1/scrape"
+
+
+def _scrape_body(url: str, only_main_content, timeout, proxy, options: dict) -> dict:
+    body = {"url": url}
+    if only_main_content is not None:
+        body["onlyMainContent"] = only_main_content
+    if timeout:
+        body["timeout"] = timeout
+    if proxy:
+        body["proxy"] = proxy
+    body.update(options)
+    return body
+
+
+def _request_timeout(timeout) -> float | None:
+    # As the SDK: the scrape timeout plus a margin for the API itself
+    return timeout / 1000 + 5 if timeout else None
+
+
+def _scrape_result(response: httpx.Response) -> SimpleNamespace:
+    """
+    Return the scraped document of a ``/v1/scrape`` response.
+
+    Non-2xx responses raise ``httpx.HTTPStatusError`` carrying the API's
+    error message and the response, so ``modules.errors.classify`` sees the
+    status.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        body = {"error": response.text[:500]}
+    if response.status_code >= 300:
+        error = body.get("error", "No error message provided.") if isinstance(body, dict) else body
+        details = body.get("details", "") if isinstance(body, dict) else ""
+        message = f"Failed to scrape URL: status {response.status_code}. {error} {details}".rstrip()
+        raise httpx.HTTPStatusError(message, request=response.request, response=response)
+    if not body.get("success") or "data" not in body:
+        raise RuntimeError(f"Failed to scrape URL. Error: {body.get('error', body)}")
+    data = body["data"]
+    data.setdefault("metadata", {})
+    return SimpleNamespace(**data)
+
+
+class FirecrawlClient(V1FirecrawlApp):
+    """
+    The Firecrawl SDK's v1 client with scrapes sent through a shared connection pool.
+
+    The SDK posts with module-level ``requests`` and takes no session or
+    transport, so :meth:`scrape_url` calls the same endpoint on a pooled
+    ``httpx`` client; every other method is the stock SDK's. Options other
+    than the named ones are passed to the API as given (camelCase).
+    """
+
+    def __init__(self, config: FirecrawlConfig):
+        if config.api_url:
+            super().__init__(api_key=config.api_key, api_url=config.api_url)
+        else:
+            super().__init__(api_key=config.api_key)
+        self._http = pooled_client(config.pool, "firecrawl")
+
+    def _headers(self) -> dict:
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+
+    def scrape_url(self, url: str, *, only_main_content=None, timeout=30000, proxy=None, **options):
+        response = self._http.post(
+            f"{self.api_url}{SCRAPE_PATH}",
+            headers=self._headers(),
+            json=_scrape_body(url, only_main_content, timeout, proxy, options),
+            timeout=_request_timeout(timeout),
+        )
+        return _scrape_result(response)
+
+    def close(self) -> None:
+        self._http.close()
+
+
+class AsyncFirecrawlClient(AsyncV1FirecrawlApp):
+    """Async version of :class:`FirecrawlClient` for use on one event loop."""
+
+    def __init__(self, config: FirecrawlConfig):
+        if config.api_url:
+            super().__init__(api_key=config.api_key, api_url=config.api_url)
+        else:
+            super().__init__(api_key=config.api_key)
+        self._http = pooled_async_client(config.pool, "firecrawl")
+
+    _headers = FirecrawlClient._headers
+
+    async def scrape_url(self, url: str, *, only_main_content=None, timeout=30000, proxy=None, **options):
+        response = await self._http.post(
+            f"{self.api_url}{SCRAPE_PATH}",
+            headers=self._headers(),
+            json=_scrape_body(url, only_main_content, timeout, proxy, options),
+            timeout=_request_timeout(timeout),
+        )
+        return _scrape_result(response)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
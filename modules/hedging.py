@@ -0,0 +1,296 @@
+# hedging.py
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+_LOCAL = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request is abandoned because its row ran out of time."""
+
+
+class Deadline:
+    """Time budget of the row being processed by the current thread."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        self.missed = False
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+
+@contextmanager
+def row_deadline(seconds: float | None, resend: bool = False):
+    """
+    Give requests made by this thread ``seconds`` to finish (``None``: no limit).
+
+    Yields the :class:`Deadline` (or ``None``); its ``missed`` flag is set when
+    a :class:`Hedger` gave up on a request because the deadline passed. With
+    ``resend``, the requests repeat ones abandoned earlier, so a
+    :class:`Hedger` charges them to its budget like hedges.
+    """
+    previous = getattr(_LOCAL, "deadline", None), getattr(_LOCAL, "resend", False)
+    deadline = Deadline(seconds) if seconds else None
+    _LOCAL.deadline, _LOCAL.resend = deadline, resend
+    try:
+        yield deadline
+    finally:
+        _LOCAL.deadline, _LOCAL.resend = previous
+
+
+def current_deadline() -> Deadline | None:
+    """Return the deadline set by :func:`row_deadline` for this thread, if any."""
+    return getattr(_LOCAL, "deadline", None)
+
+
+def deadline_missed(error: BaseException) -> bool:
+    """
+    Return whether ``error`` was caused by a missed row deadline.
+
+    If so, the current thread's deadline is marked as missed as well, so a row
+    that shared another row's abandoned request is also retried later.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, DeadlineExceeded):
+            deadline = current_deadline()
+            if deadline is not None:
+                deadline.missed = True
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class LatencyTracker:
+    """Recent request latencies, used to pick the hedge delay."""
+
+    def __init__(self, size: int = 500):
+        self.size = size
+        self._samples: list[float] = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            if len(self._samples) < self.size:
+                self._samples.append(seconds)
+            else:
+                self._samples[self._next] = seconds
+                self._next = (self._next + 1) % self.size
+
+    def quantile(self, q: float, min_samples: int = 20) -> float | None:
+        """Return the ``q`` quantile, or ``None`` until ``min_samples`` latencies are known."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+class HedgeBudget:
+    """
+    Cap hedged requests at ``ratio`` of all requests.
+
+    Every request earns ``ratio`` of a token, up to ``burst`` tokens, and a
+    hedge spends one, so a slow period can never multiply API usage.
+    """
+
+    def __init__(self, ratio: float, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def take(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0 - 1e-9:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def charge(self) -> None:
+        """Spend a token on a request that has to be sent anyway, going into debt if there is none."""
+        with self._lock:
+            self._tokens -= 1.0
+
+
+class Hedger:
+    """
+    Run requests with row deadlines and optional hedging.
+
+    When the first attempt has not finished after the ``quantile`` latency of
+    recent requests (at least ``min_delay`` seconds), a duplicate is sent if
+    ``budget`` allows, and whichever finishes first wins. Attempts run on a
+    private pool of ``max_threads`` threads, so when the caller's
+    :func:`row_deadline` passes it gets :class:`DeadlineExceeded` at once.
+    Attempts that lose the race or are abandoned are cancelled if they have
+    not started; running ones finish in the background and their results are
+    dropped. No hedge is sent while every thread is busy. Requests sent again
+    under ``row_deadline(..., resend=True)`` are charged to ``budget`` and
+    never hedged. Without a budget and a deadline the request runs directly on
+    the calling thread.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        budget: HedgeBudget | None = None,
+        quantile: float = 0.95,
+        min_delay: float = 0.5,
+        max_threads: int = 64,
+    ):
+        self.name = name
+        self.label = name.lower()
+        self.budget = budget
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.latency = LatencyTracker()
+        self.hedged = 0
+        self.wins = 0
+        self.abandoned = 0
+        self._lock = threading.Lock()
+        self._max_threads = max_threads
+        self._active = 0
+        self._executor = None
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, limiter=None) -> "Hedger":
+        """
+        Build a hedger from ``<prefix>_HEDGE_BUDGET`` (share of requests that may
+        be duplicated, e.g. ``0.05``; unset or 0 disables hedging),
+        ``<prefix>_HEDGE_QUANTILE`` and ``<prefix>_HEDGE_MIN_DELAY``.
+
+        The pool has twice the concurrency limit of ``limiter`` (a primary and
+        a hedge per slot) or ``<prefix>_HEDGE_MAX_THREADS`` threads (default 64).
+        """
+        ratio = float(os.getenv(f"{prefix}_HEDGE_BUDGET") or 0)
+        concurrency = getattr(limiter, "concurrency", None)
+        max_threads = int(os.getenv(f"{prefix}_HEDGE_MAX_THREADS") or 0)
+        if not max_threads:
+            max_threads = 2 * concurrency.maximum if concurrency is not None else 64
+        return cls(
+            name,
+            budget=HedgeBudget(ratio) if ratio > 0 else None,
+            quantile=float(os.getenv(f"{prefix}_HEDGE_QUANTILE") or 0.95),
+            min_delay=float(os.getenv(f"{prefix}_HEDGE_MIN_DELAY") or 0.5),
+            max_threads=max_threads,
+        )
+
+    def delay(self) -> float | None:
+        """Return how long to wait before hedging, or ``None`` if hedging is off."""
+        if self.budget is None:
+            return None
+        latency = self.latency.quantile(self.quantile)
+        return None if latency is None else max(latency, self.min_delay)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_threads, thread_name_prefix=f"{self.label}-hedge")
+            return self._executor
+
+    def _submit(self, pool: ThreadPoolExecutor, fn):
+        with self._lock:
+            self._active += 1
+        fut = pool.submit(self._timed, fn)
+        fut.add_done_callback(self._finished)
+        return fut
+
+    def _finished(self, fut) -> None:
+        with self._lock:
+            self._active -= 1
+
+    def _drop(self, futures) -> None:
+        for fut in futures:
+            if fut.cancel():
+                metrics.inc("hedge_cancelled_total", api=self.label)
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.latency.add(time.perf_counter() - start)
+        return result
+
+    def call(self, fn):
+        """Return ``fn()``, hedging it and honouring the row deadline as configured."""
+        deadline = current_deadline()
+        if self.budget is None and deadline is None:
+            return self._timed(fn)
+        if deadline is not None and deadline.remaining() <= 0:
+            deadline.missed = True
+            raise DeadlineExceeded(f"{self.name} request not sent: the {deadline.seconds:g}s row deadline has passed")
+        resend = getattr(_LOCAL, "resend", False)
+        if self.budget is not None:
+            if resend:
+                self.budget.charge()
+                metrics.inc("resent_requests_total", api=self.label)
+            else:
+                self.budget.earn()
+
+        start = time.monotonic()
+        hedge_at = None if resend else self.delay()
+        pool = self._pool()
+        primary = self._submit(pool, fn)
+        pending = {primary}
+        error = None
+        while True:
+            timeout = None if deadline is None else max(deadline.remaining(), 0.0)
+            if hedge_at is not None:
+                until_hedge = max(hedge_at - (time.monotonic() - start), 0.0)
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, pending = wait(pending, timeout, return_when=FIRST_COMPLETED)
+            for fut in done:
+                if fut.exception() is None:
+                    if fut is not primary:
+                        with self._lock:
+                            self.wins += 1
+                        metrics.inc("hedge_wins_total", api=self.label)
+                    self._drop(pending)
+                    return fut.result()
+                error = fut.exception()
+            if not pending:
+                raise error
+            if deadline is not None and deadline.remaining() <= 0:
+                deadline.missed = True
+                self._drop(pending)
+                with self._lock:
+                    self.abandoned += 1
+                metrics.inc("deadline_exceeded_total", api=self.label)
+                raise DeadlineExceeded(f"{self.name} request exceeded the {deadline.seconds:g}s row deadline")
+            if hedge_at is not None and time.monotonic() - start >= hedge_at:
+                hedge_at = None
+                with self._lock:
+                    saturated = self._active >= self._max_threads
+                if pending and not saturated and self.budget.take():
+                    with self._lock:
+                        self.hedged += 1
+                    metrics.inc("hedged_requests_total", api=self.label)
+                    logger.debug("%s request slower than %.2fs; sending a hedge", self.name, time.monotonic() - start)
+                    pending.add(self._submit(pool, fn))
+
+    def snapshot(self) -> dict:
+        """Return counters and the current hedge delay for reporting."""
+        with self._lock:
+            return {
+                "hedged": self.hedged,
+                "hedge_wins": self.wins,
+                "deadline_exceeded": self.abandoned,
+                "hedge_delay": self.delay(),
+            }
@@ -0,0 +1,251 @@
+# html_meta.py
+
+import asyncio
+import codecs
+import logging
+import re
+import threading
+import weakref
+from email.message import Message
+from html.parser import HTMLParser
+
+from modules import metrics
+from modules.config import PoolConfig
+from modules.extraction import parse_metadata
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; url-to-brand/1.0)"
+
+# A <meta charset> declaration must appear in the first 1024 bytes
+_SNIFF_BYTES = 1024
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.I)
+
+
+class HeadParser(HTMLParser):
+    """
+    Collect ``<title>`` and ``<meta>`` tags from the ``<head>`` of a page.
+
+    Meta tags are keyed by their ``property``, ``name`` or ``itemprop`` (e.g.
+    ``og:title``, ``twitter:image:src``), as in Firecrawl's metadata, and the
+    first value of each key wins. ``done`` becomes true at ``</head>`` or
+    ``<body>``, after which nothing more needs to be read.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: dict[str, str] = {}
+        self.done = False
+        self._title: list[str] | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag == "meta":
+            attrs = dict(attrs)
+            key = attrs.get("property") or attrs.get("name") or attrs.get("itemprop")
+            content = attrs.get("content")
+            if key and content and content.strip():
+                self.meta.setdefault(key.strip().lower(), content.strip())
+        elif tag == "title" and "title" not in self.meta:
+            self._title = []
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title is not None:
+            title = " ".join("".join(self._title).split())
+            if title:
+                self.meta["title"] = title
+            self._title = None
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title is not None:
+            self._title.append(data)
+
+
+def is_product_page(meta: dict) -> bool:
+    """
+    Return whether ``meta`` describes the item rather than the site.
+
+    Product pages set ``og:title`` or ``product:*`` tags. A bare ``<title>``
+    only counts when it differs from the declared site name; many shops serve
+    the same site-wide title on every page to non-browsers.
+    """
+    if meta.get("og:title") or any(key.startswith("product:") for key in meta):
+        return True
+    title, site = meta.get("title"), meta.get("og:site_name") or meta.get("application-name")
+    return bool(title and site and title.casefold() != site.casefold())
+
+
+def _charset(content_type: str | None, head: bytes) -> str:
+    """Return the page encoding from the Content-Type header or a ``<meta charset>`` tag."""
+    if content_type:
+        msg = Message()
+        msg["content-type"] = content_type
+        charset = msg.get_param("charset")
+        if isinstance(charset, str):
+            return _known(charset) or "utf-8"
+    match = _META_CHARSET.search(head[:_SNIFF_BYTES])
+    if match:
+        return _known(match.group(1).decode("ascii")) or "utf-8"
+    return "utf-8"
+
+
+def _known(name: str) -> str | None:
+    try:
+        return codecs.lookup(name.strip()).name
+    except LookupError:
+        return None
+
+
+class _HeadReader:
+    """Feed response chunks to a :class:`HeadParser`, decoding once the charset is known."""
+
+    def __init__(self, content_type: str | None, max_bytes: int):
+        self.content_type = content_type
+        self.max_bytes = max_bytes
+        self.parser = HeadParser()
+        self.read = 0
+        self._buffer = b""
+        self._decoder = None
+        if content_type and "charset=" in content_type.lower():
+            self._start()
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume ``chunk`` and return whether reading can stop."""
+        self.read += len(chunk)
+        if self._decoder is None:
+            # Hold bytes back until a <meta charset> could have been seen
+            self._buffer += chunk
+            lowered = self._buffer.lower()
+            if len(self._buffer) < _SNIFF_BYTES and b"</head" not in lowered and b"<body" not in lowered:
+                return False
+            self._start()
+            chunk, self._buffer = self._buffer, b""
+        self.parser.feed(self._decoder.decode(chunk))
+        return self.parser.done or self.read >= self.max_bytes
+
+    def close(self) -> dict[str, str]:
+        if self._decoder is None:
+            self._start()
+            self.parser.feed(self._decoder.decode(self._buffer))
+        self.parser.feed(self._decoder.decode(b"", final=True))
+        return self.parser.meta
+
+    def _start(self) -> None:
+        charset = _charset(self.content_type, self._buffer)
+        self._decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+
+
+class LocalFetcher:
+    """
+    Read page metadata with a plain HTTP GET before paying for a Firecrawl scrape.
+
+    The response is streamed and parsed only up to ``</head>`` (at most
+    ``max_bytes``), which for most product pages is a few KB. :meth:`fetch`
+    returns Firecrawl-style metadata only when it has product-level fields
+    (see :func:`is_product_page`) and an item name that is not an
+    access-denied page. Otherwise it returns ``None`` and the caller
+    escalates to Firecrawl. Connections are pooled per ``pool``
+    (``LOCAL_FETCH_POOL_SIZE`` etc. by default).
+    """
+
+    def __init__(
+        self,
+        pool: PoolConfig | None = None,
+        *,
+        timeout: float = 5.0,
+        max_bytes: int = 256 * 1024,
+        user_agent: str = DEFAULT_USER_AGENT,
+    ):
+        self.pool = pool or PoolConfig.from_env("LOCAL_FETCH")
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.headers = {"User-Agent": user_agent, "Accept": "text/html,application/xhtml+xml"}
+        self._client = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _http(self):
+        with self._lock:
+            if self._client is None:
+                from modules.http_pool import pooled_client
+
+                self._client = pooled_client(
+                    self.pool, "local", headers=self.headers, timeout=self.timeout, follow_redirects=True
+                )
+            return self._client
+
+    def _ahttp(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            from modules.http_pool import pooled_async_client
+
+            client = pooled_async_client(
+                self.pool, "local", headers=self.headers, timeout=self.timeout, follow_redirects=True
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def _reader(self, response) -> _HeadReader | None:
+        content_type = response.headers.get("content-type", "")
+        if response.status_code != 200 or "html" not in content_type.lower():
+            return None
+        return _HeadReader(content_type, self.max_bytes)
+
+    def _result(self, url: str, meta: dict | None, error: Exception | None = None) -> dict | None:
+        name = parse_metadata(meta) if meta else None
+        if error is not None:
+            outcome = "error"
+            logger.debug("Local fetch failed for %s: %s", url, error)
+        elif not name or "access denied" in name.lower() or not is_product_page(meta):
+            outcome = "miss"
+        else:
+            outcome = "hit"
+        metrics.inc("local_fetch_total", outcome=outcome)
+        with self._lock:
+            if outcome == "hit":
+                self.hits += 1
+            else:
+                self.misses += 1
+        return meta if outcome == "hit" else None
+
+    def fetch(self, url: str) -> dict | None:
+        """Return usable metadata for ``url`` from its static HTML, or ``None``."""
+        try:
+            with self._http().stream("GET", url) as response:
+                reader = self._reader(response)
+                if reader is None:
+                    return self._result(url, None)
+                for chunk in response.iter_bytes():
+                    if reader.feed(chunk):
+                        break
+                return self._result(url, reader.close())
+        except Exception as e:
+            return self._result(url, None, e)
+
+    async def afetch(self, url: str) -> dict | None:
+        """Async version of :meth:`fetch`."""
+        try:
+            async with self._ahttp().stream("GET", url) as response:
+                reader = self._reader(response)
+                if reader is None:
+                    return self._result(url, None)
+                async for chunk in response.aiter_bytes():
+                    if reader.feed(chunk):
+                        break
+                return self._result(url, reader.close())
+        except Exception as e:
+            return self._result(url, None, e)
+
+    def stats(self) -> dict:
+        """Return how many pages were read locally instead of through Firecrawl."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
@@ -0,0 +1,155 @@
+# http_pool.py
+
+import importlib.util
+import threading
+import time
+
+import httpx
+
+from modules import metrics
+from modules.config import PoolConfig
+
+
+def h2_available() -> bool:
+    """Return whether the ``h2`` package needed for HTTP/2 is installed."""
+    return importlib.util.find_spec("h2") is not None
+
+
+class _ConnectionTrace:
+    """
+    httpcore trace callback for one request.
+
+    Counts new connections and records their TCP and TLS setup time. With
+    ``time_wait`` it also records how long the request waited for a
+    connection: until it starts opening one or sends headers on a reused one.
+    """
+
+    __slots__ = ("client", "inner", "start", "time_wait", "connect_start")
+
+    def __init__(self, client: str, inner=None, time_wait: bool = False):
+        self.client = client
+        self.inner = inner
+        self.start = time.perf_counter()
+        self.time_wait = time_wait
+        self.connect_start = None
+
+    def event(self, name: str) -> None:
+        opening = name.endswith("connect_tcp.started")
+        sending = name.endswith(("send_request_headers.started", "send_connection_init.started"))
+        if not (opening or sending):
+            return
+        now = time.perf_counter()
+        if self.time_wait:
+            self.time_wait = False
+            metrics.observe("http_pool_wait_seconds", now - self.start, client=self.client)
+        if opening:
+            self.connect_start = now
+            metrics.inc("http_connections_opened_total", client=self.client)
+        elif self.connect_start is not None:
+            metrics.observe("http_connect_seconds", now - self.connect_start, client=self.client)
+            self.connect_start = None
+
+    def __call__(self, name: str, info: dict) -> None:
+        self.event(name)
+        if self.inner is not None:
+            self.inner(name, info)
+
+
+class _AsyncConnectionTrace(_ConnectionTrace):
+    __slots__ = ()
+
+    async def __call__(self, name: str, info: dict) -> None:
+        self.event(name)
+        if self.inner is not None:
+            await self.inner(name, info)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _GatedTransport(httpx.BaseTransport):
+    """
+    Admit at most ``size`` requests into ``transport`` at once.
+
+    httpcore's sync pool misbehaves when threads queue inside it (requests
+    fail with ``Bad file descriptor``), so callers beyond the pool size wait
+    here instead, and that wait is what ``http_pool_wait_seconds`` reports.
+    A slot is held until the response is closed.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport, size: int, client: str):
+        self._transport = transport
+        self._slots = threading.BoundedSemaphore(size)
+        self._client = client
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        self._slots.acquire()
+        metrics.observe("http_pool_wait_seconds", time.perf_counter() - start, client=self._client)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            self._slots.release()
+            raise
+        response.stream = _ReleasingStream(response.stream, self._slots.release)
+        return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+def _limits(pool: PoolConfig) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=pool.max_connections,
+        max_keepalive_connections=pool.max_keepalive,
+        keepalive_expiry=pool.keepalive_expiry,
+    )
+
+
+def pooled_client(pool: PoolConfig, name: str, cls=httpx.Client, **kwargs):
+    """
+    Return an ``httpx.Client`` (or subclass ``cls``) with a pool sized by ``pool``.
+
+    Requests report ``http_pool_wait_seconds``, ``http_connections_opened_total``
+    and ``http_connect_seconds`` labelled ``client=name``. Extra ``kwargs``
+    (base URL, headers, timeout) are passed to the client. The client can be
+    shared by any number of threads.
+    """
+
+    def on_request(request):
+        request.extensions["trace"] = _ConnectionTrace(name, request.extensions.get("trace"))
+
+    transport = httpx.HTTPTransport(limits=_limits(pool), http2=pool.http2 and h2_available())
+    return cls(
+        transport=_GatedTransport(transport, pool.max_connections, name),
+        event_hooks={"request": [on_request], "response": []},
+        **kwargs,
+    )
+
+
+def pooled_async_client(pool: PoolConfig, name: str, cls=httpx.AsyncClient, **kwargs):
+    """Async version of :func:`pooled_client` for use on one event loop."""
+
+    async def on_request(request):
+        request.extensions["trace"] = _AsyncConnectionTrace(name, request.extensions.get("trace"), time_wait=True)
+
+    return cls(
+        limits=_limits(pool),
+        http2=pool.http2 and h2_available(),
+        event_hooks={"request": [on_request], "response": []},
+        **kwargs,
+    )
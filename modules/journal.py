@@ -0,0 +1,112 @@
+# journal.py
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def row_key(row: dict) -> str:
+    """Return a stable identity for an input row based on all of its fields."""
+    data = json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    Append-only record of finished rows that lets a crashed run resume.
+
+    Every completed row is written as one JSON line and flushed to the OS
+    immediately, so it survives a crash of the Python process. ``fsync`` is
+    only issued every ``sync_every`` records or ``sync_interval`` seconds to
+    keep the cost low. Opening an existing journal loads its records; a
+    partially written last line is ignored.
+    """
+
+    def __init__(self, path: str, sync_every: int = 100, sync_interval: float = 5.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._done: dict[str, dict] = {}
+        self._outputs: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "output" in entry:
+                        self._outputs[entry["output"]] = entry["offset"]
+                    else:
+                        self._done[entry["key"]] = entry["result"]
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self.resumed = len(self._done)
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    def get(self, key: str) -> dict | None:
+        """Return the journaled result for ``key`` or ``None`` if it has not finished."""
+        with self._lock:
+            return self._done.get(key)
+
+    def record(self, key: str, result: dict) -> None:
+        """Append the result of a finished row."""
+        line = json.dumps({"key": key, "result": result}, default=str) + "\n"
+        with self._lock:
+            self._done[key] = result
+            self._file.write(line)
+            self._file.flush()
+            self._pending += 1
+            if (
+                self._pending >= self.sync_every
+                or time.monotonic() - self._last_sync >= self.sync_interval
+            ):
+                self._sync()
+
+    def anchor_output(self, path: str) -> None:
+        """
+        Tie the output file ``path`` to this journal.
+
+        A fresh run records the current size of ``path``. A resumed run
+        truncates ``path`` back to that size: every row written after it is
+        in the journal and will be written again, so nothing is duplicated
+        or lost even if the crash happened mid-write.
+        """
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        with self._lock:
+            offset = self._outputs.get(path)
+            if offset is None:
+                self._outputs[path] = size
+                self._file.write(json.dumps({"output": path, "offset": size}) + "\n")
+                self._file.flush()
+                self._sync()
+            elif size > offset:
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    def discard(self) -> None:
+        """Close and delete the journal once its run has completed."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -1,42 +1,151 @@
 # llm_client.py
 
-import os
+import json
+import logging
+import sys
 import time
-from dotenv import load_dotenv
-from openai import OpenAI, RateLimitError
+from functools import partial
+from modules.api_retry import ApiRetry
+from modules.cache import PromptCache, SingleFlight, prompt_key
+from modules.config import LazyClient, OpenAIConfig
+from modules.hedging import Hedger, deadline_missed
+from modules.rate_limit import RateLimiter, estimate_tokens
 
-load_dotenv()
-_client = OpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    base_url=os.getenv("AZURE_OPENAI_ENDPOINT") + "openai/v1/",
-    default_query={"api-version": "preview"},
-)
+logger = logging.getLogger(__name__)
 
 
-def prompt_model(prompt: str, timeout: int = 3, retries: int = 3) -> str:
+def _build_client(config: OpenAIConfig):
+    from openai import DefaultHttpxClient, OpenAI
+
+    from modules.http_pool import pooled_client
+
+    return OpenAI(
+        api_key=config.api_key,
+        base_url=config.base_url,
+        default_query={"api-version": config.api_version},
+        http_client=pooled_client(config.pool, "openai", DefaultHttpxClient),
+    )
+
+
+# The OpenAI client is created on first use, so importing this module does
+# not require credentials or the SDK import.
+OPENAI = LazyClient(_build_client, OpenAIConfig.from_env)
+
+
+def get_client():
+    """Return the shared OpenAI client."""
+    return OPENAI.get()
+
+
+def __getattr__(name: str):
+    # ``_client`` used to be created at import time
+    if name == "_client":
+        return get_client()
+    if name == "RateLimitError":
+        from openai import RateLimitError
+
+        return RateLimitError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _rate_limit_error() -> type:
+    """Return the exception raised on HTTP 429, honouring a patched ``RateLimitError``."""
+    return sys.modules[__name__].RateLimitError
+
+# Client-side pacing configured by OPENAI_REQUESTS_PER_MINUTE,
+# OPENAI_TOKENS_PER_MINUTE and OPENAI_MAX_CONCURRENCY; unset limits are not enforced.
+LIMITER = RateLimiter.from_env("OpenAI", "OPENAI")
+
+# Row deadlines and hedging of slow requests, configured by OPENAI_HEDGE_BUDGET,
+# OPENAI_HEDGE_QUANTILE and OPENAI_HEDGE_MIN_DELAY; hedging is off by default.
+HEDGER = Hedger.from_env("OpenAI", "OPENAI", LIMITER)
+
+# Identical prompts that are in flight at the same time share one request
+INFLIGHT = SingleFlight()
+
+
+def _create(client, prompt: str, model: str | None, timeout: int, tokens: int):
+    """Send one request; hedged duplicates go through the limiter as well."""
+    with LIMITER.slot(tokens):
+        return client.responses.create(
+            model=model,
+            input=prompt,
+            timeout=timeout,
+        )
+
+
+def _is_cacheable(text: str) -> bool:
+    """Return ``True`` if ``text`` is a well-formed JSON object worth storing."""
+    try:
+        return isinstance(json.loads(text), dict)
+    except (TypeError, ValueError):
+        return False
+
+
+def _total_tokens(resp) -> int | None:
+    """Return the tokens billed for ``resp`` if the API reported them."""
+    return getattr(getattr(resp, "usage", None), "total_tokens", None)
+
+
+def _retry_after(e: Exception, attempt: int) -> float:
+    """Return the server's ``Retry-After`` in seconds, or an exponential backoff."""
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), 60)
+    except (TypeError, ValueError):
+        return min(2**attempt, 60)
+
+
+def openai_retry(tokens: int) -> ApiRetry:
+    """Return the retry handling of one OpenAI request, shared with the async engine."""
+    return ApiRetry(
+        "OpenAI",
+        LIMITER,
+        throttled=lambda e: isinstance(e, _rate_limit_error()),
+        throttle_wait=_retry_after,
+        message="OpenAI API error: ",
+        on_success=lambda resp: LIMITER.on_success(_total_tokens(resp), tokens),
+    )
+
+
+def _request(prompt: str, model: str | None, timeout: int, retries: int) -> str:
     """Send a prompt to OpenAI with retry logic and report the request duration."""
-    last_error = None
-    for attempt in range(retries + 1):
-        try:
-            start = time.perf_counter()
-            resp = _client.responses.create(
-                model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-                input=prompt,
-                timeout=timeout,
-            )
-            duration = time.perf_counter() - start
-            print(f"OpenAI request took {duration:.2f} seconds")
-            return resp.output[0].content[0].text
-        except RateLimitError as e:
-            last_error = e
-            wait = min(2**attempt, 60)
-            print(f"OpenAI rate limit hit. Sleeping for {wait} seconds")
-            time.sleep(wait)
-            if attempt < retries:
-                continue
-            print(f"OpenAI failed after {retries} attempts: {e}")
-        except Exception as e:
-            last_error = e
-            print(f"OpenAI failed: {e}")
-            break
-    raise RuntimeError(f"OpenAI API error: {last_error}")
+    tokens = estimate_tokens(prompt)
+    client = get_client()
+    send = partial(_create, client, prompt, model, timeout, tokens)
+    resp = openai_retry(tokens).call(partial(HEDGER.call, send), retries, sleep=time.sleep)
+    return resp.output[0].content[0].text
+
+
+def prompt_model(
+    prompt: str,
+    timeout: int = 3,
+    retries: int = 3,
+    cache: PromptCache | None = None,
+) -> str:
+    """
+    Send a prompt to OpenAI and return the raw response text.
+
+    Concurrent calls with the same prompt and deployment are collapsed into a
+    single request. If ``cache`` is given, stored responses are returned
+    without a network round trip and successful JSON responses are saved.
+    """
+    model = OPENAI.settings().deployment
+    key = prompt_key(prompt, model)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    def call() -> str:
+        text = _request(prompt, model, timeout, retries)
+        if cache is not None and _is_cacheable(text):
+            cache.set(key, text)
+        return text
+
+    try:
+        return INFLIGHT.do(key, call)
+    except Exception as e:
+        # Callers sharing a request that missed its deadline are retried later too
+        deadline_missed(e)
+        raise
@@ -0,0 +1,408 @@
+# metrics.py
+
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+HELP = {
+    "firecrawl_requests_total": "Firecrawl scrape attempts by outcome",
+    "firecrawl_request_seconds": "Latency of Firecrawl scrape attempts",
+    "firecrawl_retries_total": "Firecrawl attempts retried after a rate limit",
+    "firecrawl_throttled_total": "Firecrawl responses with HTTP 429",
+    "openai_requests_total": "OpenAI requests by outcome",
+    "openai_request_seconds": "Latency of OpenAI requests",
+    "openai_retries_total": "OpenAI requests retried after a rate limit",
+    "openai_throttled_total": "OpenAI rate limit errors",
+    "cache_lookups_total": "Cache lookups by cache and result",
+    "rows_total": "Rows finished by stage and status",
+    "row_seconds": "Time spent on one row by stage",
+    "rows_in_flight": "Rows currently being processed by stage",
+    "queue_depth": "Items waiting in an internal queue",
+    "http_pool_wait_seconds": "Time a request waited for a pooled connection by client",
+    "http_connections_opened_total": "New HTTP connections opened by client",
+    "http_connect_seconds": "TCP and TLS setup time of new HTTP connections by client",
+    "hedged_requests_total": "Duplicate requests sent because the first was slow, by API",
+    "hedge_wins_total": "Hedged requests that finished before the original, by API",
+    "hedge_cancelled_total": "Queued attempts cancelled because another attempt finished or the deadline passed, by API",
+    "resent_requests_total": "Requests sent again after missing their deadline and charged to the hedge budget, by API",
+    "deadline_exceeded_total": "Requests abandoned at the row deadline, by API",
+    "stragglers_total": "Rows deferred to the retry pass after missing their deadline, by stage",
+    "local_fetch_total": "Direct page metadata reads, by outcome (hit, miss, error)",
+    "queued_weight": "Total weight (item_count by default) of prioritized rows, by stage",
+    "covered_weight_total": "Weight of rows finished without an error, by stage",
+    "deferred_retries_total": "Rows set aside after a transient error and retried at the end, by stage",
+    "dead_letter_total": "Input rows written to the dead-letter file, by stage and error kind",
+    "delta_rows_total": "Rows carried forward from earlier outputs or recomputed in incremental runs, by stage",
+}
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict | None = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _finite(value: float) -> float | None:
+    return None if math.isinf(value) else value
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """Estimate the ``q`` quantile as the upper bound of its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class Registry:
+    """
+    Thread-safe counters, gauges and histograms with optional labels.
+
+    Updates are a dict lookup and an addition under one lock, so instrumented
+    code pays next to nothing when nobody exports the values.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, _Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add ``value`` to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set a gauge."""
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add(self, name: str, delta: float, **labels) -> None:
+        """Move a gauge up or down by ``delta``."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._gauges.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record ``value`` in a histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = _Histogram(self.buckets)
+            hist.observe(value)
+
+    def value(self, name: str, **labels) -> float:
+        """Return a counter or gauge value (0 if never set)."""
+        key = _label_key(labels)
+        with self._lock:
+            for kind in (self._counters, self._gauges):
+                if name in kind and key in kind[name]:
+                    return kind[name][key]
+        return 0.0
+
+    def total(self, name: str, **labels) -> float:
+        """Return the sum of a counter over every series matching ``labels``."""
+        wanted = set(labels.items())
+        with self._lock:
+            series = self._counters.get(name, {})
+            return sum(v for key, v in series.items() if wanted <= set(key))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> dict:
+        """Return every series as plain data, suitable for JSON."""
+
+        def series(data, render):
+            return {
+                name: [{"labels": dict(key), **render(v)} for key, v in sorted(values.items())]
+                for name, values in sorted(data.items())
+            }
+
+        with self._lock:
+            return {
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "counters": series(self._counters, lambda v: {"value": v}),
+                "gauges": series(self._gauges, lambda v: {"value": v}),
+                "histograms": series(
+                    self._histograms,
+                    lambda h: {
+                        "count": h.count,
+                        "sum": round(h.sum, 6),
+                        **{f"p{int(q * 100)}": _finite(h.quantile(q)) for q in (0.5, 0.95, 0.99)},
+                    },
+                ),
+            }
+
+    def to_prometheus(self) -> str:
+        """Return every series in the Prometheus text exposition format."""
+        lines = []
+
+        def header(name, kind):
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            for name, values in sorted(self._counters.items()):
+                header(name, "counter")
+                lines.extend(f"{name}{_format_labels(k)} {v:g}" for k, v in sorted(values.items()))
+            for name, values in sorted(self._gauges.items()):
+                header(name, "gauge")
+                lines.extend(f"{name}{_format_labels(k)} {v:g}" for k, v in sorted(values.items()))
+            for name, values in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for key, hist in sorted(values.items()):
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        cumulative += n
+                        le = "+Inf" if math.isinf(bound) else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': le})} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+add = REGISTRY.add
+set_gauge = REGISTRY.set
+
+
+@contextmanager
+def span(name: str, labels: dict | None = None, **fields):
+    """
+    Time a block into the ``<name>_seconds`` histogram.
+
+    ``labels`` become metric labels and should have few distinct values;
+    ``fields`` (e.g. the row URL) only appear in the debug log line.
+    """
+    labels = labels or {}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        REGISTRY.observe(f"{name}_seconds", duration, **labels)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("span %s %s %s took %.3fs", name, labels, fields, duration)
+
+
+def row_status(result) -> str:
+    """Return ``"error"`` if an output row carries an extraction or brand error."""
+    if isinstance(result, dict) and (result.get("error") or result.get("brand_error")):
+        return "error"
+    return "ok"
+
+
+def record_rows(stage: str, result, weight=None) -> None:
+    """
+    Count the output row(s) of one task for ``stage``.
+
+    With a ``weight`` function (see :mod:`modules.priority`), the weight of
+    rows without an error is added to ``covered_weight_total``.
+    """
+    for row in result if isinstance(result, list) else [result]:
+        status = row_status(row)
+        REGISTRY.inc("rows_total", stage=stage, status=status)
+        if weight is not None and status == "ok":
+            REGISTRY.inc("covered_weight_total", weight(row), stage=stage)
+
+
+def _write_atomic(path: str, text: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class Reporter:
+    """
+    Export :data:`REGISTRY` every ``interval`` seconds from a background thread.
+
+    ``json_path`` gets one JSON snapshot per line; ``prom_path`` is rewritten
+    with the Prometheus text format (e.g. for a node_exporter textfile
+    collector). With ``progress`` a one-line summary of rows done, rows/sec,
+    errors, rows in flight, share of prioritized weight covered and queue
+    depth is written to ``stream``.
+    """
+
+    def __init__(
+        self,
+        registry: Registry = REGISTRY,
+        *,
+        interval: float = 5.0,
+        json_path: str | None = None,
+        prom_path: str | None = None,
+        progress: bool = False,
+        stream=None,
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.progress = progress
+        self.stream = stream or sys.stderr
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._last: tuple[float, dict] | None = None
+
+    def __enter__(self) -> "Reporter":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> "Reporter":
+        if self.json_path or self.prom_path or self.progress:
+            self._thread = threading.Thread(target=self._run, name="metrics-reporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the thread and export one final time."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.report(final=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.report()
+            except Exception:
+                logger.exception("metrics export failed")
+
+    def _stage_rows(self) -> dict[str, tuple[float, float]]:
+        stages: dict[str, list[float]] = {}
+        for entry in self.registry.snapshot()["counters"].get("rows_total", []):
+            counts = stages.setdefault(entry["labels"].get("stage", ""), [0.0, 0.0])
+            counts[0] += entry["value"]
+            if entry["labels"].get("status") == "error":
+                counts[1] += entry["value"]
+        return {stage: (done, errors) for stage, (done, errors) in stages.items()}
+
+    def progress_line(self) -> str:
+        """Return the live progress summary."""
+        now = time.monotonic()
+        stages = self._stage_rows()
+        last_time, last_rows = self._last or (now, {})
+        elapsed = now - last_time
+        parts = []
+        for stage, (done, errors) in sorted(stages.items()):
+            rate = (done - last_rows.get(stage, (0, 0))[0]) / elapsed if elapsed > 0 else 0.0
+            in_flight = self.registry.value("rows_in_flight", stage=stage)
+            part = f"{stage}: {done:.0f} rows ({rate:.1f}/s, {errors:.0f} errors, {in_flight:.0f} in flight)"
+            queued = self.registry.value("queued_weight", stage=stage)
+            if queued:
+                covered = self.registry.value("covered_weight_total", stage=stage)
+                part += f" {covered / queued:.1%} of weight"
+            parts.append(part)
+        queue = self.registry.value("queue_depth", queue="handoff")
+        if queue:
+            parts.append(f"queue {queue:.0f}")
+        uptime = int(time.time() - self.registry.started)
+        parts.append(f"{uptime // 3600}:{uptime // 60 % 60:02d}:{uptime % 60:02d}")
+        self._last = (now, stages)
+        return " | ".join(parts)
+
+    def report(self, final: bool = False) -> None:
+        """Export once to every configured target."""
+        if self.json_path:
+            if os.path.dirname(self.json_path):
+                os.makedirs(os.path.dirname(self.json_path), exist_ok=True)
+            with open(self.json_path, "a") as f:
+                f.write(json.dumps(self.registry.snapshot()) + "\n")
+        if self.prom_path:
+            _write_atomic(self.prom_path, self.registry.to_prometheus())
+        if self.progress:
+            line = self.progress_line()
+            if self.stream.isatty():
+                self.stream.write("\r\033[K" + line + ("\n" if final else ""))
+            else:
+                self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def add_arguments(parser) -> None:
+    """Add the logging and metrics options shared by the command line scripts."""
+    parser.add_argument(
+        "--log-level",
+        default="INFO",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        help="DEBUG also logs every request, prompt and row span",
+    )
+    parser.add_argument("--progress", action="store_true", help="Show a live progress line on stderr")
+    parser.add_argument("--metrics-json", default=None, help="Append a JSON metrics snapshot to this file periodically")
+    parser.add_argument("--metrics-prom", default=None, help="Keep Prometheus text metrics in this file")
+    parser.add_argument("--metrics-interval", type=float, default=5.0, help="Seconds between metric exports")
+
+
+def setup(args) -> Reporter:
+    """Configure logging from ``args`` and return a started :class:`Reporter`."""
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    return Reporter(
+        interval=args.metrics_interval,
+        json_path=args.metrics_json,
+        prom_path=args.metrics_prom,
+        progress=args.progress,
+    ).start()
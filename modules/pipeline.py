@@ -0,0 +1,111 @@
+# pipeline.py
+
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from modules import metrics
+from modules.csv_sink import CsvSink
+
+# Marks the end of the stream on the hand-off queue
+_DONE = object()
+
+
+def run_two_stage(
+    items,
+    first_fn,
+    second_fn,
+    *,
+    first_workers: int = 5,
+    second_workers: int = 5,
+    queue_size: int = 100,
+    first_csv: str | None = None,
+    first_fieldnames: list[str] | None = None,
+    second_csv: str | None = None,
+    second_fieldnames: list[str] | None = None,
+    collect: bool = True,
+    stages: tuple[str, str] = ("first", "second"),
+) -> tuple[list[dict], list[dict]]:
+    """
+    Stream ``items`` through ``first_fn`` and then ``second_fn``.
+
+    Each result of the first stage is handed to the second stage as soon as it
+    is ready through a queue holding at most ``queue_size`` rows; when the
+    second stage falls behind, first-stage workers block instead of piling up
+    results. Each stage has its own worker count and writes its CSV row by row.
+    Both lists of results are returned in completion order. ``items`` is
+    consumed lazily, a few rows per first-stage worker at a time; with
+    ``collect=False`` results are only written to the CSVs and both lists
+    come back empty. ``stages`` names the two stages in :mod:`modules.metrics`,
+    which also tracks the depth of the hand-off queue.
+    """
+    handoff: queue.Queue = queue.Queue(maxsize=max(queue_size, 1))
+    first_out = CsvSink(first_csv, first_fieldnames) if first_csv else None
+    second_out = CsvSink(second_csv, second_fieldnames) if second_csv else None
+    first_results: list[dict] = []
+    second_results: list[dict] = []
+    errors: list[BaseException] = []
+    first_stage, second_stage = stages
+
+    def timed(fn, stage, item):
+        metrics.add("rows_in_flight", 1, stage=stage)
+        try:
+            with metrics.span("row", {"stage": stage}):
+                res = fn(item)
+        finally:
+            metrics.add("rows_in_flight", -1, stage=stage)
+        metrics.record_rows(stage, res)
+        return res
+
+    def first_worker(item):
+        res = timed(first_fn, first_stage, item)
+        if first_out is not None:
+            first_out.write(res)
+        if collect:
+            first_results.append(res)
+        handoff.put(res)
+        metrics.set_gauge("queue_depth", handoff.qsize(), queue="handoff")
+
+    def second_worker():
+        while True:
+            res = handoff.get()
+            if res is _DONE:
+                return
+            metrics.set_gauge("queue_depth", handoff.qsize(), queue="handoff")
+            try:
+                out = timed(second_fn, second_stage, res)
+                if second_out is not None:
+                    second_out.write(out)
+                if collect:
+                    second_results.append(out)
+            except BaseException as e:
+                errors.append(e)
+
+    consumers = [threading.Thread(target=second_worker, daemon=True) for _ in range(max(second_workers, 1))]
+    for t in consumers:
+        t.start()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(first_workers, 1)) as executor:
+            window = max(first_workers, 1) * 4
+            pending = set()
+            for item in items:
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        fut.result()
+                pending.add(executor.submit(first_worker, item))
+            for fut in pending:
+                fut.result()
+    finally:
+        for _ in consumers:
+            handoff.put(_DONE)
+        for t in consumers:
+            t.join()
+        for sink in (first_out, second_out):
+            if sink is not None:
+                sink.close()
+
+    if errors:
+        raise errors[0]
+    return first_results, second_results
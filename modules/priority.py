@@ -0,0 +1,47 @@
+# priority.py
+
+import heapq
+import logging
+
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def item_count_weight(row: dict) -> float:
+    """Return the ``item_count`` of ``row`` as a number (0 if missing or malformed)."""
+    try:
+        return max(float(str(row.get("item_count") or 0).replace(",", "")), 0.0)
+    except ValueError:
+        return 0.0
+
+
+def by_weight(rows, weight=item_count_weight, *, stage: str = "rows"):
+    """
+    Yield ``rows`` heaviest first, keeping input order among equal weights.
+
+    Every row has to be read before the heaviest one is known, so the whole
+    input is loaded; the heap is built in linear time and rows are popped
+    one at a time as workers ask for them. The total weight is published as
+    the ``queued_weight`` gauge of ``stage`` so progress can be reported as
+    the share of it covered (see :func:`modules.metrics.record_rows`).
+    """
+    heap = []
+    total = 0.0
+    for seq, row in enumerate(rows):
+        w = weight(row)
+        total += w
+        heap.append((-w, seq, row))
+    heapq.heapify(heap)
+    metrics.set_gauge("queued_weight", total, stage=stage)
+    logger.info("Prioritized %s rows by weight (total %.0f)", len(heap), total)
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def coverage(stage: str) -> float | None:
+    """Return the share of ``stage``'s queued weight covered so far, or ``None`` if nothing was queued."""
+    total = metrics.REGISTRY.value("queued_weight", stage=stage)
+    if not total:
+        return None
+    return metrics.REGISTRY.value("covered_weight_total", stage=stage) / total
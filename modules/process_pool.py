@@ -0,0 +1,70 @@
+# process_pool.py
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from modules import metrics
+from modules.csv_source import chunked
+from modules.csv_sink import CsvSink
+
+
+def _run_chunk(fn, chunk: list) -> list:
+    return [fn(item) for item in chunk]
+
+
+def process_map(
+    fn,
+    items,
+    workers: int | None = None,
+    *,
+    chunk_size: int = 256,
+    fieldnames: list[str] | None = None,
+    final_csv: str | None = None,
+    ordered: bool = False,
+    collect: bool = True,
+    stage: str = "rows",
+    initializer=None,
+    initargs: tuple = (),
+) -> list:
+    """
+    Run a CPU-bound ``fn`` over ``items`` on a pool of ``workers`` processes.
+
+    Counterpart of :func:`modules.extraction._thread_map` for work that holds
+    the GIL (parsing, normalization, alias matching). Items are sent in lists
+    of ``chunk_size``, so pickling costs are paid per chunk rather than per row.
+    At most two chunks per worker are pending at once. ``fn`` must be picklable,
+    i.e. a module-level function or a :func:`functools.partial` of one.
+    Per-process state such as cache connections belongs in ``initializer``.
+    Results are written to ``final_csv`` from this process and returned in
+    input order unless ``collect`` is false. Network calls should stay on
+    threads or asyncio.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * 2
+    results: dict[int, list] = {}
+    pending: dict = {}  # future -> chunk position
+    sink = CsvSink(final_csv, fieldnames, ordered=ordered) if final_csv else None
+
+    def harvest(done):
+        for fut in done:
+            seq = pending.pop(fut)
+            rows = fut.result()
+            metrics.record_rows(stage, rows)
+            if sink is not None:
+                sink.write(rows, seq)
+            if collect:
+                results[seq] = rows
+
+    try:
+        with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as executor:
+            for seq, chunk in enumerate(chunked(items, chunk_size)):
+                if len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    harvest(done)
+                pending[executor.submit(_run_chunk, fn, chunk)] = seq
+            harvest(wait(pending).done)
+    finally:
+        if sink is not None:
+            sink.close()
+
+    return [row for seq in sorted(results) for row in results[seq]]
@@ -1,5 +1,7 @@
 # prompting.py
 
+import json
+
 def build_prompt(input_text: str) -> str:
     """
     Generate a prompt for the model based on the item name or URL.
@@ -8,3 +10,49 @@ def build_prompt(input_text: str) -> str:
         f'Extract the brand name: "{input_text}"\n\n'
         'Respond in JSON: {"name": <name in English>} or {"error": <reason>}'
     )
+
+
+def build_batch_prompt(input_texts: list[str]) -> str:
+    """
+    Generate one prompt asking for the brand of several items at once.
+
+    Items are numbered from 0 and the model is asked for a JSON array whose
+    entries carry the index of the item they answer.
+    """
+    items = "\n".join(f'{i}: "{text}"' for i, text in enumerate(input_texts))
+    return (
+        f"Extract the brand name of each item:\n{items}\n\n"
+        'Respond in JSON: [{"index": <index>, "name": <name in English>} or '
+        '{"index": <index>, "error": <reason>}, ...] with one entry per item'
+    )
+
+
+def parse_batch_response(raw: str, count: int) -> dict[int, dict]:
+    """
+    Return the well-formed entries of a batch response keyed by item index.
+
+    Entries with a missing or out-of-range index, or with neither a string
+    ``name`` nor an ``error``, are dropped so the caller can retry those
+    items one by one. A response that is not a JSON array yields ``{}``.
+    """
+    try:
+        data = json.loads(raw)
+    except (TypeError, ValueError):
+        return {}
+    if isinstance(data, dict):
+        data = data.get("items", data.get("results"))
+    if not isinstance(data, list):
+        return {}
+
+    entries = {}
+    for entry in data:
+        if not isinstance(entry, dict):
+            continue
+        index = entry.get("index")
+        if isinstance(index, str) and index.isdigit():
+            index = int(index)
+        if not isinstance(index, int) or not 0 <= index < count or index in entries:
+            continue
+        if isinstance(entry.get("name"), str) or "error" in entry:
+            entries[index] = entry
+    return entries
@@ -0,0 +1,288 @@
+# rate_limit.py
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at ``per_minute`` tokens per minute.
+
+    Callers reserve tokens up front and are told how long to wait before using
+    them, which keeps the bucket usable from both threads and coroutines. The
+    bucket holds at most one second's worth of tokens so requests are spread
+    evenly instead of bursting.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate, 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take ``amount`` tokens and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def adjust(self, amount: float) -> None:
+        """Charge (or refund, if negative) ``amount`` tokens after the fact."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """
+    Concurrency limit with additive-increase/multiplicative-decrease (AIMD).
+
+    Each success raises the limit by ``1 / limit`` (about one slot per round of
+    requests) up to ``maximum``; a throttle halves it, at most once per
+    ``cooldown`` seconds so one burst of 429s only counts once.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, cooldown: float = 1.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.cooldown = cooldown
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def try_enter(self) -> bool:
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def enter(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def leave(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify()
+
+    def reset(self, maximum: int) -> None:
+        """Start again from a ceiling of ``maximum``, e.g. for a new run."""
+        with self._cond:
+            self.maximum = maximum
+            self.limit = float(maximum)
+            self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = now
+
+
+class RateLimiter:
+    """
+    Client-side limiter combining request and token buckets with AIMD concurrency.
+
+    Any limit left as ``None`` is not enforced, so an unconfigured limiter
+    never blocks until :meth:`default_concurrency` gives AIMD a ceiling or a
+    429 pauses it. Use :meth:`slot` (or :meth:`acquire`/:meth:`release`)
+    around each request and report the outcome with :meth:`on_success` or
+    :meth:`on_throttle`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_concurrency: int | None = None,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency) if max_concurrency else None
+        self._configured_concurrency = bool(max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.successes = 0
+        self.throttles = 0
+        self.waited = 0.0
+        self._paused_until = 0.0
+        self._recent: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "RateLimiter":
+        """
+        Build a limiter from ``<prefix>_REQUESTS_PER_MINUTE``,
+        ``<prefix>_TOKENS_PER_MINUTE`` and ``<prefix>_MAX_CONCURRENCY``.
+        """
+
+        def number(key, cast):
+            value = os.getenv(f"{prefix}_{key}")
+            return cast(value) if value else None
+
+        return cls(
+            name,
+            requests_per_minute=number("REQUESTS_PER_MINUTE", float),
+            tokens_per_minute=number("TOKENS_PER_MINUTE", float),
+            max_concurrency=number("MAX_CONCURRENCY", int),
+        )
+
+    def default_concurrency(self, workers: int) -> None:
+        """
+        Cap AIMD concurrency at ``workers`` unless ``max_concurrency`` was configured.
+
+        Called at the start of a run so a 429 can shrink the requests in
+        flight even when no limit was set.
+        """
+        if self._configured_concurrency or workers < 1:
+            return
+        if self.concurrency is None:
+            self.concurrency = AdaptiveConcurrency(workers)
+        else:
+            self.concurrency.reset(workers)
+
+    def paused_for(self) -> float:
+        """Return the seconds left of a pause set by :meth:`on_throttle`."""
+        with self._lock:
+            return self._paused_until - time.monotonic()
+
+    def _pause(self) -> float:
+        wait = self.paused_for()
+        if wait > 0:
+            with self._lock:
+                self.waited += wait
+        return wait
+
+    def _reserve(self, tokens: float) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        with self._lock:
+            self.waited += wait
+        return wait
+
+    def _started(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+
+    def acquire(self, tokens: float = 0) -> None:
+        """Block until a request costing ``tokens`` may be sent."""
+        pause = self._pause()
+        if pause > 0:
+            time.sleep(pause)
+        if self.concurrency:
+            self.concurrency.enter()
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        self._started()
+
+    async def aacquire(self, tokens: float = 0) -> None:
+        """Async version of :meth:`acquire`."""
+        pause = self._pause()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        if self.concurrency:
+            while not self.concurrency.try_enter():
+                await asyncio.sleep(0.05)
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._started()
+
+    def release(self) -> None:
+        if self.concurrency:
+            self.concurrency.leave()
+
+    @contextmanager
+    def slot(self, tokens: float = 0):
+        self.acquire(tokens)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def on_success(self, tokens_used: float | None = None, tokens_reserved: float = 0) -> None:
+        """Record a successful request, correcting the token estimate if known."""
+        with self._lock:
+            self.successes += 1
+        if self.concurrency:
+            self.concurrency.on_success()
+        if self.tokens and tokens_used is not None:
+            self.tokens.adjust(tokens_used - tokens_reserved)
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        """
+        Record a rate limit response and shrink the concurrency limit.
+
+        With ``retry_after``, every caller of :meth:`acquire` waits that many
+        seconds before its next request.
+        """
+        with self._lock:
+            self.throttles += 1
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        if self.concurrency:
+            before = int(self.concurrency.limit)
+            self.concurrency.on_throttle()
+            after = int(self.concurrency.limit)
+            if after < before:
+                logger.warning("%s limiter: concurrency limit reduced from %s to %s", self.name, before, after)
+
+    def snapshot(self) -> dict:
+        """Return the current rate and backoff state for logging."""
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(1 for t in self._recent if now - t <= 60)
+            state = {
+                "name": self.name,
+                "requests_last_minute": recent,
+                "requests_per_minute_limit": self.requests_per_minute,
+                "tokens_per_minute_limit": self.tokens_per_minute,
+                "successes": self.successes,
+                "throttles": self.throttles,
+                "seconds_waited": round(self.waited, 3),
+                "paused_for": round(max(self._paused_until - now, 0.0), 3),
+            }
+        if self.concurrency:
+            state.update(
+                {
+                    "concurrency_limit": int(self.concurrency.limit),
+                    "concurrency_max": self.concurrency.maximum,
+                    "in_flight": self.concurrency.in_flight,
+                    "backing_off": int(self.concurrency.limit) < self.concurrency.maximum,
+                }
+            )
+        return state
+
+
+def estimate_tokens(text: str, completion: int = 50) -> int:
+    """Rough token count of a prompt plus its expected completion."""
+    return len(text) // 4 + completion
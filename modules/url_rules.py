@@ -0,0 +1,216 @@
+# url_rules.py
+
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import unquote, urlsplit
+
+from modules.brand_map import AliasMatcher, default_matcher
+from modules.urls import normalize_url, url_host
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "docs", "url_rules.json")
+
+
+def compile_path(template: str) -> re.Pattern:
+    """
+    Compile a path template into a regex matching paths that start with it.
+
+    ``*`` matches one path segment and ``{brand}`` captures one segment as
+    the ``brand`` group, e.g. ``/shop/{brand}/*``.
+    """
+    parts = []
+    for segment in template.strip("/").split("/"):
+        if segment == "*":
+            parts.append("[^/]+")
+        elif segment == "{brand}":
+            parts.append("(?P<brand>[^/]+)")
+        else:
+            parts.append(re.escape(segment))
+    return re.compile("^/" + "/".join(parts) + "(?:/|$)", re.I)
+
+
+class _Rule:
+    __slots__ = ("brand", "regex", "literal", "spec")
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.brand = spec.get("brand")
+        self.literal = bool(spec.get("literal"))
+        if "pattern" in spec:
+            self.regex = re.compile(spec["pattern"], re.I)
+        elif "path" in spec:
+            self.regex = compile_path(spec["path"])
+        else:
+            self.regex = None
+
+
+class UrlRules:
+    """
+    Resolve brands from the URL alone using per-host rules.
+
+    Each rule names a ``host`` (which also covers its subdomains) and either a
+    fixed ``brand`` (brand-owned stores) or a ``path`` template / ``pattern``
+    regex whose ``brand`` group is resolved through the alias map. A captured
+    segment that is not a known alias only counts with ``"literal": true``.
+    Rules for a host are tried in file order.
+
+    :meth:`resolve_row` tries the rules and then falls back to the wrapped
+    :class:`AliasMatcher`, so an instance can be passed wherever a matcher is
+    expected.
+    """
+
+    def __init__(self, rules: list[dict], matcher: AliasMatcher | None = None):
+        self.matcher = matcher or default_matcher()
+        self._rules: dict[str, list[_Rule]] = defaultdict(list)
+        for spec in rules:
+            self._rules[url_host(spec["host"])].append(_Rule(spec))
+        self._lock = threading.Lock()
+        self.rows_seen = 0
+        self.rows_matched = 0
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_PATH, matcher: AliasMatcher | None = None) -> "UrlRules":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f).get("rules", []), matcher)
+
+    def rules_for(self, host: str) -> list[_Rule]:
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            rules = self._rules.get(".".join(labels[i:]))
+            if rules:
+                return rules
+        return []
+
+    def covers(self, host: str) -> bool:
+        """Return whether any rule applies to ``host``."""
+        return bool(self.rules_for(url_host(host)))
+
+    def _match(self, url: str) -> str | None:
+        if not url:
+            return None
+        rules = self.rules_for(url_host(url))
+        if not rules:
+            return None
+        path = unquote(urlsplit(normalize_url(url)).path)
+        for rule in rules:
+            if rule.regex is None:
+                return rule.brand
+            m = rule.regex.search(path)
+            if not m:
+                continue
+            if rule.brand:
+                return rule.brand
+            segment = m.group("brand")
+            brand = self.matcher.resolve(segment)
+            if brand:
+                return brand
+            if rule.literal:
+                return segment.replace("-", " ").replace("_", " ")
+        return None
+
+    def match(self, url: str, count: bool = True) -> str | None:
+        """
+        Return the brand for ``url`` if a rule decides it.
+
+        The lookup counts towards :meth:`stats` unless ``count`` is false, for
+        callers that see a row another stage also resolves.
+        """
+        brand = self._match(url)
+        if not count:
+            return brand
+        with self._lock:
+            self.rows_seen += 1
+            if brand is not None:
+                self.rows_matched += 1
+        return brand
+
+    def resolve_row(self, item_name: str, url: str) -> str | None:
+        """Return the rule brand for ``url``, or the alias-map result for the row."""
+        return self.match(url) or self.matcher.resolve_row(item_name, url)
+
+    def stats(self) -> dict:
+        """Return how many rows were decided by a URL rule."""
+        with self._lock:
+            seen, matched = self.rows_seen, self.rows_matched
+        return {"rows": seen, "matched": matched, "share": matched / seen if seen else 0.0}
+
+
+_DEFAULT_RULES = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_rules() -> UrlRules:
+    """Return the shared rules built from ``docs/url_rules.json`` and ``docs/map.json``."""
+    global _DEFAULT_RULES
+    with _DEFAULT_LOCK:
+        if _DEFAULT_RULES is None:
+            _DEFAULT_RULES = UrlRules.from_file()
+        return _DEFAULT_RULES
+
+
+def _brand_key(brand: str) -> str:
+    return " ".join(brand.replace("_", " ").replace("-", " ").split()).upper()
+
+
+def learn_rules(
+    rows,
+    matcher: AliasMatcher | None = None,
+    known: UrlRules | None = None,
+    *,
+    min_support: int = 20,
+    min_share: float = 0.95,
+    max_depth: int = 4,
+) -> list[dict]:
+    """
+    Propose rules from past ``brands.csv`` rows (``url`` and ``brand``).
+
+    A host with at least ``min_support`` branded rows, where one brand accounts
+    for ``min_share`` of them, becomes a fixed-brand rule. Otherwise, a path
+    position can become a ``{brand}`` template rule when its segment resolves
+    through the alias map to the row's brand that often. Hosts already covered
+    by ``known`` are skipped. Each proposal carries its ``support`` and ``share``.
+    """
+    matcher = matcher or default_matcher()
+    by_host: dict[str, list[tuple[list[str], str]]] = defaultdict(list)
+    for row in rows:
+        brand = (row.get("brand") or "").strip()
+        url = row.get("url") or ""
+        if not brand or not url:
+            continue
+        host = url_host(url)
+        if known is not None and known.covers(host):
+            continue
+        segments = [s for s in unquote(urlsplit(normalize_url(url)).path).split("/") if s]
+        by_host[host].append((segments, _brand_key(brand)))
+
+    proposals = []
+    for host, entries in sorted(by_host.items()):
+        if len(entries) < min_support:
+            continue
+        brand, count = Counter(b for _, b in entries).most_common(1)[0]
+        if count / len(entries) >= min_share:
+            canonical = matcher.resolve(brand) or brand
+            proposals.append(
+                {"host": host, "brand": canonical, "support": len(entries), "share": round(count / len(entries), 3)}
+            )
+            continue
+
+        best = None
+        for depth in range(max_depth):
+            hits = [(segs, b) for segs, b in entries if len(segs) > depth and matcher.resolve(segs[depth])]
+            if len(hits) < min_support:
+                continue
+            agree = [segs for segs, b in hits if _brand_key(matcher.resolve(segs[depth])) == b]
+            share = len(agree) / len(hits)
+            if share >= min_share and (best is None or len(hits) > best[1]):
+                prefix = []
+                for i in range(depth):
+                    values = {segs[i] for segs in agree}
+                    prefix.append(values.pop() if len(values) == 1 else "*")
+                best = ("/" + "/".join(prefix + ["{brand}"]), len(hits), share)
+        if best is not None:
+            path, support, share = best
+            proposals.append({"host": host, "path": path, "support": support, "share": round(share, 3)})
+    return proposals
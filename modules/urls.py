@@ -0,0 +1,136 @@
+# urls.py
+
+import json
+import os
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Return a normalized form of ``url`` suitable for use as a lookup key.
+
+    The scheme and host are lowercased, default ports and fragments are
+    dropped, query parameters are sorted and a trailing slash on the path is
+    removed so trivially different spellings of the same page share a key.
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    if "://" not in url:
+        url = "https://" + url
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "docs", "url_params.json")
+
+# Host prefixes for the same site served to desktop and mobile browsers
+_HOST_PREFIXES = ("www.", "m.", "mobile.", "sp.")
+
+
+class UrlCanonicalizer:
+    """
+    Map page URLs that show the same page to one canonical key.
+
+    On top of :func:`normalize_url` the key drops ``www.``/mobile host
+    prefixes and tracking query parameters. ``rules`` has a global ``drop``
+    list of parameter names (a trailing ``*`` matches a prefix) and a
+    ``hosts`` mapping from domain to ``{"keep": [...]}`` or ``{"drop": [...]}``.
+    With ``keep``, only the listed parameters identify a page on that domain
+    and its subdomains.
+    """
+
+    def __init__(self, rules: dict | None = None):
+        rules = rules or {}
+        self.drop = tuple(rules.get("drop", ()))
+        self.hosts = {_strip_host(h.lower()): r for h, r in rules.get("hosts", {}).items()}
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_PATH) -> "UrlCanonicalizer":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def host_rule(self, host: str) -> dict:
+        """Return the rule for ``host`` or its closest configured parent domain."""
+        labels = host.split(".")
+        for i in range(len(labels) - 1):
+            rule = self.hosts.get(".".join(labels[i:]))
+            if rule is not None:
+                return rule
+        return {}
+
+    def __call__(self, url: str) -> str:
+        norm = normalize_url(url)
+        if not norm:
+            return ""
+        parts = urlsplit(norm)
+        host = _strip_host(parts.netloc)
+        rule = self.host_rule(host.split(":", 1)[0])
+        keep = rule.get("keep")
+        drop = self.drop + tuple(rule.get("drop", ()))
+        params = [
+            (k, v)
+            for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if (k in keep if keep is not None else not _matches(k, drop))
+        ]
+        return urlunsplit((parts.scheme, host, parts.path, urlencode(params), ""))
+
+
+def url_host(url: str) -> str:
+    """Return the lowercased host of ``url`` without ``www.``/mobile prefixes."""
+    return _strip_host(urlsplit(normalize_url(url)).hostname or "")
+
+
+# Second-level public suffixes common in the input; anything else is treated
+# as a single-label suffix such as ``.com`` or ``.jp``
+_TWO_LEVEL_SUFFIXES = {
+    "co.jp", "ne.jp", "or.jp", "ac.jp", "go.jp", "gr.jp",
+    "co.uk", "org.uk", "com.au", "co.kr", "com.cn", "com.tw", "com.hk", "co.nz",
+}
+
+
+def registrable_domain(url: str) -> str:
+    """Return the registrable domain of ``url`` (``shop.arcteryx.co.jp`` -> ``arcteryx.co.jp``)."""
+    host = url_host(url).split(":", 1)[0]
+    labels = host.split(".")
+    if len(labels) < 2:
+        return host
+    suffix = 2 if ".".join(labels[-2:]) in _TWO_LEVEL_SUFFIXES and len(labels) > 2 else 1
+    return ".".join(labels[-suffix - 1 :])
+
+
+def _strip_host(host: str) -> str:
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            return host[len(prefix):]
+    return host
+
+
+def _matches(name: str, patterns) -> bool:
+    name = name.lower()
+    for pattern in patterns:
+        if pattern.endswith("*") and name.startswith(pattern[:-1]) or name == pattern:
+            return True
+    return False
+
+
+_DEFAULT_CANONICALIZER = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def default_canonicalizer() -> UrlCanonicalizer:
+    """Return the shared canonicalizer built from ``docs/url_params.json``."""
+    global _DEFAULT_CANONICALIZER
+    with _DEFAULT_LOCK:
+        if _DEFAULT_CANONICALIZER is None:
+            _DEFAULT_CANONICALIZER = UrlCanonicalizer.from_file()
+        return _DEFAULT_CANONICALIZER
@@ -0,0 +1,134 @@
+import argparse
+import logging
+import os
+import extract_brands
+import extract_names
+from modules import metrics
+from modules.cache import MetadataCache, PromptCache, prompt_key
+from modules.csv_source import read_csv_rows
+from modules.extraction import _item_from_metadata, _item_result, _row_url
+from modules.process_pool import process_map
+from modules.prompting import build_prompt
+
+logger = logging.getLogger(__name__)
+
+# Per-process state set up by init_worker
+_WORKER: dict = {}
+
+
+def init_worker(
+    metadata_cache: str | None,
+    prompt_cache: str | None,
+    deployment: str | None,
+    use_alias_map: bool = True,
+    use_url_rules: bool = True,
+) -> None:
+    """Open the caches and build the matcher once per worker process."""
+    _WORKER.clear()
+    _WORKER.update(
+        metadata=MetadataCache(metadata_cache, ttl=None) if metadata_cache else None,
+        prompts=PromptCache(prompt_cache, ttl=None) if prompt_cache else None,
+        deployment=deployment,
+        matcher=extract_brands._row_matcher(use_alias_map, use_url_rules),
+    )
+
+
+def name_row(row: dict) -> dict:
+    """Re-derive the item name row of ``row`` from cached metadata only."""
+    url = _row_url(row)
+    cache = _WORKER.get("metadata")
+    meta = cache.get(url) if cache is not None and url else None
+    if meta is None:
+        return _item_result(row, url, error=LookupError(f"No cached metadata for URL: {url}"))
+    try:
+        return _item_result(row, url, _item_from_metadata(url, meta))
+    except Exception as e:
+        return _item_result(row, url, error=e)
+
+
+def reprocess_row(row: dict) -> dict:
+    """
+    Return the brand row for an input row without any network call.
+
+    The item name comes from cached Firecrawl metadata, and the brand comes
+    from URL rules, the alias map or a cached LLM answer to the same prompt.
+    Rows with no cached answer get a ``brand_error``.
+    """
+    result, input_text = extract_brands._prepare_row(name_row(row), _WORKER["matcher"])
+    if input_text is None:
+        return result
+    prompts = _WORKER.get("prompts")
+    key = prompt_key(build_prompt(input_text), _WORKER.get("deployment"))
+    raw = prompts.get(key) if prompts is not None else None
+    if raw is None:
+        result["brand_error"] = "No cached LLM response"
+        return result
+    try:
+        return extract_brands._apply_response(result, raw)
+    except Exception as e:
+        result["brand_error"] = str(e)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-derive brands from cached metadata and LLM answers on all cores")
+    parser.add_argument("--input", default="data/input.csv", help="Rows to reprocess")
+    parser.add_argument("--output", default="data/output/brands_reprocessed.csv", help="Where to write brand rows")
+    parser.add_argument("--start", type=int, default=1, help="First row to process (1-indexed)")
+    parser.add_argument("--end", type=int, default=None, help="Last row to process (inclusive)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Rows sent to a worker at a time")
+    parser.add_argument("--metadata-cache", default=extract_names.DEFAULT_CACHE_PATH, help="Metadata cache database")
+    parser.add_argument("--prompt-cache", default=extract_brands.DEFAULT_CACHE_PATH, help="Prompt cache database")
+    parser.add_argument(
+        "--deployment",
+        default=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+        help="Deployment whose cached answers to reuse (default AZURE_OPENAI_DEPLOYMENT)",
+    )
+    parser.add_argument("--no-alias-map", action="store_true", help="Do not resolve known aliases locally")
+    parser.add_argument("--no-url-rules", action="store_true", help="Ignore docs/url_rules.json")
+    parser.add_argument(
+        "--preserve-order",
+        action="store_true",
+        help="Write output rows in input order instead of completion order",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    reporter = metrics.setup(args)
+
+    try:
+        rows = read_csv_rows(args.input, args.start, args.end)
+    except FileNotFoundError:
+        logger.info("%s not found", args.input)
+        return
+    logger.info("Reprocessing rows %s to %s of %s", args.start, args.end or "the end of the file", args.input)
+
+    try:
+        process_map(
+            reprocess_row,
+            rows,
+            args.workers,
+            chunk_size=args.chunk_size,
+            fieldnames=extract_brands.FIELDNAMES,
+            final_csv=args.output,
+            ordered=args.preserve_order,
+            collect=False,
+            stage="reprocess",
+            initializer=init_worker,
+            initargs=(
+                args.metadata_cache,
+                args.prompt_cache,
+                args.deployment,
+                not args.no_alias_map,
+                not args.no_url_rules,
+            ),
+        )
+    finally:
+        reporter.stop()
+
+    ok = metrics.REGISTRY.value("rows_total", stage="reprocess", status="ok")
+    errors = metrics.REGISTRY.value("rows_total", stage="reprocess", status="error")
+    logger.info("Reprocessed %.0f rows into %s; %.0f lacked cached data", ok + errors, args.output, errors)
+
+if __name__ == "__main__":
+    main()
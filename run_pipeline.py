@@ -0,0 +1,214 @@
+import argparse
+import logging
+from functools import partial
+import extract_brands
+import extract_names
+from modules.brand_map import default_matcher
+from modules.cache import MetadataCache, PromptCache
+from modules.csv_source import read_csv_rows
+from modules.dedupe import UrlDeduper
+from modules.delta import DEFAULT_INDEX_PATH, PriorOutputs
+from modules.domain_scheduler import DomainScheduler
+from modules import extraction, llm_client, metrics
+from modules.extraction import extract_row, host_failed
+from modules.html_meta import LocalFetcher
+from modules.pipeline import run_two_stage
+
+logger = logging.getLogger(__name__)
+
+
+def run(
+    rows,
+    *,
+    name_workers: int = 5,
+    brand_workers: int = 5,
+    queue_size: int = 100,
+    names_csv: str | None = None,
+    brands_csv: str | None = None,
+    metadata_cache: MetadataCache | None = None,
+    prompt_cache: PromptCache | None = None,
+    use_alias_map: bool = True,
+    collect: bool = True,
+    dedupe: UrlDeduper | None = None,
+    scheduler: DomainScheduler | None = None,
+    use_url_rules: bool = True,
+    local: LocalFetcher | None = None,
+    prior: PriorOutputs | None = None,
+) -> tuple[list[dict], list[dict]]:
+    """
+    Extract item names and brands in one pass.
+
+    Each row goes to brand extraction as soon as its item name is known, so
+    the LLM works while scraping is still in progress. Returns the item name
+    rows and the brand rows (both empty with ``collect=False``). ``dedupe``
+    scrapes each canonical URL once and ``scheduler`` caps scrapes per host.
+    Rows whose brand follows from ``docs/url_rules.json`` are not scraped.
+    With ``local``, pages are read directly before falling back to Firecrawl.
+    Rows with results from earlier runs in ``prior`` skip both stages' work.
+    """
+    matcher = extract_brands._row_matcher(use_alias_map, use_url_rules)
+    rules = matcher if use_url_rules else None
+    # The brand stage resolves the same rows through the rules and counts them
+    first_fn = partial(extract_row, cache=metadata_cache, dedupe=dedupe, rules=rules, local=local, count_rules=False)
+    second_fn = partial(extract_brands.process_row, cache=prompt_cache, matcher=matcher)
+    if scheduler is not None:
+        passthrough = None if prior is None else lambda row: prior.get("names", row) is not None
+        rows = scheduler.schedule(rows, passthrough)
+        first_fn = scheduler.wrap(first_fn, host_failed)
+    if prior is not None:
+        first_fn = prior.wrap(first_fn, "names")
+        second_fn = prior.wrap(second_fn, "brands")
+    return run_two_stage(
+        rows,
+        first_fn,
+        second_fn,
+        first_workers=name_workers,
+        second_workers=brand_workers,
+        queue_size=queue_size,
+        first_csv=names_csv,
+        first_fieldnames=extract_names.FIELDNAMES,
+        second_csv=brands_csv,
+        second_fieldnames=extract_brands.FIELDNAMES,
+        collect=collect,
+        stages=("names", "brands"),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract item names and brands in one streaming pass")
+    parser.add_argument("--start", type=int, default=1, help="First row to process (1-indexed)")
+    parser.add_argument("--end", type=int, default=None, help="Last row to process (inclusive)")
+    parser.add_argument("--name-workers", type=int, default=5, help="Concurrent Firecrawl scrapes")
+    parser.add_argument("--brand-workers", type=int, default=5, help="Concurrent brand extractions")
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=100,
+        help="Rows that may wait between the two stages before scraping pauses",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the metadata and prompt caches")
+    parser.add_argument(
+        "--no-alias-map",
+        action="store_true",
+        help="Send every row to the LLM instead of resolving known aliases locally",
+    )
+    parser.add_argument(
+        "--no-url-rules",
+        action="store_true",
+        help="Scrape every row instead of resolving brands from docs/url_rules.json",
+    )
+    parser.add_argument(
+        "--no-dedupe",
+        action="store_true",
+        help="Scrape every row even when its URL matches an earlier one after canonicalization",
+    )
+    parser.add_argument(
+        "--max-per-host",
+        type=int,
+        default=None,
+        help="Scrapes in flight per host (default FIRECRAWL_MAX_PER_HOST or 4; 0 disables per-host scheduling)",
+    )
+    parser.add_argument(
+        "--local-fetch",
+        action="store_true",
+        help="Read page metadata directly first and only scrape with Firecrawl when it is not usable",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Carry forward names and brands from earlier outputs and only process new, changed or failed rows",
+    )
+    parser.add_argument(
+        "--prior-index",
+        default=DEFAULT_INDEX_PATH,
+        help="Index of earlier outputs used by --incremental",
+    )
+    parser.add_argument(
+        "--totals",
+        action="store_true",
+        help="Afterwards write per-month brand totals (see aggregate_brands.py)",
+    )
+    metrics.add_arguments(parser)
+    args = parser.parse_args()
+    reporter = metrics.setup(args)
+
+    try:
+        rows = read_csv_rows("data/input.csv", args.start, args.end)
+    except FileNotFoundError:
+        logger.info("data/input.csv not found")
+        return
+    logger.info("Processing rows %s to %s", args.start, args.end or "the end of the file")
+
+    metadata_cache = prompt_cache = None
+    if not args.no_cache:
+        metadata_cache = MetadataCache(extract_names.DEFAULT_CACHE_PATH)
+        prompt_cache = PromptCache(extract_brands.DEFAULT_CACHE_PATH, ttl=None)
+
+    prior = None
+    if args.incremental:
+        prior = PriorOutputs(args.prior_index)
+        for stage, path in [("names", extract_names.DEFAULT_OUTPUT_PATH), ("brands", extract_brands.DEFAULT_OUTPUT_PATH)]:
+            logger.info("Incremental run: indexed %s new rows from %s", prior.load(stage, path), path)
+
+    local = LocalFetcher() if args.local_fetch else None
+    scheduler = None
+    if args.max_per_host != 0:
+        scheduler = DomainScheduler.from_env() if args.max_per_host is None else DomainScheduler(args.max_per_host)
+
+    try:
+        run(
+            rows,
+            name_workers=args.name_workers,
+            brand_workers=args.brand_workers,
+            queue_size=args.queue_size,
+            names_csv=extract_names.DEFAULT_OUTPUT_PATH,
+            brands_csv=extract_brands.DEFAULT_OUTPUT_PATH,
+            metadata_cache=metadata_cache,
+            prompt_cache=prompt_cache,
+            use_alias_map=not args.no_alias_map,
+            use_url_rules=not args.no_url_rules,
+            collect=False,
+            dedupe=None if args.no_dedupe else UrlDeduper(),
+            scheduler=scheduler,
+            local=local,
+            prior=prior,
+        )
+    finally:
+        reporter.stop()
+
+    logger.info("Firecrawl limiter: %s", extraction.LIMITER.snapshot())
+    logger.info("OpenAI limiter: %s", llm_client.LIMITER.snapshot())
+    if local is not None:
+        logger.info("Local fetch: %s", local.stats())
+    if prior is not None:
+        for stage in ("names", "brands"):
+            stats = prior.stats(stage)
+            logger.info("Incremental %s: %s rows reused, %s recomputed", stage, stats["reused"], stats["recomputed"])
+        prior.close()
+
+    for name, cache in [("Metadata", metadata_cache), ("Prompt", prompt_cache)]:
+        if cache is not None:
+            stats = cache.stats()
+            logger.info(
+                "%s cache: %s hits, %s misses (%.1f%% hit rate)",
+                name,
+                stats["hits"],
+                stats["misses"],
+                stats["hit_rate"] * 100,
+            )
+            cache.close()
+
+    if args.totals:
+        # pandas and pyarrow are only needed for this step
+        from modules.aggregate import aggregate
+
+        totals, _ = aggregate(
+            "data/output/brands.csv",
+            "data/output/brand_totals.csv",
+            "data/output/brand_totals.parquet",
+            matcher=None if args.no_alias_map else default_matcher(),
+        )
+        logger.info("Wrote %s month/brand totals to data/output/brand_totals.csv", len(totals))
+
+if __name__ == "__main__":
+    main()
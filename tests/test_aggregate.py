@@ -0,0 +1,73 @@
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from modules.aggregate import aggregate, canonical_brand, read_brands
+from modules.brand_map import AliasMatcher, cleanup_brand_name
+
+MATCHER = AliasMatcher({"Arc'teryx": ["arcteryx"], "BEAMS": ["beams", "beams boy"]})
+
+
+def _write_brands(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["month", "url", "item_count", "item_name", "brand", "brand_error"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_read_brands_normalises_item_counts(tmp_path):
+    brands = tmp_path / "brands.csv"
+    counts = ["1,234", "", " 7 ", "n/a", "2.0"]
+    _write_brands(brands, [{"month": "2025-06-01", "url": f"u{i}", "item_count": c, "brand": "A"} for i, c in enumerate(counts)])
+
+    df = read_brands(str(brands))
+
+    assert df["item_count"].tolist() == [1234, 0, 7, 0, 2]
+    assert df["item_count"].dtype == "int64"
+
+
+def test_canonical_brand_matches_whole_aliases_only():
+    assert canonical_brand("arc-teryx", MATCHER) == "ARC'TERYX"
+    assert canonical_brand("arcteryx", MATCHER) == "ARC'TERYX"
+    assert canonical_brand("Beams_Boy", MATCHER) == "BEAMS"
+    assert canonical_brand("beams plus", MATCHER) == "BEAMS PLUS"
+    assert canonical_brand(" nike  ", None) == cleanup_brand_name(" nike  ") == "NIKE"
+
+
+def test_aggregate_sums_consolidated_brands_per_month(tmp_path):
+    brands = tmp_path / "brands.csv"
+    _write_brands(
+        brands,
+        [
+            {"month": "2025-06-01", "url": "u1", "item_count": "3", "brand": "arcteryx"},
+            {"month": "2025-06-01", "url": "u2", "item_count": "2", "brand": "ARC'TERYX"},
+            {"month": "2025-06-01", "url": "u3", "item_count": "10", "brand": "beams-boy"},
+            {"month": "2025-06-01", "url": "u4", "item_count": "7", "brand": "", "brand_error": "boom"},
+            {"month": "2025-05-01", "url": "u5", "item_count": "", "brand": "Beams"},
+        ],
+    )
+
+    totals, stats = aggregate(
+        str(brands),
+        str(tmp_path / "totals.csv"),
+        str(tmp_path / "totals.parquet"),
+        rows_parquet=str(tmp_path / "rows.parquet"),
+        matcher=MATCHER,
+    )
+
+    assert totals.to_dict("records") == [
+        {"month": "2025-05-01", "brand": "BEAMS", "item_count": 0, "rows": 1},
+        {"month": "2025-06-01", "brand": "BEAMS", "item_count": 10, "rows": 1},
+        {"month": "2025-06-01", "brand": "ARC'TERYX", "item_count": 5, "rows": 2},
+    ]
+    assert stats == {"rows": 5, "unbranded": 1, "spellings": 5, "brands": 2}
+    assert pd.read_csv(tmp_path / "totals.csv")["item_count"].tolist() == [0, 10, 5]
+    assert pd.read_parquet(tmp_path / "totals.parquet")["brand"].tolist() == ["BEAMS", "BEAMS", "ARC'TERYX"]
+    rows = pq.read_table(tmp_path / "rows.parquet").to_pydict()
+    assert rows["url"] == ["u1", "u2", "u3", "u4", "u5"]
+    assert [str(b) for b in rows["brand"]] == ["ARC'TERYX", "ARC'TERYX", "BEAMS", "", "BEAMS"]
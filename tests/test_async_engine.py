@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import asyncio
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import extract_brands as eb
+import extract_names as en
+import modules.async_engine as async_engine
+
+
+def test_bounded_map_limits_in_flight_and_keeps_order():
+    in_flight = 0
+    peak = 0
+
+    async def work(x):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01 * (5 - x % 5))
+        in_flight -= 1
+        return x * 2
+
+    results = asyncio.run(async_engine.bounded_map(work, range(20), concurrency=4))
+
+    assert results == [x * 2 for x in range(20)]
+    assert peak == 4
+
+
+def test_async_names_engine_matches_thread_output(monkeypatch, tmp_path):
+    async def fake_fetch(url, *args, **kwargs):
+        if "bad" in url:
+            raise RuntimeError("fail")
+        return {"og:title": f" Item {url[-1]} ", "og:image": "http://img.com/a.jpg?x=1"}
+
+    monkeypatch.setattr(async_engine, "afetch_metadata", fake_fetch)
+    rows = [
+        {"month": "2025-06-01", "url": "http://example.com/1", "item_count": "1"},
+        {"month": "2025-06-01", "url": "http://bad.com/2", "item_count": "1", "item_name": "Orig"},
+    ]
+    out_csv = tmp_path / "names.csv"
+
+    results = en.batch_process(rows, max_workers=10, final_csv=str(out_csv), engine="async")
+
+    assert results[0]["item_name"] == "Item 1"
+    assert results[0]["image_url"] == "http://img.com/a.jpg"
+    assert results[1]["item_name"] == "Orig"
+    assert results[1]["used_fallback"] is True
+    assert len(out_csv.read_text().splitlines()) == 3
+
+
+def test_aprompt_model_shares_identical_prompts(monkeypatch):
+    calls = []
+
+    class FakeResponses:
+        async def create(self, **kwargs):
+            calls.append(kwargs["input"])
+            await asyncio.sleep(0.01)
+            content = type("C", (), {"text": json.dumps({"name": "Acme"})})()
+            return type("R", (), {"output": [type("O", (), {"content": [content]})()]})()
+
+    fake_client = type("Client", (), {"responses": FakeResponses()})()
+    monkeypatch.setattr(async_engine, "_openai", lambda: fake_client)
+
+    async def main():
+        return await asyncio.gather(*(async_engine.aprompt_model("same") for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert results == [json.dumps({"name": "Acme"})] * 5
+    assert len(calls) == 1
+
+
+def test_async_brands_engine(monkeypatch):
+    async def fake_prompt(prompt, **kwargs):
+        return json.dumps({"name": "mega-brand"})
+
+    monkeypatch.setattr(eb, "aprompt_model", fake_prompt)
+    rows = [{"url": "http://example.com", "item_name": "Widget"}]
+
+    results = eb.batch_process(rows, max_workers=5, engine="async", use_alias_map=False)
+
+    assert results[0]["brand"] == "MEGA BRAND"
+
+
+def test_async_errors_chain_the_last_error_and_time_throttled_requests(monkeypatch):
+    import httpx
+    from modules import metrics
+    from modules.errors import classify
+    import modules.extraction as extraction
+    import modules.llm_client as llm_client
+
+    class FakeRateLimitError(Exception):
+        pass
+
+    request = httpx.Request("POST", "http://firecrawl.test/v1/scrape")
+
+    class FakeFirecrawl:
+        async def scrape_url(self, **kwargs):
+            response = httpx.Response(429, request=request)
+            raise httpx.HTTPStatusError("Too many requests, retry after 0s", request=request, response=response)
+
+    class FakeResponses:
+        async def create(self, **kwargs):
+            raise FakeRateLimitError("429")
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(extraction, "NEXT_ALLOWED_TIME", 0.0)
+    monkeypatch.setattr(llm_client, "RateLimitError", FakeRateLimitError)
+    monkeypatch.setattr(async_engine, "_firecrawl", lambda: FakeFirecrawl())
+    monkeypatch.setattr(async_engine, "_openai", lambda: type("Client", (), {"responses": FakeResponses()})())
+    monkeypatch.setattr(async_engine.asyncio, "sleep", no_sleep)
+    metrics.REGISTRY.reset()
+
+    with pytest.raises(RuntimeError) as scrape_error:
+        asyncio.run(async_engine.afetch_metadata("http://example.com", retries=1))
+    with pytest.raises(RuntimeError) as prompt_error:
+        asyncio.run(async_engine.aprompt_model("throttled", retries=1))
+
+    assert isinstance(scrape_error.value.__cause__, httpx.HTTPStatusError)
+    assert classify(scrape_error.value) == "throttled"
+    assert isinstance(prompt_error.value.__cause__, FakeRateLimitError)
+    histograms = metrics.REGISTRY.snapshot()["histograms"]
+    assert histograms["firecrawl_request_seconds"][0]["count"] == 2
+    assert histograms["openai_request_seconds"][0]["count"] == 2
+    assert metrics.REGISTRY.value("openai_throttled_total") == 2
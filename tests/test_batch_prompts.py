@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import extract_brands as eb
+from modules.prompting import build_batch_prompt, parse_batch_response
+
+
+def test_parse_batch_response_drops_malformed_entries():
+    raw = json.dumps(
+        [
+            {"index": 0, "name": "Acme"},
+            {"index": "1", "error": "no brand"},
+            {"index": 2},
+            {"index": 7, "name": "Out of range"},
+            "junk",
+        ]
+    )
+    entries = parse_batch_response(raw, 3)
+    assert set(entries) == {0, 1}
+    assert parse_batch_response("not json", 3) == {}
+
+
+def test_build_batch_prompt_numbers_items():
+    prompt = build_batch_prompt(["Red Shoe", "Blue Hat"])
+    assert '0: "Red Shoe"' in prompt
+    assert '1: "Blue Hat"' in prompt
+
+
+def test_batch_process_splits_response_and_falls_back(monkeypatch):
+    prompts = []
+
+    def fake_prompt(prompt, **kwargs):
+        prompts.append(prompt)
+        if prompt.startswith("Extract the brand name of each item"):
+            # The entry for item 1 is missing from the response
+            return json.dumps([{"index": 0, "name": "alpha-co"}, {"index": 2, "name": "gamma"}])
+        return json.dumps({"name": "beta"})
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    rows = [{"url": f"http://example.com/{i}", "item_name": f"Item {i}"} for i in range(3)]
+
+    results = eb.batch_process(rows, max_workers=1, batch_size=3, use_alias_map=False)
+
+    assert [r["brand"] for r in results] == ["ALPHA CO", "BETA", "GAMMA"]
+    assert len(prompts) == 2
+    assert '"Item 1"' in prompts[1]
+
+
+def test_failed_batch_request_retries_items_individually(monkeypatch):
+    def fake_prompt(prompt, **kwargs):
+        if prompt.startswith("Extract the brand name of each item"):
+            raise RuntimeError("timeout")
+        return json.dumps({"name": "solo"})
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    rows = [{"item_name": "A"}, {"item_name": "B"}, {"item_name": "C"}]
+
+    results = eb.batch_process(rows, max_workers=2, batch_size=2, use_alias_map=False)
+
+    assert [r["brand"] for r in results] == ["SOLO"] * 3
+
+
+def test_batch_error_entries_set_brand_error(monkeypatch):
+    prompts = []
+
+    def fake_prompt(prompt, **kwargs):
+        prompts.append(prompt)
+        return json.dumps([{"index": 0, "name": "acme"}, {"index": 1, "error": "no brand mentioned"}])
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    rows = [{"url": f"http://example.com/{i}", "item_name": f"Item {i}"} for i in range(2)]
+    stats = {}
+
+    results = eb.process_batch(rows, matcher=eb._NO_ALIASES, stats=stats)
+
+    assert [r["brand"] for r in results] == ["ACME", ""]
+    assert results[1]["brand_error"] == "no brand mentioned"
+    assert results[1]["error_kind"] == "permanent"
+    assert len(prompts) == 1
+    assert stats == {"rows": 2, "requests": 1, "fallbacks": 0}
@@ -0,0 +1,74 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+from bench import run_bench
+import modules.extraction as extraction
+import modules.llm_client as llm_client
+
+
+def test_bench_reports_both_stages():
+    app, client = extraction.get_app(), llm_client.get_client()
+    args = run_bench.build_parser().parse_args(
+        [
+            "--rows", "30",
+            "--workers", "4",
+            "--brand-workers", "4",
+            "--firecrawl-latency-ms", "0",
+            "--openai-latency-ms", "0",
+            "--error-rate", "0.2",
+            "--batch-size", "5",
+        ]
+    )
+
+    report = run_bench.run(args)
+
+    names, brands = report["stages"]["names"], report["stages"]["brands"]
+    assert names["rows"] == brands["rows"] == 30
+    assert names["requests"] == 30
+    assert names["errors"] > 0
+    # Scrapes go over HTTP through the pooled client and reuse its connections
+    assert 0 < names["connections_opened"] <= 4
+    assert brands["requests"] >= 6
+    assert set(names["latency_ms"]) == {"p50", "p95", "max"}
+    assert extraction.get_app() is app and llm_client.get_client() is client
+
+
+def test_fake_openai_answers_batch_prompts():
+    from bench.fake_services import FakeOpenAIServer, LatencyModel
+
+    with FakeOpenAIServer(LatencyModel(0)) as server:
+        answer = json.loads(server.answer('Extract the brand name of each item:\n0: "a"\n1: "b"'))
+    assert [entry["index"] for entry in answer] == [0, 1]
+
+
+def test_fake_firecrawl_serves_scrapes_and_429s_over_http(monkeypatch):
+    from bench.fake_services import FakeFirecrawlServer, LatencyModel
+    from modules.config import FirecrawlConfig
+    from modules.errors import classify
+    from modules.firecrawl_client import FirecrawlClient
+
+    monkeypatch.setattr(extraction, "NEXT_ALLOWED_TIME", 0.0)
+    with FakeFirecrawlServer(LatencyModel(0), retry_after=0) as server:
+        app = FirecrawlClient(FirecrawlConfig(api_key="bench", api_url=server.base_url))
+        original = extraction.FIRECRAWL.set(app)
+        try:
+            assert extraction.fetch_metadata("https://shop.example/item/7")["og:title"] == "Synthetic item 7"
+            server.rate_limit_rate = 1.0
+            with pytest.raises(RuntimeError) as error:
+                extraction.fetch_metadata("https://shop.example/item/8", retries=1)
+        finally:
+            extraction.FIRECRAWL.set(original)
+            app.close()
+
+    assert classify(error.value) == "throttled"
+    assert server.as_dict() == {"calls": 3, "throttled": 2, "errors": 0}
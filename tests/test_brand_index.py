@@ -0,0 +1,94 @@
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import pandas as pd
+
+from modules.aggregate import aggregate
+from modules.brand_index import BrandIndex, brand_key, edit_distance
+
+ALIASES = {"Arc'teryx": ["arcteryx"], "BEAMS": ["beams"], "A BATHING APE": ["bape"]}
+
+
+def test_keys_and_edit_distance():
+    assert brand_key("ARC'TERYX") == brand_key("Arc-teryx") == brand_key("ARC TERYX") == "arcteryx"
+    assert edit_distance("arcteryx", "arcterxy", 2) == 1
+    assert edit_distance("kitten", "sitting", 5) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2
+
+
+def test_spellings_map_to_canonical_brands_and_near_misses_are_flagged():
+    index = BrandIndex(ALIASES)
+
+    assert index.canonical("ARC'TERYX") == "ARC'TERYX"
+    assert index.canonical("ARC TERYX") == "ARC'TERYX"
+    assert index.match("ARC TERYX LEAF")[:2] == ("ARC'TERYX", "prefix")
+    assert index.match("ARCTERXY")[:2] == ("ARC'TERYX", "fuzzy")
+    assert index.match("A BATHNG APE")[:2] == ("A BATHING APE", "fuzzy")
+    assert index.canonical("BEAMSS") is None
+    assert index.canonical("UNKNOWN CO") is None
+    assert set(index.near_misses) == {"BEAMSS"}
+    assert index.near_misses["BEAMSS"].candidate == "BEAMS"
+
+
+def test_short_brands_do_not_capture_longer_names():
+    index = BrandIndex({"VIS": [], "GAP": [], "A.P.C.": ["apc"], "Champion": []})
+
+    assert index.canonical("VIS Cosmetics") is None
+    assert index.canonical("Gap Year Supply") is None
+    assert index.canonical("APC Power") is None
+    assert index.canonical("VIS") == "VIS"
+    assert index.match("Champion Reverse Weave")[:2] == ("CHAMPION", "prefix")
+
+
+def test_past_outputs_make_the_common_spelling_canonical():
+    index = BrandIndex({})
+    learned = index.add_counts({"MOUNTAIN HARDWEAR": 40, "MOUNTAIN HARDWARE": 3, "Mountain-Hardwear": 5})
+    assert learned == {"new": 1, "exact": 1, "fuzzy": 1}
+    assert index.canonical("mountain hardware") == "MOUNTAIN HARDWEAR"
+
+
+def test_lookups_take_under_a_millisecond():
+    rng = random.Random(0)
+    letters = string.ascii_uppercase
+    brands = [
+        " ".join("".join(rng.choice(letters) for _ in range(rng.randint(3, 8))) for _ in range(rng.randint(1, 3)))
+        for _ in range(5000)
+    ]
+    index = BrandIndex.from_file()
+    index.add_counts(dict.fromkeys(brands, 1))
+    typos = [b[:i] + rng.choice(letters) + b[i + 1 :] for b in brands[:1000] for i in [rng.randrange(len(b))]]
+
+    start = time.perf_counter()
+    matches = [index.match(name) for name in typos]
+    assert (time.perf_counter() - start) / len(typos) < 0.001
+    assert sum(m.candidate == b for m, b in zip(matches, brands)) > 900
+
+
+def test_aggregate_with_index_folds_variants_and_writes_review(tmp_path):
+    brands = tmp_path / "brands.csv"
+    pd.DataFrame(
+        {
+            "month": ["2025-06-01"] * 5,
+            "url": ["u1", "u2", "u3", "u4", "u5"],
+            "item_count": [3, 2, 4, 1, 6],
+            "brand": ["ARC TERYX LEAF", "arcterxy", "beamss", "Arc'teryx", "MIKE"],
+        }
+    ).to_csv(brands, index=False)
+
+    totals, stats = aggregate(
+        str(brands), index=BrandIndex({**ALIASES, "NIKE": []}), review_csv=str(tmp_path / "review.csv")
+    )
+
+    assert totals.to_dict("records") == [
+        {"month": "2025-06-01", "brand": "ARC'TERYX", "item_count": 6, "rows": 3},
+        {"month": "2025-06-01", "brand": "MIKE", "item_count": 6, "rows": 1},
+        {"month": "2025-06-01", "brand": "BEAMSS", "item_count": 4, "rows": 1},
+    ]
+    assert stats["review"] == 2
+    review = pd.read_csv(tmp_path / "review.csv").to_dict("records")
+    assert [(r["brand"], r["candidate"], r["rows"]) for r in review] == [("BEAMSS", "BEAMS", 1), ("MIKE", "NIKE", 1)]
@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import extract_brands as eb
+from modules.brand_map import AliasMatcher, default_matcher
+
+ALIASES = {
+    "Arc'teryx": ["arc'teryx", "arcteryx", "veilance"],
+    "A.P.C.": ["a.p.c.", "apc"],
+    "MUJI": ["無印良品"],
+    "Champion": ["champion"],
+}
+
+
+def test_matcher_resolves_aliases_in_text():
+    matcher = AliasMatcher(ALIASES)
+    assert matcher.resolve("ARC'TERYX Beta LT Jacket") == "Arc'teryx"
+    assert matcher.resolve("A.P.C.") == "A.P.C."
+    assert matcher.resolve("無印良品のタオル") == "MUJI"
+    assert matcher.resolve("Happy campers") is None
+
+
+def test_ambiguous_item_name_is_not_resolved_from_url():
+    matcher = AliasMatcher(ALIASES)
+    assert matcher.resolve_row("MUJI x Champion hoodie", "https://www.arcteryx.com/") is None
+    assert matcher.resolve_row("", "https://www.arcteryx.com/jp/item") == "Arc'teryx"
+    assert matcher.stats() == {"rows": 2, "resolved": 1, "share": 0.5}
+
+
+def test_short_aliases_and_url_paths_do_not_resolve_rows():
+    matcher = default_matcher()
+    assert matcher.resolve("A.P.C. Petit Standard") is None
+    assert matcher.resolve_row("Short sleeve T-shirt", "https://shop.example/dc/items") is None
+    assert matcher.resolve_row("Wireless mouse", "https://shop.example/mk/12") is None
+    assert matcher.resolve_row("Kids sneakers size Y 3", "") is None
+    assert matcher.resolve_row("Plain tee", "https://shop.example/vis/1") is None
+    assert matcher.resolve_row("Plain tee", "https://ete-shop.com/item") is None
+    assert matcher.resolve_row("GAP", "") == "GAP"
+    assert matcher.resolve_row("Logo hoodie", "https://shop.gap.co.jp/item/1") == "GAP"
+
+
+def test_process_row_skips_llm_for_known_alias(monkeypatch):
+    def fail_prompt(*args, **kwargs):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(eb, "prompt_model", fail_prompt)
+    row = {"url": "http://example.com", "item_name": "Veilance Monitor Coat"}
+
+    result = eb.process_row(row, matcher=AliasMatcher(ALIASES))
+
+    assert result["brand"] == "ARC'TERYX"
+    assert result["brand_error"] == ""
+
+
+def test_batch_process_without_alias_map_calls_llm(monkeypatch):
+    monkeypatch.setattr(eb, "prompt_model", lambda *a, **k: json.dumps({"name": "Other"}))
+    rows = [{"url": "http://example.com", "item_name": "Champion hoodie"}]
+
+    results = eb.batch_process(rows, max_workers=1, use_alias_map=False)
+
+    assert results[0]["brand"] == "OTHER"
+
+
+def test_default_matcher_loads_docs_map():
+    assert default_matcher().resolve("BAPE shark hoodie") == "A BATHING APE"
@@ -0,0 +1,126 @@
+import os
+import sys
+import csv
+import random
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from modules.csv_sink import CsvSink
+from modules.journal import RunJournal
+
+
+def _read(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_concurrent_writes_produce_one_header_and_every_row(tmp_path):
+    path = tmp_path / "out.csv"
+    sink = CsvSink(str(path), ["n"])
+
+    def producer(start):
+        for n in range(start, start + 250):
+            sink.write({"n": n})
+
+    threads = [threading.Thread(target=producer, args=(i * 250,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sink.close()
+
+    rows = _read(path)
+    assert sorted(int(r["n"]) for r in rows) == list(range(1000))
+    with open(path) as f:
+        assert f.read().count("n\n") == 1
+
+
+def test_ordered_sink_follows_sequence_numbers(tmp_path):
+    path = tmp_path / "out.csv"
+    seqs = list(range(50))
+    random.Random(0).shuffle(seqs)
+
+    with CsvSink(str(path), ["n"], ordered=True) as sink:
+        for seq in seqs:
+            sink.write([{"n": seq}] if seq % 7 else [], seq)
+
+    assert [int(r["n"]) for r in _read(path)] == [n for n in range(50) if n % 7]
+
+
+def test_appends_without_repeating_header(tmp_path):
+    path = tmp_path / "out.csv"
+    with CsvSink(str(path), ["n"]) as sink:
+        sink.write({"n": 1})
+    with CsvSink(str(path), ["n"]) as sink:
+        sink.write({"n": 2})
+
+    assert [r["n"] for r in _read(path)] == ["1", "2"]
+
+
+def test_rows_are_flushed_on_interval(tmp_path):
+    path = tmp_path / "out.csv"
+    sink = CsvSink(str(path), ["n"], flush_interval=0.05)
+    sink.write({"n": 1})
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and not (path.exists() and _read(path)):
+        time.sleep(0.02)
+    assert _read(path) == [{"n": "1"}]
+    sink.close()
+
+
+def test_writer_error_is_raised_on_close(tmp_path):
+    sink = CsvSink(str(tmp_path / "out.csv"), ["n"])
+    sink.write({"unexpected": 1})
+    with pytest.raises(ValueError):
+        sink.close()
+
+
+def test_resume_truncates_rows_written_after_anchor(tmp_path):
+    out = tmp_path / "out.csv"
+    journal_path = str(tmp_path / "run.journal.jsonl")
+    with CsvSink(str(out), ["n"]) as sink:
+        sink.write({"n": 0})
+
+    journal = RunJournal(journal_path, sync_every=1)
+    journal.anchor_output(str(out))
+    with CsvSink(str(out), ["n"]) as sink:
+        sink.write({"n": 1})
+    journal.close()  # crash before the rows were journaled
+
+    resumed = RunJournal(journal_path)
+    resumed.anchor_output(str(out))
+
+    assert [r["n"] for r in _read(out)] == ["0"]
+
+
+def test_deferred_positions_do_not_hold_later_rows(tmp_path):
+    path = tmp_path / "out.csv"
+    sink = CsvSink(str(path), ["n"], ordered=True, flush_interval=0.05)
+    sink.write({"n": 0}, 0)
+    sink.defer(1)
+    for seq in range(2, 5):
+        sink.write({"n": seq}, seq)
+    deadline = time.monotonic() + 2
+    while time.monotonic() < deadline and sink.rows_written < 4:
+        time.sleep(0.02)
+    assert sink.rows_written == 4
+
+    sink.write({"n": 1}, 1)
+    sink.close()
+
+    assert [int(r["n"]) for r in _read(path)] == [0, 2, 3, 4, 1]
+
+
+def test_deferred_rows_written_before_the_file_reaches_them_keep_their_place(tmp_path):
+    path = tmp_path / "out.csv"
+    with CsvSink(str(path), ["n"], ordered=True) as sink:
+        sink.defer(2)
+        sink.write({"n": 2}, 2)
+        sink.write({"n": 1}, 1)
+        sink.write({"n": 0}, 0)
+
+    assert [int(r["n"]) for r in _read(path)] == [0, 1, 2]
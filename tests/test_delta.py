@@ -0,0 +1,129 @@
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import extract_brands as eb
+import modules.extraction as extraction
+from modules import metrics
+from modules.delta import PriorOutputs
+from modules.domain_scheduler import DomainScheduler
+
+
+def _write(path, fieldnames, rows, mode="w"):
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        if mode == "w":
+            writer.writeheader()
+        writer.writerows(rows)
+
+
+def _names_row(url, name, error="", image_url="", used_fallback=False):
+    return {
+        "month": "2024-01",
+        "url": url,
+        "item_count": "1",
+        "image_url": image_url,
+        "item_name": name,
+        "error": error,
+        "used_fallback": used_fallback,
+    }
+
+
+def test_names_carried_forward_and_failures_recomputed(tmp_path, monkeypatch):
+    metrics.REGISTRY.reset()
+    names_csv = tmp_path / "item_names.csv"
+    _write(
+        names_csv,
+        extraction.ITEM_FIELDNAMES,
+        [
+            _names_row("https://shop.example/a?utm_source=x", "Jacket", image_url="https://cdn.example/a.jpg"),
+            _names_row("https://shop.example/b", "old name", error="Access Denied for URL"),
+            _names_row("https://shop.example/c", "Boots", used_fallback=True),
+        ],
+    )
+    prior = PriorOutputs(str(tmp_path / "prior.sqlite"))
+    # The fallback row kept its input name, so only the first row is usable
+    assert prior.load("names", str(names_csv)) == 1
+
+    calls = []
+    monkeypatch.setattr(extraction, "extract_item_data", lambda url: calls.append(url) or ("Fresh", ""))
+    urls = ["https://shop.example/a?utm_source=x", "https://shop.example/b", "https://shop.example/c", "https://shop.example/d"]
+    rows = [{"month": "2024-02", "url": url, "item_count": "5", "item_name": "input"} for url in urls]
+
+    results = extraction.batch_extract(rows, max_workers=2, scheduler=DomainScheduler(1), prior=prior)
+
+    assert sorted(calls) == ["https://shop.example/b", "https://shop.example/c", "https://shop.example/d"]
+    by_url = {r["url"]: r for r in results}
+    assert by_url["https://shop.example/a?utm_source=x"]["image_url"] == "https://cdn.example/a.jpg"
+    assert by_url["https://shop.example/a?utm_source=x"]["month"] == "2024-02"
+    assert by_url["https://shop.example/a?utm_source=x"]["used_fallback"] is False
+    assert by_url["https://shop.example/c"]["item_name"] == "Fresh"
+    assert by_url["https://shop.example/b"]["item_name"] == "Fresh"
+    assert prior.stats("names") == {"reused": 1, "recomputed": 3, "reuse_rate": 0.25}
+    assert metrics.REGISTRY.value("delta_rows_total", stage="names", outcome="reused") == 1
+
+
+def test_load_only_reads_appended_rows(tmp_path):
+    names_csv = tmp_path / "item_names.csv"
+    _write(names_csv, extraction.ITEM_FIELDNAMES, [_names_row("https://shop.example/a", "Jacket")])
+    prior = PriorOutputs(str(tmp_path / "prior.sqlite"))
+    assert prior.load("names", str(names_csv)) == 1
+    assert prior.load("names", str(names_csv)) == 0
+
+    _write(names_csv, extraction.ITEM_FIELDNAMES, [_names_row("https://shop.example/a", "Jacket v2")], mode="a")
+    assert prior.load("names", str(names_csv)) == 1
+    assert prior.get("names", {"url": "https://shop.example/a"})["item_name"] == "Jacket v2"
+
+
+def test_load_resumes_after_the_last_complete_line(tmp_path):
+    names_csv = tmp_path / "item_names.csv"
+    _write(names_csv, extraction.ITEM_FIELDNAMES, [_names_row("https://shop.example/a", "Veste décontractée – ジャケット")])
+    with open(names_csv, "a", encoding="utf-8") as f:
+        f.write("2024-01,https://shop.example/b,1,,Bott")  # a row still being written
+    prior = PriorOutputs(str(tmp_path / "prior.sqlite"))
+    assert prior.load("names", str(names_csv)) == 1
+
+    with open(names_csv, "a", encoding="utf-8", newline="") as f:
+        f.write("es été,,False\r\n")
+    assert prior.load("names", str(names_csv)) == 1
+    assert prior.get("names", {"url": "https://shop.example/b"})["item_name"] == "Bottes été"
+    assert prior.get("names", {"url": "https://shop.example/a"})["item_name"].endswith("ジャケット")
+    assert prior.load("names", str(names_csv)) == 0
+
+
+def test_brands_reused_only_for_unchanged_item_names(tmp_path, monkeypatch):
+    brands_csv = tmp_path / "brands.csv"
+    _write(
+        brands_csv,
+        eb.FIELDNAMES,
+        [
+            {"url": "https://shop.example/a", "item_name": "Beta Jacket", "brand": "ARC'TERYX", "brand_error": ""},
+            {"url": "https://shop.example/b", "item_name": "Boots", "brand": "", "brand_error": "timeout"},
+        ],
+    )
+    prior = PriorOutputs(str(tmp_path / "prior.sqlite"))
+    prior.load("brands", str(brands_csv))
+
+    prompts = []
+    monkeypatch.setattr(eb, "prompt_model", lambda prompt, **kw: prompts.append(prompt) or '{"name": "acme"}')
+    rows = [
+        {"url": "https://shop.example/a", "item_name": "Beta Jacket", "image_url": "https://cdn.example/a.jpg"},
+        {"url": "https://shop.example/a", "item_name": "Beta Jacket 2025"},
+        {"url": "https://shop.example/b", "item_name": "Boots"},
+    ]
+
+    results = eb.batch_process(rows, 2, use_alias_map=False, use_url_rules=False, ordered=True, prior=prior)
+
+    assert [r["brand"] for r in results] == ["ARC'TERYX", "ACME", "ACME"]
+    assert results[0]["image_url"] == "https://cdn.example/a.jpg"
+    assert len(prompts) == 2
+    assert prior.stats("brands")["reused"] == 1
+
+    batched = PriorOutputs(str(tmp_path / "prior.sqlite"))
+    results = eb.batch_process(rows, 1, use_alias_map=False, use_url_rules=False, batch_size=3, prior=batched)
+    assert [r["brand"] for r in results][0] == "ARC'TERYX"
+    assert batched.stats("brands") == {"reused": 1, "recomputed": 2, "reuse_rate": 1 / 3}
@@ -0,0 +1,158 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules.domain_scheduler import DomainScheduler
+from modules.errors import RetryPolicy
+from modules.hedging import Hedger
+from modules.journal import RunJournal, row_key
+
+
+def _rows(spec):
+    return [{"url": f"https://{host}/item/{i}", "item_name": "orig"} for host, n in spec for i in range(n)]
+
+
+def test_schedule_interleaves_hosts_round_robin():
+    scheduler = DomainScheduler(max_per_host=10)
+    rows = _rows([("big.com", 4), ("small.com", 2), ("tiny.com", 1)])
+
+    hosts = [DomainScheduler.host(r) for r in scheduler.schedule(rows)]
+
+    assert hosts[:3] == ["big.com", "small.com", "tiny.com"]
+    assert Counter(hosts) == {"big.com": 4, "small.com": 2, "tiny.com": 1}
+
+
+def test_batch_extract_caps_requests_per_host(monkeypatch):
+    in_flight = Counter()
+    peak = Counter()
+    lock = threading.Lock()
+
+    def fake_extract(url, cache=None):
+        host = url.split("/")[2]
+        with lock:
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+        time.sleep(0.02)
+        with lock:
+            in_flight[host] -= 1
+        return "Name", ""
+
+    monkeypatch.setattr(extraction, "extract_item_data", fake_extract)
+    rows = _rows([("big.com", 20), ("other.com", 5)])
+
+    results = extraction.batch_extract(rows, max_workers=8, scheduler=DomainScheduler(max_per_host=2))
+
+    assert len(results) == 25
+    assert peak["big.com"] == 2
+    assert peak["other.com"] <= 2
+
+
+def test_failing_host_backs_off_while_others_continue(monkeypatch):
+    started = []
+
+    def fake_extract(url, cache=None):
+        started.append((url.split("/")[2], time.monotonic()))
+        time.sleep(0.01)
+        if "denied.com" in url:
+            raise ValueError(f"Access Denied for URL: {url}")
+        return "Name", ""
+
+    monkeypatch.setattr(extraction, "extract_item_data", fake_extract)
+    rows = _rows([("denied.com", 4), ("ok.com", 8)])
+    scheduler = DomainScheduler(max_per_host=1, failure_threshold=2, backoff=0.3)
+
+    results = extraction.batch_extract(rows, max_workers=2, scheduler=scheduler)
+
+    assert len(results) == 12
+    denied = [t for host, t in started if host == "denied.com"]
+    ok = [t for host, t in started if host == "ok.com"]
+    # The third denied.com request waits out the backoff; ok.com does not
+    assert denied[2] - denied[1] >= 0.25
+    assert max(ok) < denied[2]
+    assert scheduler.snapshot()["denied.com"]["backoffs"] >= 1
+
+
+def test_journaled_rows_pass_through_scheduler(monkeypatch, tmp_path):
+    monkeypatch.setattr(extraction, "extract_item_data", lambda url, cache=None: ("Name", ""))
+    rows = _rows([("a.com", 5)])
+    journal = RunJournal(str(tmp_path / "run.journal.jsonl"))
+    for row in rows[:3]:
+        journal.record(row_key(row), {"url": row["url"], "item_name": "journaled"})
+    scheduler = DomainScheduler(max_per_host=1)
+
+    results = extraction.batch_extract(rows, max_workers=2, journal=journal, scheduler=scheduler)
+
+    assert sorted(r["item_name"] for r in results) == ["Name", "Name", "journaled", "journaled", "journaled"]
+    assert scheduler.snapshot()["a.com"]["done"] == 2
+
+
+def _peak_tracker():
+    in_flight, peak, lock = Counter(), Counter(), threading.Lock()
+
+    def track(host, seconds):
+        with lock:
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+        time.sleep(seconds)
+        with lock:
+            in_flight[host] -= 1
+
+    return track, peak
+
+
+def test_retried_rows_keep_the_per_host_cap(monkeypatch):
+    track, peak = _peak_tracker()
+    attempts = Counter()
+
+    def fake_extract(url, cache=None):
+        attempts[url] += 1
+        if attempts[url] == 1:
+            raise RuntimeError("Firecrawl API failed") from TimeoutError()
+        track("retry", 0.02)
+        return "Name", ""
+
+    monkeypatch.setattr(extraction, "extract_item_data", fake_extract)
+    rows = _rows([("flaky.com", 12)])
+    scheduler = DomainScheduler(max_per_host=2, backoff=0.01, max_backoff=0.02)
+
+    results = extraction.batch_extract(
+        rows, max_workers=8, scheduler=scheduler, retry=RetryPolicy(rounds=1, base_delay=0.001)
+    )
+
+    assert [r["error"] for r in results] == [""] * 12
+    assert peak["retry"] == 2
+
+
+def test_straggler_resends_keep_the_per_host_cap(monkeypatch):
+    monkeypatch.setattr(extraction, "HEDGER", Hedger("Firecrawl"))
+    track, peak = _peak_tracker()
+    attempts = Counter()
+    lock = threading.Lock()
+
+    def fake_scrape(url, timeout):
+        with lock:
+            attempts[url] += 1
+            first = attempts[url] == 1
+        if first:
+            time.sleep(0.2)
+        else:
+            track("resend", 0.02)
+        return type("Resp", (), {"metadata": {"title": "Item"}})()
+
+    monkeypatch.setattr(extraction, "_scrape", fake_scrape)
+    rows = _rows([("slow.com", 8)])
+    # The missed deadlines back the host off, which the resends wait out
+    scheduler = DomainScheduler(max_per_host=2, backoff=0.01, max_backoff=0.02)
+
+    results = extraction.batch_extract(rows, max_workers=8, scheduler=scheduler, deadline=0.05)
+
+    assert len(results) == 8
+    assert sum(attempts.values()) == 16
+    assert peak["resend"] == 2
@@ -0,0 +1,157 @@
+import csv
+import os
+import sys
+
+import httpx
+import pytest
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import extract_brands as eb
+import modules.extraction as extraction
+from modules import metrics
+from modules.dedupe import UrlDeduper
+from modules.errors import AccessDeniedError, RetryPolicy, classify
+
+
+def _http_error(status):
+    return requests.exceptions.HTTPError(f"HTTP {status}", response=type("R", (), {"status_code": status})())
+
+
+def _wrapped(error):
+    try:
+        raise error
+    except Exception as e:
+        try:
+            raise RuntimeError("Firecrawl API failed") from e
+        except RuntimeError as outer:
+            return outer
+
+
+@pytest.mark.parametrize(
+    "error, kind",
+    [
+        (_http_error(429), "throttled"),
+        (_http_error(503), "transient"),
+        (_http_error(404), "permanent"),
+        (_wrapped(httpx.ReadTimeout("timed out")), "transient"),
+        (_wrapped(TimeoutError()), "transient"),
+        (AccessDeniedError(), "access_denied"),
+        (ValueError("No valid item name found"), "permanent"),
+        (RuntimeError("OpenAI API error: boom"), "permanent"),
+    ],
+)
+def test_classify(error, kind):
+    assert classify(error) == kind
+
+
+def test_transient_failures_are_retried_at_the_end_and_the_rest_dead_lettered(tmp_path, monkeypatch):
+    metrics.REGISTRY.reset()
+    attempts = {}
+
+    def fake_extract(url):
+        key = url.split("?")[0]
+        attempts[key] = attempts.get(key, 0) + 1
+        if key.endswith("/flaky") and attempts[key] < 3:
+            raise RuntimeError("Firecrawl API failed") from TimeoutError()
+        if url.endswith("/down"):
+            raise _http_error(502)
+        if url.endswith("/denied"):
+            raise AccessDeniedError()
+        if url.endswith("/gone"):
+            raise _http_error(404)
+        return "Name", ""
+
+    monkeypatch.setattr(extraction, "extract_item_data", fake_extract)
+    urls = [f"https://shop.example/{p}" for p in ("flaky", "down", "ok", "denied", "gone", "flaky?utm_source=x")]
+    # Only /gone has an input name to fall back on
+    rows = [
+        {"month": "2024-01", "url": url, "item_count": "1", "item_name": "input" if url.endswith("/gone") else ""}
+        for url in urls
+    ]
+    out, dead = tmp_path / "names.csv", tmp_path / "dead.csv"
+
+    results = extraction.batch_extract(
+        rows,
+        max_workers=2,
+        final_csv=str(out),
+        fieldnames=extraction.ITEM_FIELDNAMES,
+        dedupe=UrlDeduper(),
+        retry=RetryPolicy(rounds=2, base_delay=0.01),
+        dead_letter=str(dead),
+    )
+
+    by_url = {r["url"]: r for r in results}
+    assert by_url["https://shop.example/flaky"]["error"] == ""
+    assert by_url["https://shop.example/flaky?utm_source=x"]["error"] == ""
+    assert attempts["https://shop.example/flaky"] >= 3
+    assert attempts["https://shop.example/down"] == 3
+    assert attempts["https://shop.example/gone"] == 1
+    assert by_url["https://shop.example/denied"]["error"] == "Access Denied"
+
+    with open(out, newline="") as f:
+        written = list(csv.DictReader(f))
+    assert len(written) == 6
+    assert "error_kind" not in written[0]
+    with open(dead, newline="") as f:
+        dead_rows = {r["url"]: r for r in csv.DictReader(f)}
+    assert {url: r["error_kind"] for url, r in dead_rows.items()} == {
+        "https://shop.example/down": "transient",
+        "https://shop.example/denied": "access_denied",
+    }
+    assert dead_rows["https://shop.example/down"]["error"].endswith("HTTP 502")
+    assert by_url["https://shop.example/gone"]["item_name"] == "input"
+    assert metrics.REGISTRY.value("dead_letter_total", stage="names", kind="transient") == 1
+
+
+def test_dead_letter_file_is_only_created_for_failed_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction, "extract_item_data", lambda url: ("Name", ""))
+    dead = tmp_path / "dead.csv"
+    dead.write_text("url\nhttps://shop.example/stale\n")
+
+    extraction.batch_extract([{"url": "https://shop.example/a"}], max_workers=1, dead_letter=str(dead))
+
+    assert not dead.exists()
+
+
+def test_dead_brand_rows_keep_both_errors(tmp_path, monkeypatch):
+    def fake_prompt(prompt, **kwargs):
+        raise RuntimeError("OpenAI API error: boom")
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    dead = tmp_path / "dead.csv"
+    rows = [
+        {"url": "https://shop.example/a", "item_name": "Anvil", "error": "Access Denied", "used_fallback": "True"},
+    ]
+
+    eb.batch_process(rows, 1, use_alias_map=False, use_url_rules=False, dead_letter=str(dead))
+
+    with open(dead, newline="") as f:
+        (row,) = csv.DictReader(f)
+    assert row["error"] == "Access Denied"
+    assert row["brand_error"] == "OpenAI API error: boom"
+    assert row["error_kind"] == "permanent"
+
+
+def test_brand_timeouts_are_retried(monkeypatch):
+    calls = []
+
+    def fake_prompt(prompt, **kwargs):
+        calls.append(prompt)
+        if len(calls) == 1:
+            raise RuntimeError("OpenAI API error") from TimeoutError()
+        return '{"name": "acme"}'
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    rows = [{"url": "https://shop.example/a", "item_name": "Anvil"}]
+
+    results = eb.batch_process(
+        rows, 1, use_alias_map=False, use_url_rules=False, retry=RetryPolicy(rounds=1, base_delay=0.01)
+    )
+
+    assert len(calls) == 2
+    assert results[0]["brand"] == "ACME"
+    assert results[0]["brand_error"] == ""
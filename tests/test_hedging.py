@@ -0,0 +1,126 @@
+import csv
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules import metrics
+from modules.dedupe import UrlDeduper
+from modules.hedging import DeadlineExceeded, HedgeBudget, Hedger, row_deadline
+
+
+def _warm(hedger, seconds=0.01, count=20):
+    for _ in range(count):
+        hedger.latency.add(seconds)
+
+
+def test_slow_request_is_hedged_and_first_answer_wins():
+    hedger = Hedger("Test", budget=HedgeBudget(1.0), min_delay=0.05)
+    _warm(hedger)
+    calls = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            calls.append(1)
+            first = len(calls) == 1
+        time.sleep(1.0 if first else 0.01)
+        return "first" if first else "hedge"
+
+    start = time.monotonic()
+    assert hedger.call(request) == "hedge"
+    assert time.monotonic() - start < 0.5
+    assert hedger.snapshot()["hedged"] == 1
+    assert hedger.snapshot()["hedge_wins"] == 1
+
+
+def test_budget_limits_hedges():
+    hedger = Hedger("Test", budget=HedgeBudget(0.1), min_delay=0.01)
+    _warm(hedger, 0.001, count=400)
+    for _ in range(15):
+        hedger.call(lambda: time.sleep(0.05))
+    assert hedger.snapshot()["hedged"] == 1
+
+
+def test_deadline_abandons_request():
+    hedger = Hedger("Test")
+    with row_deadline(0.1) as deadline:
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            hedger.call(lambda: time.sleep(1.0))
+        assert time.monotonic() - start < 0.5
+        assert deadline.missed
+    with row_deadline(None):
+        assert hedger.call(lambda: "direct") == "direct"
+
+
+def test_stragglers_are_retried_after_other_rows(monkeypatch, tmp_path):
+    metrics.REGISTRY.reset()
+    hedger = Hedger("Firecrawl")
+    monkeypatch.setattr(extraction, "HEDGER", hedger)
+    attempts = {}
+
+    def fake_scrape(url, timeout):
+        attempts[url] = attempts.get(url, 0) + 1
+        if url.endswith("slow") and attempts[url] == 1:
+            time.sleep(1.0)
+        return type("Resp", (), {"metadata": {"title": f"Item {url[-4:]}"}})()
+
+    monkeypatch.setattr(extraction, "_scrape", fake_scrape)
+    rows = [{"url": f"http://shop.example/{name}"} for name in ("slow", "aaaa", "bbbb", "cccc")]
+    out = tmp_path / "names.csv"
+
+    results = extraction.batch_extract(
+        rows, max_workers=2, final_csv=str(out), deadline=0.2, dedupe=UrlDeduper()
+    )
+
+    assert [r["item_name"] for r in results] == ["Item slow", "Item aaaa", "Item bbbb", "Item cccc"]
+    assert attempts["http://shop.example/slow"] == 2
+    with open(out, newline="", encoding="utf-8") as f:
+        written = [r["url"] for r in csv.DictReader(f)]
+    assert written[-1] == "http://shop.example/slow"
+    assert len(written) == 4
+    assert metrics.REGISTRY.value("stragglers_total", stage="names") == 1
+
+
+def test_no_hedge_while_the_pool_is_full():
+    hedger = Hedger("Test", budget=HedgeBudget(1.0), min_delay=0.01, max_threads=1)
+    _warm(hedger, 0.001)
+    calls = []
+
+    assert hedger.call(lambda: calls.append(1) or time.sleep(0.1) or "done") == "done"
+    assert len(calls) == 1
+    assert hedger.snapshot()["hedged"] == 0
+
+
+def test_straggler_resends_are_charged_to_the_budget(monkeypatch):
+    metrics.REGISTRY.reset()
+    budget = HedgeBudget(0.5, burst=1.0)
+    hedger = Hedger("Firecrawl", budget=budget, min_delay=10.0)
+    monkeypatch.setattr(extraction, "HEDGER", hedger)
+    attempts = {}
+
+    def fake_scrape(url, timeout):
+        attempts[url] = attempts.get(url, 0) + 1
+        if attempts[url] == 1:
+            time.sleep(0.5)
+        return type("Resp", (), {"metadata": {"title": "Item"}})()
+
+    monkeypatch.setattr(extraction, "_scrape", fake_scrape)
+    rows = [{"url": f"http://shop.example/{name}"} for name in ("slow1", "slow2")]
+
+    extraction.batch_extract(rows, max_workers=2, deadline=0.1)
+
+    assert metrics.REGISTRY.value("resent_requests_total", api="firecrawl") == 2
+    # Two requests earned one token and the two resends spent two, so the
+    # debt has to be earned back before the next hedge
+    budget.earn()
+    budget.earn()
+    assert not budget.take()
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules import metrics
+from modules.config import PoolConfig
+from modules.html_meta import HeadParser, LocalFetcher, is_product_page
+
+RELEASE = threading.Event()
+
+PAGES = {
+    "/jacket": (
+        200,
+        "text/html; charset=utf-8",
+        '<html><head><title>Shop</title><meta property="og:title" content="Beta AR Jacket &amp; Hood">'
+        '<meta property="og:image" content="https://cdn.example/jacket.jpg?w=800"></head>',
+    ),
+    "/latin": (
+        200,
+        "text/html",
+        '<html><head><meta charset="iso-8859-1"><title>Café Mug</title>'
+        '<meta property="og:site_name" content="Mug Shop"></head><body></body></html>',
+    ),
+    "/home": (
+        200,
+        "text/html",
+        '<html><head><title>Mug Shop</title><meta property="og:site_name" content="Mug Shop"></head></html>',
+    ),
+    "/bare": (200, "text/html", "<html><head><title>Mug Shop | Online Store</title></head></html>"),
+    "/denied": (200, "text/html", "<html><head><title>Access Denied</title></head><body></body></html>"),
+    "/forbidden": (403, "text/html", "<html><head><title>Nice Shoes</title></head></html>"),
+    "/json": (200, "application/json", '{"title": "Not HTML"}'),
+}
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        status, content_type, head = PAGES[self.path]
+        charset = "iso-8859-1" if "iso-8859-1" in head else "utf-8"
+        data = head.encode(charset)
+        body = b"<body>" + b"x" * 100_000 + b"</body></html>"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data) + len(body)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.wfile.flush()
+        if self.path == "/jacket":
+            # The body only arrives once the test is over, by which time the client has hung up
+            RELEASE.wait(5)
+            self.close_connection = True
+        try:
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    RELEASE.clear()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _PageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    RELEASE.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _fetcher():
+    return LocalFetcher(PoolConfig(max_connections=4, max_keepalive=4, http2=False), timeout=2.0)
+
+
+def test_head_parser_stops_at_body():
+    parser = HeadParser()
+    parser.feed('<head><meta name="twitter:title" content=" Boots "><title>A\n  B</title></head>')
+    parser.feed('<body><meta property="og:title" content="Ignored"></body>')
+    assert parser.done
+    assert parser.meta == {"twitter:title": "Boots", "title": "A B"}
+
+
+def test_fetch_reads_only_the_head(server):
+    metrics.REGISTRY.reset()
+    fetcher = _fetcher()
+
+    start = time.monotonic()
+    meta = fetcher.fetch(f"{server}/jacket")
+
+    assert time.monotonic() - start < 2.0
+    assert meta["og:title"] == "Beta AR Jacket & Hood"
+    assert extraction.parse_image_url(meta) == "https://cdn.example/jacket.jpg"
+    assert fetcher.fetch(f"{server}/latin")["title"] == "Café Mug"
+    assert metrics.REGISTRY.value("local_fetch_total", outcome="hit") == 2
+
+
+@pytest.mark.parametrize("path", ["/denied", "/forbidden", "/json", "/home", "/bare"])
+def test_unusable_pages_escalate_to_firecrawl(server, monkeypatch, path):
+    calls = []
+
+    def fake_fetch_metadata(url):
+        calls.append(url)
+        return {"title": "Firecrawl Title"}
+
+    monkeypatch.setattr(extraction, "fetch_metadata", fake_fetch_metadata)
+    fetcher = _fetcher()
+
+    assert fetcher.fetch(f"{server}{path}") is None
+    assert extraction.extract_item_data(f"{server}{path}", local=fetcher) == ("Firecrawl Title", None)
+    assert len(calls) == 1
+    assert fetcher.stats()["hits"] == 0
+
+
+def test_is_product_page():
+    assert is_product_page({"og:title": "Boots"})
+    assert is_product_page({"title": "Shop", "product:price:amount": "10"})
+    assert is_product_page({"title": "Boots", "og:site_name": "Shop"})
+    assert not is_product_page({"title": "shop", "og:site_name": "Shop"})
+    assert not is_product_page({"title": "Boots"})
+
+
+def test_local_hit_skips_firecrawl(server, monkeypatch):
+    monkeypatch.setattr(extraction, "fetch_metadata", lambda url: pytest.fail("Firecrawl was called"))
+    data = extraction.extract_item_data(f"{server}/jacket", local=_fetcher())
+    assert data == ("Beta AR Jacket & Hood", "https://cdn.example/jacket.jpg")
+
+
+def test_afetch(server):
+    fetcher = _fetcher()
+
+    async def main():
+        return await asyncio.gather(fetcher.afetch(f"{server}/latin"), fetcher.afetch(f"{server}/denied"))
+
+    latin, denied = asyncio.run(main())
+    assert latin["title"] == "Café Mug"
+    assert denied is None
+    assert fetcher.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import modules.extraction as extraction
+from modules import metrics
+from modules.errors import THROTTLED, classify
+from modules.config import FirecrawlConfig, PoolConfig
+from modules.firecrawl_client import AsyncFirecrawlClient, FirecrawlClient
+
+
+class _ScrapeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body["url"].endswith("/busy"):
+            status, payload = 429, {"error": "Rate limit exceeded. Please retry after 7s"}
+        else:
+            status, payload = 200, {"success": True, "data": {"metadata": {"title": body["url"]}}}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _ScrapeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_connections_are_reused_and_pool_wait_recorded(server):
+    metrics.REGISTRY.reset()
+    config = FirecrawlConfig(api_key="k", api_url=server, pool=PoolConfig(max_connections=2, max_keepalive=2))
+    client = FirecrawlClient(config)
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda i: client.scrape_url(f"http://shop.example/{i}"), range(40)))
+    client.close()
+
+    assert [r.metadata["title"] for r in results] == [f"http://shop.example/{i}" for i in range(40)]
+    assert metrics.REGISTRY.value("http_connections_opened_total", client="firecrawl") <= 2
+    wait = metrics.REGISTRY.snapshot()["histograms"]["http_pool_wait_seconds"]
+    assert sum(h["count"] for h in wait) == 40
+
+
+def test_errors_are_httpx_status_errors_classify_recognises(server, monkeypatch):
+    config = FirecrawlConfig(api_key="k", api_url=server)
+    client = FirecrawlClient(config)
+    with pytest.raises(httpx.HTTPStatusError) as exc:
+        client.scrape_url("http://shop.example/busy")
+    assert exc.value.response.status_code == 429
+    assert "retry after 7s" in str(exc.value)
+    assert classify(exc.value) == THROTTLED
+
+    client.close()
+
+    monkeypatch.setattr(extraction.FIRECRAWL, "_config", config)
+    monkeypatch.setattr(extraction.FIRECRAWL, "_client", None)
+    assert extraction.fetch_metadata("http://shop.example/a") == {"title": "http://shop.example/a"}
+
+
+def test_async_client_shares_its_pool(server):
+    metrics.REGISTRY.reset()
+    config = FirecrawlConfig(api_key="k", api_url=server, pool=PoolConfig(max_connections=2))
+
+    async def main():
+        client = AsyncFirecrawlClient(config)
+        try:
+            return await asyncio.gather(*(client.scrape_url(f"http://shop.example/{i}") for i in range(20)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(main())
+
+    assert [r.metadata["title"] for r in results] == [f"http://shop.example/{i}" for i in range(20)]
+    assert metrics.REGISTRY.value("http_connections_opened_total", client="firecrawl") <= 2
+
+
+def test_async_errors_carry_the_status(server):
+    config = FirecrawlConfig(api_key="k", api_url=server)
+
+    async def main():
+        client = AsyncFirecrawlClient(config)
+        try:
+            await client.scrape_url("http://shop.example/busy")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError) as exc:
+        asyncio.run(main())
+    assert exc.value.response.status_code == 429
+    assert classify(exc.value) == THROTTLED
+
+
+def test_sdk_module_is_left_alone():
+    import firecrawl.v1.client as sdk
+    import requests
+
+    assert sdk.requests is requests
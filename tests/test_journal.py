@@ -0,0 +1,117 @@
+import os
+import sys
+import csv
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules.journal import RunJournal, row_key
+
+
+def test_journal_survives_reopen_and_ignores_torn_line(tmp_path):
+    path = tmp_path / "run.journal.jsonl"
+    journal = RunJournal(str(path), sync_every=1)
+    journal.record("a", {"value": 1})
+    journal.close()
+    with open(path, "a") as f:
+        f.write('{"key": "b", "res')
+
+    reopened = RunJournal(str(path))
+
+    assert reopened.resumed == 1
+    assert reopened.get("a") == {"value": 1}
+    assert reopened.get("b") is None
+
+
+def test_restarted_run_skips_completed_rows(tmp_path):
+    journal_path = str(tmp_path / "run.journal.jsonl")
+    out_csv = tmp_path / "out.csv"
+    tmp_dir = tmp_path / "tmp"
+    calls = []
+
+    def crashing_worker(x):
+        if x == 3:
+            raise RuntimeError("crash")
+        calls.append(x)
+        return {"value": x}
+
+    with pytest.raises(RuntimeError):
+        extraction._thread_map(
+            crashing_worker,
+            [1, 2, 3],
+            max_workers=1,
+            fieldnames=["value"],
+            final_csv=str(out_csv),
+            tmp_dir=str(tmp_dir),
+            journal=RunJournal(journal_path),
+        )
+    assert calls == [1, 2]
+
+    calls.clear()
+    journal = RunJournal(journal_path)
+    results = extraction._thread_map(
+        lambda x: calls.append(x) or {"value": x},
+        [1, 2, 3],
+        max_workers=2,
+        fieldnames=["value"],
+        final_csv=str(out_csv),
+        tmp_dir=str(tmp_dir),
+        journal=journal,
+    )
+    journal.discard()
+
+    assert calls == [3]
+    assert [r["value"] for r in results] == [1, 2, 3]
+    with open(out_csv, newline="") as f:
+        assert sorted(int(r["value"]) for r in csv.DictReader(f)) == [1, 2, 3]
+    assert not os.path.exists(journal_path)
+
+
+def test_batch_rows_resume_with_a_different_chunk_size(tmp_path):
+    journal_path = str(tmp_path / "run.journal.jsonl")
+    out_csv = tmp_path / "out.csv"
+    rows = [{"value": i} for i in range(5)]
+    calls = []
+
+    def crashing_batch(chunk):
+        if any(row["value"] == 4 for row in chunk):
+            raise RuntimeError("crash")
+        calls.append([row["value"] for row in chunk])
+        return [{"value": row["value"] * 10} for row in chunk]
+
+    with pytest.raises(RuntimeError):
+        extraction._thread_map(
+            crashing_batch,
+            [rows[0:2], rows[2:4], rows[4:]],
+            max_workers=1,
+            fieldnames=["value"],
+            final_csv=str(out_csv),
+            journal=RunJournal(journal_path),
+        )
+    assert calls == [[0, 1], [2, 3]]
+
+    calls.clear()
+    journal = RunJournal(journal_path)
+    results = extraction._thread_map(
+        lambda chunk: calls.append([row["value"] for row in chunk]) or [{"value": row["value"] * 10} for row in chunk],
+        [rows[0:3], rows[3:]],
+        max_workers=1,
+        fieldnames=["value"],
+        final_csv=str(out_csv),
+        journal=journal,
+    )
+    journal.close()
+
+    assert calls == [[4]]
+    assert [r["value"] for r in results] == [0, 10, 20, 30, 40]
+    with open(out_csv, newline="") as f:
+        assert sorted(int(r["value"]) for r in csv.DictReader(f)) == [0, 10, 20, 30, 40]
+
+
+def test_row_key_is_order_independent():
+    assert row_key({"a": 1, "b": 2}) == row_key({"b": 2, "a": 1})
+    assert row_key({"a": 1}) != row_key({"a": 2})
@@ -0,0 +1,53 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from modules.config import FirecrawlConfig, LazyClient, OpenAIConfig
+
+
+def test_parsing_imports_without_credentials_or_sdks():
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("FIRECRAWL_", "AZURE_OPENAI_"))}
+    code = (
+        "import sys, extract_brands\n"
+        "from modules.extraction import parse_metadata\n"
+        "assert parse_metadata({'title': 'x'}) == 'x'\n"
+        "assert extract_brands.cleanup_brand_name('a-b') == 'A B'\n"
+        "assert 'openai' not in sys.modules and 'firecrawl' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+def test_missing_configuration_is_reported_on_first_use(monkeypatch):
+    monkeypatch.setattr("modules.config._ENV_LOADED", True)
+    monkeypatch.delenv("FIRECRAWL_API_KEY", raising=False)
+    monkeypatch.delenv("AZURE_OPENAI_ENDPOINT", raising=False)
+    with pytest.raises(EnvironmentError):
+        FirecrawlConfig.from_env()
+    with pytest.raises(EnvironmentError):
+        OpenAIConfig.from_env()
+
+
+def test_lazy_client_is_built_once_per_process():
+    built = []
+    client = LazyClient(lambda config: built.append(config) or object(), lambda: "env-config")
+
+    first = client.get()
+    assert client.get() is first
+    assert built == ["env-config"]
+
+    client._pid = -1  # as seen from a forked worker
+    assert client.get() is not first
+    assert len(built) == 2
+
+
+def test_explicit_config_overrides_environment():
+    client = LazyClient(lambda config: config, lambda: "env-config")
+    config = OpenAIConfig(api_key="k", endpoint="https://example.com", deployment="d")
+    client.configure(config)
+    assert client.get() is config
+    assert config.base_url == "https://example.com/openai/v1/"
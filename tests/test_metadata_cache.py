@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+import modules.cache as cache_module
+from modules.cache import MetadataCache
+from modules.urls import normalize_url
+
+
+def test_normalize_url_ignores_trivial_differences():
+    assert normalize_url("HTTPS://Example.com:443/item/?b=2&a=1#top") == normalize_url(
+        "https://example.com/item?a=1&b=2"
+    )
+
+
+def test_batch_extract_uses_cache(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_fetch(url, *args, **kwargs):
+        calls.append(url)
+        return {"og:title": "Cached Item", "og:image": "http://img.com/a.jpg?w=1"}
+
+    monkeypatch.setattr(extraction, "fetch_metadata", fake_fetch)
+    cache = MetadataCache(str(tmp_path / "meta.sqlite"))
+    rows = [
+        {"month": "2025-06-01", "url": "http://example.com/item", "item_count": "1"},
+        {"month": "2025-06-01", "url": "http://example.com/item/", "item_count": "2"},
+    ]
+
+    extraction.batch_extract(rows[:1], max_workers=1, cache=cache)
+    results = extraction.batch_extract(rows[1:], max_workers=1, cache=cache)
+
+    assert len(calls) == 1
+    assert results[0]["item_name"] == "Cached Item"
+    assert results[0]["image_url"] == "http://img.com/a.jpg"
+    assert cache.stats()["hits"] == 1
+
+
+def test_access_denied_metadata_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(extraction, "fetch_metadata", lambda *a, **k: {"title": "Access Denied"})
+    cache = MetadataCache(str(tmp_path / "meta.sqlite"))
+
+    extraction.batch_extract([{"url": "http://example.com"}], max_workers=1, cache=cache)
+
+    assert cache.stats()["writes"] == 0
+
+
+def test_expired_and_refreshed_entries_are_misses(monkeypatch, tmp_path):
+    cache = MetadataCache(str(tmp_path / "meta.sqlite"), ttl=60)
+    cache.set("http://example.com", {"title": "Old"})
+    assert cache.get("http://example.com") == {"title": "Old"}
+
+    later = time.time() + 120
+    monkeypatch.setattr(cache_module.time, "time", lambda: later)
+    assert cache.get("http://example.com") is None
+
+    cache.refresh = True
+    assert cache.get("http://example.com") is None
+
+
+def test_async_engine_reads_and_writes_the_cache_off_the_event_loop(monkeypatch, tmp_path):
+    import asyncio
+    import threading
+
+    import modules.async_engine as async_engine
+
+    threads = []
+
+    class RecordingCache(MetadataCache):
+        def get(self, raw):
+            threads.append(threading.get_ident())
+            return super().get(raw)
+
+        def set(self, raw, value):
+            threads.append(threading.get_ident())
+            super().set(raw, value)
+
+    async def fake_fetch(url, *args, **kwargs):
+        return {"og:title": "Cached Item"}
+
+    monkeypatch.setattr(async_engine, "afetch_metadata", fake_fetch)
+    cache = RecordingCache(str(tmp_path / "meta.sqlite"))
+
+    async def main():
+        first = await async_engine.aextract_item_data("http://example.com/a", cache)
+        second = await async_engine.aextract_item_data("http://example.com/a", cache)
+        return threading.get_ident(), first, second
+
+    loop_thread, first, second = asyncio.run(main())
+
+    assert first == second == ("Cached Item", None)
+    assert cache.hits == 1 and cache.writes == 1
+    assert len(threads) == 3 and loop_thread not in threads
@@ -0,0 +1,94 @@
+import os
+import sys
+import io
+import json
+import logging
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules import metrics
+from modules.cache import MetadataCache
+from modules.metrics import REGISTRY, Registry, Reporter
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    REGISTRY.reset()
+    yield
+    REGISTRY.reset()
+
+
+def test_prometheus_text_has_counters_gauges_and_histograms():
+    registry = Registry(buckets=(0.1, 1.0, float("inf")))
+    registry.inc("rows_total", stage="names", status="ok")
+    registry.inc("rows_total", 2, stage="names", status="ok")
+    registry.set("queue_depth", 3, queue="handoff")
+    registry.observe("row_seconds", 0.05, stage="names")
+    registry.observe("row_seconds", 0.5, stage="names")
+
+    text = registry.to_prometheus()
+
+    assert "# TYPE rows_total counter" in text
+    assert 'rows_total{stage="names",status="ok"} 3' in text
+    assert 'queue_depth{queue="handoff"} 3' in text
+    assert 'row_seconds_bucket{stage="names",le="0.1"} 1' in text
+    assert 'row_seconds_bucket{stage="names",le="+Inf"} 2' in text
+    assert 'row_seconds_count{stage="names"} 2' in text
+
+
+def test_span_records_histogram_and_logs_only_when_enabled(caplog):
+    with metrics.span("row", {"stage": "names"}, item="http://example.com"):
+        pass
+    assert not caplog.records
+
+    with caplog.at_level(logging.DEBUG, logger="modules.metrics"):
+        with metrics.span("row", {"stage": "names"}, item="http://example.com"):
+            pass
+    assert "http://example.com" in caplog.text
+    hist = REGISTRY.snapshot()["histograms"]["row_seconds"][0]
+    assert hist["labels"] == {"stage": "names"}
+    assert hist["count"] == 2
+
+
+def test_reporter_exports_json_prometheus_and_progress(tmp_path):
+    REGISTRY.inc("rows_total", 4, stage="names", status="ok")
+    REGISTRY.inc("rows_total", 1, stage="names", status="error")
+    stream = io.StringIO()
+    reporter = Reporter(
+        json_path=str(tmp_path / "metrics.jsonl"),
+        prom_path=str(tmp_path / "metrics.prom"),
+        progress=True,
+        stream=stream,
+    )
+
+    reporter.stop()
+
+    snapshot = json.loads((tmp_path / "metrics.jsonl").read_text().splitlines()[-1])
+    assert sum(entry["value"] for entry in snapshot["counters"]["rows_total"]) == 5
+    assert 'rows_total{stage="names",status="error"} 1' in (tmp_path / "metrics.prom").read_text()
+    assert "names: 5 rows" in stream.getvalue()
+    assert "1 errors" in stream.getvalue()
+
+
+def test_batch_extract_records_requests_rows_and_cache(monkeypatch, tmp_path):
+    class Resp:
+        def __init__(self, url):
+            self.metadata = {"title": "Item"} if "good" in url else {"title": "Access Denied"}
+
+    monkeypatch.setattr(extraction.APP, "scrape_url", lambda url, **kwargs: Resp(url))
+    cache = MetadataCache(str(tmp_path / "cache.sqlite"))
+    rows = [{"url": "http://good.com/1"}, {"url": "http://good.com/1"}, {"url": "http://bad.com/2"}]
+
+    extraction.batch_extract(rows, max_workers=1, cache=cache)
+
+    assert REGISTRY.value("rows_total", stage="names", status="ok") == 2
+    assert REGISTRY.value("rows_total", stage="names", status="error") == 1
+    assert REGISTRY.value("firecrawl_requests_total", outcome="ok") == 2
+    assert REGISTRY.value("cache_lookups_total", cache="metadata", result="hit") == 1
+    assert REGISTRY.value("rows_in_flight", stage="names") == 0
+    cache.close()
@@ -0,0 +1,67 @@
+import os
+import sys
+import csv
+import json
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import extract_brands as eb
+import modules.extraction as extraction
+import run_pipeline
+from modules.pipeline import run_two_stage
+
+
+def test_second_stage_starts_before_first_finishes():
+    events = []
+    lock = threading.Lock()
+
+    def first(x):
+        time.sleep(0.02 * x)
+        with lock:
+            events.append(("first", x))
+        return {"value": x}
+
+    def second(row):
+        with lock:
+            events.append(("second", row["value"]))
+        return row
+
+    first_results, second_results = run_two_stage(
+        range(5), first, second, first_workers=1, second_workers=1, queue_size=1
+    )
+
+    assert len(first_results) == len(second_results) == 5
+    # The brand stage saw row 0 before the name stage finished row 4
+    assert events.index(("second", 0)) < events.index(("first", 4))
+
+
+def test_pipeline_writes_both_csvs(monkeypatch, tmp_path):
+    monkeypatch.setattr(extraction, "fetch_metadata", lambda *a, **k: {"og:title": "Widget"})
+    monkeypatch.setattr(eb, "prompt_model", lambda *a, **k: json.dumps({"name": "acme"}))
+    rows = [{"month": "2025-06-01", "url": f"http://example.com/{i}", "item_count": "1"} for i in range(4)]
+    names_csv = tmp_path / "item_names.csv"
+    brands_csv = tmp_path / "brands.csv"
+
+    run_pipeline.run(
+        rows,
+        name_workers=2,
+        brand_workers=2,
+        queue_size=2,
+        names_csv=str(names_csv),
+        brands_csv=str(brands_csv),
+        use_alias_map=False,
+    )
+
+    with open(names_csv, newline="") as f:
+        names = list(csv.DictReader(f))
+    with open(brands_csv, newline="") as f:
+        brands = list(csv.DictReader(f))
+    assert len(names) == len(brands) == 4
+    assert {b["brand"] for b in brands} == {"ACME"}
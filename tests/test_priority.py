@@ -0,0 +1,67 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import extract_brands as eb
+import modules.extraction as extraction
+from modules import metrics
+from modules.priority import by_weight, coverage, item_count_weight
+
+
+def test_rows_come_out_heaviest_first_with_stable_ties():
+    rows = [
+        {"url": "a", "item_count": "3"},
+        {"url": "b", "item_count": "1,200"},
+        {"url": "c", "item_count": ""},
+        {"url": "d", "item_count": "3"},
+        {"url": "e", "item_count": "n/a"},
+    ]
+    assert [r["url"] for r in by_weight(rows)] == ["b", "a", "d", "c", "e"]
+    assert [r["url"] for r in by_weight(rows, lambda r: -item_count_weight(r))][:2] == ["c", "e"]
+
+
+def test_batch_extract_scrapes_heaviest_rows_first_and_reports_coverage(monkeypatch):
+    metrics.REGISTRY.reset()
+    calls = []
+
+    def fake_extract(url):
+        calls.append(url)
+        if url.endswith("/broken"):
+            raise ValueError("Access Denied for URL")
+        return "Name", ""
+
+    monkeypatch.setattr(extraction, "extract_item_data", fake_extract)
+    rows = [
+        {"url": "https://shop.example/small", "item_count": "1"},
+        {"url": "https://shop.example/broken", "item_count": "10"},
+        {"url": "https://shop.example/big", "item_count": "89"},
+    ]
+
+    extraction.batch_extract(rows, max_workers=1, priority=item_count_weight)
+
+    assert calls == ["https://shop.example/big", "https://shop.example/broken", "https://shop.example/small"]
+    assert coverage("names") == 0.9
+    line = metrics.Reporter(stream=io.StringIO()).progress_line()
+    assert "90.0% of weight" in line
+
+
+def test_brand_batches_follow_priority(monkeypatch):
+    metrics.REGISTRY.reset()
+    prompts = []
+
+    def fake_prompt(prompt, **kwargs):
+        prompts.append(prompt)
+        return '{"name": "acme"}'
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    rows = [{"url": f"https://shop.example/{n}", "item_name": f"Item {n}", "item_count": n} for n in ("2", "7", "5")]
+
+    results = eb.batch_process(rows, 1, use_alias_map=False, use_url_rules=False, ordered=True, priority=item_count_weight)
+
+    assert [r["item_count"] for r in results] == ["7", "5", "2"]
+    assert "Item 7" in prompts[0]
+    assert coverage("brands") == 1.0
@@ -0,0 +1,70 @@
+import csv
+import json
+import os
+import sys
+from functools import partial
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import reprocess_brands
+from modules import metrics
+from modules.cache import MetadataCache, PromptCache, prompt_key
+from modules.process_pool import process_map
+from modules.prompting import build_prompt
+
+
+def _square(offset, item):
+    return {"n": item, "square": item * item + offset}
+
+
+def test_process_map_returns_rows_in_input_order(tmp_path):
+    metrics.REGISTRY.reset()
+    out = tmp_path / "out.csv"
+
+    results = process_map(
+        partial(_square, 1),
+        range(25),
+        2,
+        chunk_size=4,
+        fieldnames=["n", "square"],
+        final_csv=str(out),
+        ordered=True,
+        stage="squares",
+    )
+
+    assert [r["n"] for r in results] == list(range(25))
+    assert results[3]["square"] == 10
+    with open(out, newline="", encoding="utf-8") as f:
+        assert [int(r["n"]) for r in csv.DictReader(f)] == list(range(25))
+    assert metrics.REGISTRY.value("rows_total", stage="squares", status="ok") == 25
+
+
+def test_reprocess_row_uses_only_cached_data(tmp_path):
+    meta_path = str(tmp_path / "meta.sqlite")
+    prompt_path = str(tmp_path / "prompts.sqlite")
+    meta = MetadataCache(meta_path)
+    meta.set("http://shop.example/item/1", {"og:title": "Zebra Jacket"})
+    meta.set("http://shop.example/item/2", {"og:title": "Mystery Coat"})
+    meta.close()
+    prompts = PromptCache(prompt_path)
+    prompts.set(prompt_key(build_prompt("Zebra Jacket"), "dep"), json.dumps({"name": "zebra-co"}))
+    prompts.close()
+
+    reprocess_brands.init_worker(meta_path, prompt_path, "dep", use_alias_map=False, use_url_rules=False)
+    rows = [
+        {"month": "2025-06-01", "url": "http://shop.example/item/1", "item_count": "3"},
+        {"month": "2025-06-01", "url": "http://shop.example/item/2", "item_count": "1"},
+        {"month": "2025-06-01", "url": "http://shop.example/item/3", "item_count": "1"},
+    ]
+    first, second, third = [reprocess_brands.reprocess_row(r) for r in rows]
+
+    assert first["item_name"] == "Zebra Jacket"
+    assert first["brand"] == "ZEBRA CO"
+    assert second["brand_error"] == "No cached LLM response"
+    assert third["item_name"] == ""
+    assert third["brand_error"] == "No cached LLM response"
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import extract_brands as eb
+import modules.llm_client as llm_client
+from modules.cache import PromptCache, SingleFlight, prompt_key
+
+
+def _response(text):
+    content = type("C", (), {"text": text})()
+    output = type("O", (), {"content": [content]})()
+    return type("R", (), {"output": [output]})()
+
+
+def test_prompt_model_returns_cached_response(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_create(*args, **kwargs):
+        calls.append(kwargs["input"])
+        return _response(json.dumps({"name": "Acme"}))
+
+    monkeypatch.setattr(llm_client._client.responses, "create", fake_create)
+    cache = PromptCache(str(tmp_path / "prompts.sqlite"))
+
+    first = llm_client.prompt_model("hi", cache=cache)
+    second = llm_client.prompt_model("hi", cache=cache)
+
+    assert first == second == json.dumps({"name": "Acme"})
+    assert len(calls) == 1
+
+
+def test_prompt_key_depends_on_deployment():
+    assert prompt_key("hi", "a") != prompt_key("hi", "b")
+
+
+def test_invalid_json_is_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setattr(llm_client._client.responses, "create", lambda *a, **k: _response("oops"))
+    cache = PromptCache(str(tmp_path / "prompts.sqlite"))
+
+    llm_client.prompt_model("hi", cache=cache)
+
+    assert cache.stats()["writes"] == 0
+
+
+def test_single_flight_shares_concurrent_calls():
+    flight = SingleFlight()
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(True)
+        started.set()
+        time.sleep(0.1)
+        return "done"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(3)]
+    for t in followers:
+        t.start()
+    for t in [leader, *followers]:
+        t.join()
+
+    assert results == ["done"] * 4
+    assert len(calls) == 1
+    assert flight.shared == 3
+
+
+def test_batch_process_passes_cache(monkeypatch, tmp_path):
+    seen = []
+
+    def fake_prompt(prompt, **kwargs):
+        seen.append(kwargs.get("cache"))
+        return json.dumps({"name": "Acme"})
+
+    monkeypatch.setattr(eb, "prompt_model", fake_prompt)
+    cache = PromptCache(str(tmp_path / "prompts.sqlite"))
+
+    eb.batch_process([{"item_name": "Widget"}], max_workers=1, cache=cache)
+
+    assert seen == [cache]
@@ -0,0 +1,151 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import requests
+
+import modules.extraction as extraction
+import modules.llm_client as llm_client
+from modules.rate_limit import AdaptiveConcurrency, RateLimiter, TokenBucket
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    bucket = TokenBucket(per_minute=120)  # 2 per second, burst of 2
+    waits = [bucket.reserve() for _ in range(4)]
+    assert waits[0] == 0 and waits[1] == 0
+    assert waits[2] == pytest.approx(0.5, abs=0.05)
+    assert waits[3] == pytest.approx(1.0, abs=0.05)
+
+
+def test_aimd_halves_on_throttle_and_grows_back():
+    conc = AdaptiveConcurrency(maximum=8, cooldown=0)
+    conc.on_throttle()
+    assert int(conc.limit) == 4
+    for _ in range(40):
+        conc.on_success()
+    assert int(conc.limit) == 8
+
+
+def test_concurrency_limit_blocks_extra_requests():
+    limiter = RateLimiter("test", max_concurrency=2)
+    in_flight = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal in_flight, peak
+        with limiter.slot():
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            time.sleep(0.02)
+            with lock:
+                in_flight -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak == 2
+
+
+def test_fetch_metadata_reports_throttle_to_limiter(monkeypatch):
+    limiter = RateLimiter("Firecrawl", max_concurrency=4)
+    monkeypatch.setattr(extraction, "LIMITER", limiter)
+    monkeypatch.setattr(extraction, "NEXT_ALLOWED_TIME", 0.0)
+    monkeypatch.setattr(extraction.time, "sleep", lambda s: None)
+
+    def fake_scrape_url(*args, **kwargs):
+        resp = type("R", (), {"status_code": 429})()
+        raise requests.exceptions.HTTPError(response=resp)
+
+    monkeypatch.setattr(extraction.APP, "scrape_url", fake_scrape_url)
+    with pytest.raises(RuntimeError):
+        extraction.fetch_metadata("http://example.com", retries=0)
+
+    state = limiter.snapshot()
+    assert state["throttles"] == 1
+    assert state["concurrency_limit"] == 2
+    assert state["backing_off"] is True
+    assert state["in_flight"] == 0
+
+
+def test_unconfigured_limiter_never_waits():
+    limiter = RateLimiter("noop")
+    start = time.monotonic()
+    for _ in range(100):
+        with limiter.slot(tokens=1000):
+            pass
+    assert time.monotonic() - start < 0.5
+    assert limiter.snapshot()["requests_last_minute"] == 100
+
+
+def test_throttle_pauses_every_caller_of_the_limiter():
+    limiter = RateLimiter("test")
+    limiter.on_throttle(0.2)
+    started = []
+
+    def work():
+        with limiter.slot():
+            started.append(time.monotonic())
+
+    begin = time.monotonic()
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(t - begin >= 0.15 for t in started)
+    assert limiter.snapshot()["throttles"] == 1
+
+
+def test_openai_429_pauses_the_shared_limiter(monkeypatch):
+    class FakeRateLimitError(Exception):
+        def __init__(self):
+            super().__init__("429")
+            self.response = type("R", (), {"headers": {"retry-after": "30"}})()
+
+    def fake_create(*args, **kwargs):
+        raise FakeRateLimitError()
+
+    limiter = RateLimiter("OpenAI")
+    sleeps = []
+    monkeypatch.setattr(llm_client, "LIMITER", limiter)
+    monkeypatch.setattr(llm_client, "RateLimitError", FakeRateLimitError)
+    monkeypatch.setattr(llm_client._client.responses, "create", fake_create)
+    monkeypatch.setattr(llm_client.time, "sleep", lambda s: sleeps.append(s))
+
+    with pytest.raises(RuntimeError):
+        llm_client.prompt_model("throttled", retries=0)
+    assert sleeps == []
+    assert limiter.paused_for() == pytest.approx(30, abs=1)
+
+    # Any other thread now waits out the pause before its request
+    limiter.acquire()
+    limiter.release()
+    assert sleeps and sleeps[0] == pytest.approx(30, abs=1)
+
+
+def test_default_concurrency_caps_at_workers_unless_configured():
+    limiter = RateLimiter("test")
+    limiter.default_concurrency(8)
+    limiter.on_throttle()
+    assert limiter.snapshot()["concurrency_limit"] == 4
+    limiter.default_concurrency(6)
+    assert limiter.snapshot()["concurrency_max"] == 6
+    assert limiter.snapshot()["concurrency_limit"] == 6
+
+    configured = RateLimiter("test", max_concurrency=2)
+    configured.default_concurrency(8)
+    assert configured.snapshot()["concurrency_max"] == 2
@@ -0,0 +1,93 @@
+import os
+import sys
+import csv
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules.async_engine import bounded_map
+from modules.csv_source import chunked, read_csv_rows
+
+
+def _write_input(path, count):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["n"])
+        writer.writeheader()
+        for n in range(count):
+            writer.writerow({"n": n})
+
+
+def test_read_csv_rows_applies_start_and_end(tmp_path):
+    path = tmp_path / "input.csv"
+    _write_input(path, 10)
+
+    rows = read_csv_rows(str(path), start=3, end=5)
+
+    assert not isinstance(rows, list)
+    assert [r["n"] for r in rows] == ["2", "3", "4"]
+
+
+def test_chunked_splits_lazily():
+    assert list(chunked(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+class _Tracker:
+    """Count how far the consumer reads ahead of completed work."""
+
+    def __init__(self, count):
+        self.count = count
+        self.read = 0
+        self.done = 0
+        self.max_ahead = 0
+        self.lock = threading.Lock()
+
+    def rows(self):
+        for n in range(self.count):
+            with self.lock:
+                self.read += 1
+                self.max_ahead = max(self.max_ahead, self.read - self.done)
+            yield {"n": n}
+
+    def finish(self, row):
+        with self.lock:
+            self.done += 1
+        return {"n": row["n"]}
+
+
+def test_thread_map_bounds_submissions_and_streams_to_csv(tmp_path):
+    tracker = _Tracker(500)
+    out = tmp_path / "out.csv"
+
+    def fn(row):
+        return tracker.finish(row)
+
+    results = extraction._thread_map(
+        fn, tracker.rows(), 2, fieldnames=["n"], final_csv=str(out), collect=False
+    )
+
+    assert results == []
+    assert tracker.max_ahead <= 2 * 4 + 1
+    with open(out, newline="") as f:
+        assert sorted(int(r["n"]) for r in csv.DictReader(f)) == list(range(500))
+
+
+def test_thread_map_collects_in_input_order():
+    results = extraction._thread_map(lambda n: {"n": n}, iter(range(50)), 4, window=3)
+    assert [r["n"] for r in results] == list(range(50))
+
+
+def test_bounded_map_bounds_tasks():
+    tracker = _Tracker(300)
+
+    async def fn(row):
+        await asyncio.sleep(0)
+        return tracker.finish(row)
+
+    results = asyncio.run(bounded_map(fn, tracker.rows(), 5))
+
+    assert [r["n"] for r in results] == list(range(300))
+    assert tracker.max_ahead <= 5 * 2 + 1
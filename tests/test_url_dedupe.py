@@ -0,0 +1,84 @@
+import os
+import sys
+import asyncio
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+
+import modules.extraction as extraction
+from modules.async_engine import async_batch_extract
+from modules.dedupe import UrlDeduper
+from modules.urls import UrlCanonicalizer, default_canonicalizer
+
+
+def test_canonical_url_drops_tracking_hosts_and_fragments():
+    canon = default_canonicalizer()
+    key = canon("https://example.com/item/1?color=red")
+    assert canon("https://WWW.example.com/item/1/?utm_source=x&color=red#reviews") == key
+    assert canon("https://m.example.com/item/1?gclid=abc&color=red") == key
+    assert canon("https://example.com/item/1?color=blue") != key
+
+
+def test_host_rules_keep_only_listed_params():
+    canon = UrlCanonicalizer({"hosts": {"shop.jp": {"keep": ["id"]}, "other.jp": {"drop": ["sid"]}}})
+    assert canon("https://www.shop.jp/p?id=5&variant=2&x=1") == "https://shop.jp/p?id=5"
+    assert canon("https://sub.shop.jp/p?variant=2") == "https://sub.shop.jp/p"
+    assert canon("https://other.jp/p?sid=1&id=2") == "https://other.jp/p?id=2"
+
+
+def test_batch_extract_scrapes_each_canonical_url_once(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake_extract(url, cache=None):
+        with lock:
+            calls.append(url)
+        time.sleep(0.05)
+        if "bad" in url:
+            raise ValueError("Access Denied for URL: " + url)
+        return "Name", "http://img.com/a.jpg"
+
+    monkeypatch.setattr(extraction, "extract_item_data", fake_extract)
+    rows = [
+        {"url": "https://example.com/a?utm_source=mail", "item_name": "x"},
+        {"url": "https://www.example.com/a", "item_name": "x"},
+        {"url": "https://example.com/a#top", "item_name": "x"},
+        {"url": "https://bad.com/b", "item_name": "fallback"},
+        {"url": "https://bad.com/b?fbclid=1", "item_name": "fallback"},
+    ]
+    dedupe = UrlDeduper()
+
+    results = extraction.batch_extract(rows, max_workers=5, dedupe=dedupe)
+
+    assert sorted(calls) == ["https://bad.com/b", "https://example.com/a?utm_source=mail"]
+    assert [r["url"] for r in results] == [r["url"] for r in rows]
+    assert [r["item_name"] for r in results] == ["Name"] * 3 + ["fallback"] * 2
+    assert all("Access Denied" in r["error"] for r in results[3:])
+    stats = dedupe.stats()
+    assert stats["rows"] == 5
+    assert stats["unique"] == 2
+    assert stats["dedupe_ratio"] == pytest.approx(0.6)
+
+
+def test_async_engine_dedupes(monkeypatch):
+    import modules.async_engine as async_engine
+
+    calls = []
+
+    async def fake_extract(url, cache=None):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return "Name", ""
+
+    monkeypatch.setattr(async_engine, "aextract_item_data", fake_extract)
+    rows = [{"url": "https://example.com/a"}, {"url": "https://m.example.com/a?utm_medium=x"}]
+
+    results = asyncio.run(async_batch_extract(rows, 10, dedupe=UrlDeduper()))
+
+    assert calls == ["https://example.com/a"]
+    assert [r["item_name"] for r in results] == ["Name", "Name"]
@@ -0,0 +1,95 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+os.environ.setdefault("FIRECRAWL_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT", "https://example.com/")
+os.environ.setdefault("AZURE_OPENAI_DEPLOYMENT", "test")
+
+import extract_brands as eb
+import modules.extraction as extraction
+from modules.brand_map import AliasMatcher
+from modules.url_rules import UrlRules, compile_path, learn_rules
+
+ALIASES = {
+    "Arc'teryx": ["arc'teryx", "arcteryx"],
+    "BEAMS": ["beams"],
+    "Champion": ["champion"],
+}
+RULES = [
+    {"host": "arcteryx.com", "brand": "Arc'teryx"},
+    {"host": "mall.jp", "path": "/shop/{brand}"},
+    {"host": "market.jp", "pattern": r"^/b/(?P<brand>[a-z-]+)/", "literal": True},
+]
+
+
+def test_rules_resolve_hosts_templates_and_patterns():
+    rules = UrlRules(RULES, AliasMatcher(ALIASES))
+
+    assert rules.match("https://www.arcteryx.com/jp/en/shop/beta") == "Arc'teryx"
+    assert rules.match("https://shop.arcteryx.com/item") == "Arc'teryx"
+    assert rules.match("https://mall.jp/shop/beams/goods/1/") == "BEAMS"
+    assert rules.match("https://mall.jp/shop/unknown/goods/1/") is None
+    assert rules.match("https://mall.jp/goods/beams/") is None
+    assert rules.match("https://market.jp/b/new-brand/123") == "new brand"
+    assert rules.match("https://example.com/beams") is None
+    assert rules.stats() == {"rows": 7, "matched": 4, "share": 4 / 7}
+
+
+def test_compile_path_matches_prefix_segments():
+    regex = compile_path("/shop/*/{brand}")
+    assert regex.search("/shop/x/champion/item").group("brand") == "champion"
+    assert regex.search("/shop/champion") is None
+
+
+def test_rule_rows_skip_scraping_and_llm(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("should not be called")
+
+    monkeypatch.setattr(extraction, "extract_item_data", fail)
+    monkeypatch.setattr(eb, "prompt_model", fail)
+    rules = UrlRules(RULES, AliasMatcher(ALIASES))
+    row = {"month": "2024-01", "url": "https://www.arcteryx.com/item", "item_count": "3", "item_name": "Jacket"}
+
+    name_row = extraction.extract_row(row, rules=rules)
+    brand_row = eb.process_row(name_row, matcher=rules)
+
+    assert name_row["item_name"] == "Jacket"
+    assert name_row["error"] == ""
+    assert name_row["used_fallback"] is False
+    assert brand_row["brand"] == "ARC'TERYX"
+
+
+def test_pipeline_counts_each_rule_row_once():
+    rules = UrlRules(RULES, AliasMatcher(ALIASES))
+    row = {"month": "2024-01", "url": "https://www.arcteryx.com/item", "item_count": "3", "item_name": "Jacket"}
+
+    name_row = extraction.extract_row(row, rules=rules, count_rules=False)
+    eb.process_row(name_row, matcher=rules)
+
+    assert rules.stats() == {"rows": 1, "matched": 1, "share": 1.0}
+
+
+def test_rules_fall_back_to_alias_map():
+    rules = UrlRules(RULES, AliasMatcher(ALIASES))
+    assert rules.resolve_row("Champion hoodie", "https://example.com/item") == "Champion"
+
+
+def test_learn_rules_proposes_host_and_path_rules():
+    rows = (
+        [{"url": f"https://brandstore.jp/item/{i}", "brand": "STORE BRAND"} for i in range(25)]
+        + [{"url": f"https://mall.jp/shop/beams/goods/{i}", "brand": "BEAMS"} for i in range(15)]
+        + [{"url": f"https://mall.jp/shop/champion/goods/{i}", "brand": "CHAMPION"} for i in range(15)]
+        + [{"url": f"https://small.jp/item/{i}", "brand": "SMALL"} for i in range(3)]
+        + [{"url": f"https://www.arcteryx.com/item/{i}", "brand": "ARC'TERYX"} for i in range(30)]
+    )
+    known = UrlRules(RULES[:1], AliasMatcher(ALIASES))
+
+    proposals = learn_rules(rows, AliasMatcher(ALIASES), known)
+
+    assert proposals == [
+        {"host": "brandstore.jp", "brand": "STORE BRAND", "support": 25, "share": 1.0},
+        {"host": "mall.jp", "path": "/shop/{brand}", "support": 30, "share": 1.0},
+    ]